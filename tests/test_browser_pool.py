@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+
+import pytest
+
+from umamusume_prompt.mcp.browser_pool import BrowserPool, BrowserPoolUnavailable
+
+
+class FakeCrawler:
+    ids = itertools.count()
+
+    def __init__(self) -> None:
+        self.id = next(self.ids)
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+async def _launch() -> FakeCrawler:
+    await asyncio.sleep(0)
+    return FakeCrawler()
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_warm_browsers() -> None:
+    launches = 0
+
+    async def factory() -> FakeCrawler:
+        nonlocal launches
+        launches += 1
+        return await _launch()
+
+    pool = BrowserPool(2, max_pages_per_browser=100, factory=factory)
+    await pool.start()
+    seen = set()
+    for _ in range(10):
+        async with pool.acquire() as crawler:
+            seen.add(crawler.id)
+    await pool.close()
+
+    assert launches == 2
+    assert len(seen) <= 2
+    assert pool.stats()["pages_served"] == 10
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_arrival_order() -> None:
+    pool = BrowserPool(1, factory=_launch)
+    await pool.start()
+    order = []
+
+    async def worker(idx: int) -> None:
+        async with pool.acquire():
+            order.append(idx)
+            await asyncio.sleep(0.01)
+
+    tasks = []
+    for idx in range(5):
+        tasks.append(asyncio.create_task(worker(idx)))
+        await asyncio.sleep(0)
+    assert pool.stats()["waiting"] == 4
+    await asyncio.gather(*tasks)
+    await pool.close()
+
+    assert order == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_browsers_are_recycled_after_max_pages_and_failures() -> None:
+    pool = BrowserPool(1, max_pages_per_browser=2, factory=_launch)
+    await pool.start()
+
+    used = []
+    for _ in range(4):
+        async with pool.acquire() as crawler:
+            used.append(crawler)
+    assert used[0] is used[1]
+    assert used[1] is not used[2]
+    assert used[0].closed
+
+    with pytest.raises(RuntimeError):
+        async with pool.acquire() as crawler:
+            broken = crawler
+            raise RuntimeError("page crashed")
+    async with pool.acquire() as crawler:
+        assert crawler is not broken
+    assert broken.closed
+    assert pool.stats()["recycled"] == 3
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_start_closes_launched_browsers() -> None:
+    launched = []
+    calls = itertools.count()
+
+    async def flaky() -> FakeCrawler:
+        if next(calls) > 0:
+            raise OSError("no display")
+        crawler = await _launch()
+        launched.append(crawler)
+        return crawler
+
+    pool = BrowserPool(2, factory=flaky)
+    with pytest.raises(OSError):
+        await pool.start()
+    assert not pool.started
+    assert launched
+    assert all(crawler.closed for crawler in launched)
+
+
+@pytest.mark.asyncio
+async def test_pool_degrades_when_relaunch_keeps_failing() -> None:
+    calls = itertools.count()
+
+    async def dies_after_start() -> FakeCrawler:
+        if next(calls) > 0:
+            raise OSError("browser binary missing")
+        return await _launch()
+
+    pool = BrowserPool(
+        1,
+        factory=dies_after_start,
+        relaunch_attempts=3,
+        relaunch_delay_seconds=0,
+    )
+    await pool.start()
+    with pytest.raises(RuntimeError):
+        async with pool.acquire():
+            raise RuntimeError("page crashed")
+
+    async def waiter() -> None:
+        async with pool.acquire():
+            pass
+
+    stuck = asyncio.create_task(waiter())
+    with pytest.raises(BrowserPoolUnavailable):
+        await asyncio.wait_for(stuck, timeout=1)
+    with pytest.raises(BrowserPoolUnavailable):
+        async with pool.acquire():
+            pass
+
+    assert next(calls) == 4
+    assert pool.degraded and not pool.available
+    stats = pool.stats()
+    assert stats["lost"] == 1 and stats["degraded"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_waits_for_a_relaunch_still_in_progress() -> None:
+    calls = itertools.count()
+    slow_relaunch = asyncio.Event()
+
+    async def factory() -> FakeCrawler:
+        call = next(calls)
+        if call == 2:
+            raise OSError("browser binary missing")
+        if call == 3:
+            await slow_relaunch.wait()
+        return await _launch()
+
+    pool = BrowserPool(2, factory=factory, relaunch_attempts=1, relaunch_delay_seconds=0)
+    await pool.start()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            async with pool.acquire():
+                raise RuntimeError("page crashed")
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    # One relaunch failed but the other is still running: not degraded.
+    assert pool.stats()["lost"] == 1
+    assert pool.stats()["relaunching"] == 1
+    assert not pool.degraded
+
+    async def crawl() -> int:
+        async with pool.acquire() as crawler:
+            return crawler.id
+
+    waiter = asyncio.create_task(crawl())
+    await asyncio.sleep(0)
+    slow_relaunch.set()
+    assert isinstance(await asyncio.wait_for(waiter, timeout=1), int)
+    assert pool.available
+    await pool.close()
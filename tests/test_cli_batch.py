@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from umamusume_prompt import cli
+
+
+@pytest.mark.asyncio
+async def test_runs_characters_concurrently_and_isolates_failures(tmp_path) -> None:
+    running = 0
+    peak = 0
+
+    async def runner(cn: str, en: str) -> tuple[Path, Path]:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        if cn == "黄金船":
+            raise RuntimeError("agent gave up")
+        return tmp_path / en / "web_info.md", tmp_path / en / "role_prompt.md"
+
+    characters = [("特别周", "Special Week"), ("黄金船", "Gold Ship"), ("小栗帽", "Oguri Cap")]
+    results = await cli.run_characters(runner, characters * 2, concurrency=3)
+
+    assert peak == 3
+    assert [result.character_cn for result in results] == [cn for cn, _ in characters * 2]
+    assert [result.ok for result in results[:3]] == [True, False, True]
+    assert results[1].error == "RuntimeError: agent gave up"
+    assert results[0].paths[1] == tmp_path / "Special Week" / "role_prompt.md"
+
+    summary = cli.format_summary(results[:3], "prompt")
+    assert "黄金船 (Gold Ship)" in summary
+    assert summary.splitlines()[-1] == "[prompt] 2/3 characters succeeded, 1 failed"
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    calls = {"collect": [], "write": []}
+    writing = {"now": 0, "peak": 0}
+
+    async def collect(mcp_url, character_cn, character_en, **_):
+        calls["collect"].append(character_cn)
+        if character_cn == "黄金船":
+            raise RuntimeError("boom")
+        return f"web info {character_cn}", {"tool_calls": []}
+
+    def writer(target):
+        async def write(web_info, tool_info, character_cn, character_en, output_dir, **_):
+            calls["write"].append((target, web_info))
+            writing["now"] += 1
+            writing["peak"] = max(writing["peak"], writing["now"])
+            await asyncio.sleep(0.05)
+            writing["now"] -= 1
+            character_dir = output_dir / character_en
+            return character_dir / "web_info.md", character_dir / "role_prompt.md"
+
+        return write
+
+    monkeypatch.setattr(cli, "collect_web_info_cached", collect)
+    monkeypatch.setattr(cli, "WRITERS", {name: writer(name) for name in cli.WRITERS})
+    return calls, writing
+
+
+def _args(tmp_path, **overrides) -> argparse.Namespace:
+    roster = tmp_path / "characters.json"
+    roster.write_text(
+        json.dumps({"特别周": "Special Week", "黄金船": "Gold Ship"}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    options = dict(
+        character=None,
+        all=False,
+        concurrency=4,
+        characters_json=str(roster),
+        mcp_url="http://mcp",
+        output=str(tmp_path / "out"),
+        build_target=["prompt"],
+        wait_mcp=0,
+        wait_interval=0,
+        force_stage=[],
+        collect_mode="auto",
+    )
+    return argparse.Namespace(**{**options, **overrides})
+
+
+@pytest.mark.asyncio
+async def test_all_takes_the_roster_and_exits_nonzero_on_failure(stages, tmp_path) -> None:
+    calls, _ = stages
+
+    with pytest.raises(SystemExit) as exc_info:
+        await cli._run(_args(tmp_path, character=["Special Week"], all=True))
+
+    assert exc_info.value.code == 1
+    assert sorted(calls["collect"]) == ["特别周", "黄金船"]
+
+
+@pytest.mark.asyncio
+async def test_multiple_targets_share_one_collection(stages, tmp_path) -> None:
+    calls, writing = stages
+    args = _args(
+        tmp_path,
+        character=["特别周"],
+        build_target=cli._build_targets("prompt, sillytavern"),
+    )
+
+    await cli._run(args)
+
+    assert calls["collect"] == ["特别周"]
+    assert sorted(calls["write"]) == [
+        ("prompt", "web info 特别周"),
+        ("sillytavern", "web info 特别周"),
+    ]
+    assert writing["peak"] == 2
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli._build_targets("prompt,card")
@@ -0,0 +1,94 @@
+import random
+import time
+
+import pytest
+
+from umamusume_prompt.dedup import MinHashIndex, dedup_documents, minhash, shingles
+from umamusume_prompt.mcp import server
+
+BILIGAME_PARAGRAPH = "爱慕织姬是一名赛马娘，她的性格冷静而内敛，在训练中总是一丝不苟，对于天皇赏有着强烈的执念。"
+MOEGIRL_PARAGRAPH = "爱慕织姬是一名赛马娘。她的性格冷静而内敛，在训练中总是一丝不苟，对天皇赏有着强烈的执念。"
+OTHER_PARAGRAPH = "米浴性格内向胆小，总觉得自己会给身边的人带来不幸，但内心非常温柔，憧憬着绘本中的蓝玫瑰。"
+
+
+def test_reworded_paragraph_from_second_source_is_dropped() -> None:
+    biligame = f"# 爱慕织姬\n\n{BILIGAME_PARAGRAPH}\n\n## 性格\n\n短句。"
+    moegirl = f"# 爱慕织姬\n\n{MOEGIRL_PARAGRAPH}\n\n## 性格\n\n短句。\n\n{OTHER_PARAGRAPH}"
+
+    (first, second), stats = dedup_documents([biligame, moegirl])
+
+    assert first == biligame
+    assert second == f"# 爱慕织姬\n\n## 性格\n\n短句。\n\n{OTHER_PARAGRAPH}"
+    assert stats.paragraphs == 3
+    assert stats.dropped == 1
+    assert stats.tokens_saved > 0
+
+
+def test_distinct_paragraphs_are_kept() -> None:
+    index = MinHashIndex(0.6)
+    features = shingles(BILIGAME_PARAGRAPH)
+    index.add(features, minhash(features))
+
+    other = shingles(OTHER_PARAGRAPH)
+    assert not index.find(other, minhash(other))
+    near = shingles(MOEGIRL_PARAGRAPH)
+    assert index.find(near, minhash(near))
+
+
+def _random_documents(rng: random.Random, paragraphs: int) -> list[str]:
+    alphabet = [chr(0x4E00 + idx) for idx in range(3000)]
+    text = "\n\n".join("".join(rng.choices(alphabet, k=120)) for _ in range(paragraphs))
+    return [text, text]
+
+
+def test_unrelated_paragraphs_rarely_share_buckets() -> None:
+    rng = random.Random(7)
+    paragraphs = _random_documents(rng, 1600)[0].split("\n\n")
+    index = MinHashIndex()
+    for paragraph in paragraphs:
+        features = shingles(paragraph)
+        index.add(features, minhash(features))
+
+    # Each lookup only compares against paragraphs in the same buckets, so
+    # the pass stays linear as long as collisions are rare.
+    collisions = sum(len(bucket) - 1 for bucket in index._buckets.values())
+    assert collisions < len(paragraphs) // 10
+
+    _, stats = dedup_documents(_random_documents(rng, 1600))
+    assert stats.dropped == 1600
+
+
+@pytest.mark.benchmark
+def test_dedup_pass_scales_linearly() -> None:
+    rng = random.Random(7)
+    small, large = _random_documents(rng, 200), _random_documents(rng, 1600)
+    start = time.perf_counter()
+    dedup_documents(small)
+    small_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    _, stats = dedup_documents(large)
+    large_seconds = time.perf_counter() - start
+
+    assert stats.dropped == 1600
+    # 8x the paragraphs; a quadratic pass would take ~64x as long.
+    assert large_seconds < small_seconds * 24
+
+
+@pytest.mark.asyncio
+async def test_batch_tool_drops_duplicates_across_urls(offline_server) -> None:
+    async def biligame(url: str, **_: object) -> str:
+        return f"# 爱慕织姬\n\n{BILIGAME_PARAGRAPH}"
+
+    async def moegirl(url: str, **_: object) -> str:
+        return f"# 爱慕织姬\n\n{MOEGIRL_PARAGRAPH}\n\n{OTHER_PARAGRAPH}"
+
+    offline_server(biligame=biligame, moegirl=moegirl)
+    urls = ["https://wiki.biligame.com/umamusume/爱慕织姬", "https://mzh.moegirl.org.cn/爱慕织姬"]
+
+    response = await server.crawl_wiki_batch(urls)
+    raw = await server.crawl_wiki_batch(urls, dedup=False)
+
+    assert response["dedup"]["dropped"] == 1
+    assert response["results"][1]["result"] == f"# 爱慕织姬\n\n{OTHER_PARAGRAPH}"
+    assert MOEGIRL_PARAGRAPH in raw["results"][1]["result"]
+    assert "dedup" not in raw
@@ -0,0 +1,252 @@
+import dataclasses
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from langchain_core.tools import StructuredTool
+from mcp.types import CallToolResult, TextContent
+
+from umamusume_prompt import pipeline
+from umamusume_prompt.dedup import Deduplicator
+from umamusume_prompt.pipeline import McpSessionPool
+
+BILIGAME = "https://wiki.biligame.com/umamusume/特别周"
+MOEGIRL = "https://mzh.moegirl.org.cn/特别周(赛马娘)"
+
+
+BILIGAME_PAGE = "# 特别周\n\n## 基本信息\n\n| 适性 | 草地 A |\n\n" + "游戏数据 " * 40
+MOEGIRL_PAGE = "# 特别周\n\n## 简介\n\n" + "角色设定 " * 40
+
+
+class WikiSession:
+    def __init__(
+        self, pages: dict[str, str | list[str]], biligame_hits: list[dict] | None = None
+    ) -> None:
+        # A list of strings is a page served in cursor pages.
+        self.pages = {url: [page] if isinstance(page, str) else page for url, page in pages.items()}
+        self.biligame_hits = biligame_hits or [{"title": "特别周", "url": BILIGAME}]
+        self.calls: list[tuple[str, dict]] = []
+
+    def _page(self, url: str, index: int) -> dict:
+        parts = self.pages[url]
+        return {
+            "status": "success",
+            "result": parts[index],
+            "next_cursor": f"{url}#{index + 1}" if index + 1 < len(parts) else None,
+        }
+
+    async def call_tool(self, name: str, arguments: dict | None = None, **_: object):
+        self.calls.append((name, arguments))
+        if name == "biligame_wiki_search":
+            payload = {"results": self.biligame_hits}
+        elif name == "moegirl_wiki_search":
+            # Moegirl only knows the character by its English name here.
+            hit = arguments["keyword"] == "Special Week" and MOEGIRL in self.pages
+            payload = {"results": [{"title": "特别周(赛马娘)", "url": MOEGIRL}] if hit else []}
+        elif name == "crawl_wiki_batch":
+            payload = {
+                "results": [
+                    {
+                        "url": url,
+                        "site": "moegirl" if "moegirl" in url else "biligame",
+                        **self._page(url, 0),
+                    }
+                    for url in arguments["urls"]
+                ]
+            }
+        elif name in ("crawl_biligame_wiki", "crawl_moegirl_wiki"):
+            url, index = arguments["cursor"].rsplit("#", 1)
+            payload = self._page(url, int(index))
+        else:
+            raise AssertionError(f"unexpected tool {name}")
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(payload))])
+
+
+class FakeModel:
+    def __init__(self) -> None:
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0].content)
+        return type("Response", (), {"content": "## 1. 角色档案 (Profile)\n整理后的资料"})()
+
+
+@pytest.fixture
+def collect(monkeypatch):
+    model = FakeModel()
+    agent_runs = []
+
+    async def agent(pool, character_cn, character_en):
+        agent_runs.append(character_cn)
+        return "agent web info", {"tool_calls": [], "tool_results": [], "final_answer": None}
+
+    monkeypatch.setattr(
+        pipeline,
+        "config",
+        dataclasses.replace(
+            pipeline.config, info_llm_model_api_key="test", direct_collect_min_chars=100
+        ),
+    )
+    monkeypatch.setattr(pipeline, "_build_info_model", lambda: model)
+    monkeypatch.setattr(pipeline, "_collect_with_agent", agent)
+
+    async def run(
+        pages: dict[str, str | list[str]], mode: str, **session_options
+    ) -> tuple[str, dict, WikiSession]:
+        session = WikiSession(pages, **session_options)
+
+        @asynccontextmanager
+        async def connect():
+            yield session
+
+        async with McpSessionPool("http://mcp", connect=connect) as pool:
+            web_info, tool_info = await pipeline.collect_web_info(
+                "http://mcp", "特别周", "Special Week", pool=pool, mode=mode
+            )
+        return web_info, tool_info, session
+
+    return run, model, agent_runs
+
+
+@pytest.mark.asyncio
+async def test_direct_mode_crawls_both_wikis_with_one_llm_call(collect) -> None:
+    run, model, agent_runs = collect
+    pages = {BILIGAME: BILIGAME_PAGE, MOEGIRL: MOEGIRL_PAGE}
+
+    web_info, tool_info, session = await run(pages, "auto")
+
+    assert web_info == "## 1. 角色档案 (Profile)\n整理后的资料"
+    assert tool_info["mode"] == "direct"
+    assert tool_info["coverage"] == {
+        "sites": ["biligame", "moegirl"],
+        "chars": len(BILIGAME_PAGE) + len(MOEGIRL_PAGE),
+        "sections": ["profile", "game_data"],
+        "missing_sections": [],
+    }
+    assert agent_runs == []
+    assert len(model.prompts) == 1
+    assert BILIGAME in model.prompts[0] and "角色设定" in model.prompts[0]
+    batch = [arguments for name, arguments in session.calls if name == "crawl_wiki_batch"]
+    assert batch == [
+        {
+            "urls": [BILIGAME, MOEGIRL],
+            "token_budget": 8000,
+            "keep_sections": pipeline._KEEP_SECTIONS,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_auto_mode_falls_back_to_the_agent_on_thin_coverage(collect) -> None:
+    run, model, agent_runs = collect
+
+    web_info, tool_info, _ = await run({BILIGAME: "短"}, "auto")
+
+    assert web_info == "agent web info"
+    assert tool_info["mode"] == "agent"
+    assert tool_info["direct_coverage"] == {
+        "sites": ["biligame"],
+        "chars": 1,
+        "sections": [],
+        "missing_sections": ["profile", "game_data"],
+    }
+    assert agent_runs == ["特别周"]
+    assert model.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_direct_mode_does_not_fall_back(collect) -> None:
+    run, _, agent_runs = collect
+
+    with pytest.raises(RuntimeError, match="too little"):
+        await run({BILIGAME: "短"}, "direct")
+
+    assert agent_runs == []
+
+
+@pytest.mark.asyncio
+async def test_auto_mode_falls_back_without_game_data(collect) -> None:
+    run, model, agent_runs = collect
+
+    _, tool_info, _ = await run({BILIGAME: MOEGIRL_PAGE * 3}, "auto")
+
+    assert tool_info["mode"] == "agent"
+    assert tool_info["direct_coverage"]["missing_sections"] == ["game_data"]
+    assert agent_runs == ["特别周"]
+
+
+@pytest.mark.asyncio
+async def test_search_prefers_the_characters_own_title(collect) -> None:
+    run, _, _ = collect
+    hits = [
+        {"title": "特别周/支援卡", "url": BILIGAME + "/支援卡"},
+        {"title": "特别周", "url": BILIGAME},
+    ]
+
+    pages = {BILIGAME: BILIGAME_PAGE, MOEGIRL: MOEGIRL_PAGE}
+
+    _, _, session = await run(pages, "auto", biligame_hits=hits)
+
+    searches = [arguments for name, arguments in session.calls if name.endswith("_search")]
+    assert all(arguments["limit"] > 1 for arguments in searches)
+    batch = [arguments for name, arguments in session.calls if name == "crawl_wiki_batch"]
+    assert batch[0]["urls"] == [BILIGAME, MOEGIRL]
+
+
+@pytest.mark.asyncio
+async def test_without_budget_cursor_pages_are_followed(collect, monkeypatch) -> None:
+    run, model, _ = collect
+    monkeypatch.setattr(
+        pipeline, "config", dataclasses.replace(pipeline.config, direct_collect_token_budget=0)
+    )
+    rest = "\n\n## 育成\n\n" + "训练 " * 40
+
+    _, tool_info, session = await run({BILIGAME: [MOEGIRL_PAGE, rest]}, "auto")
+
+    assert tool_info["mode"] == "direct"
+    assert ("crawl_biligame_wiki", {"url": BILIGAME, "cursor": f"{BILIGAME}#1"}) in session.calls
+    batch = [arguments for name, arguments in session.calls if name == "crawl_wiki_batch"]
+    assert batch == [{"urls": [BILIGAME]}]
+    assert "训练" in model.prompts[0]
+
+
+REPEATED = "特别周是一名来自北海道的赛马娘，性格开朗直率，食量惊人，梦想成为日本第一的赛马娘。"
+
+
+@pytest.mark.asyncio
+async def test_sources_are_deduped_before_summarizing(collect) -> None:
+    run, model, _ = collect
+    pages = {
+        BILIGAME: [BILIGAME_PAGE, f"\n\n{REPEATED}"],
+        MOEGIRL: f"{MOEGIRL_PAGE}\n\n{REPEATED}",
+    }
+
+    _, tool_info, _ = await run(pages, "direct")
+
+    assert model.prompts[0].count(REPEATED) == 1
+    assert tool_info["dedup"]["dropped"] == 1
+    assert tool_info["dedup"]["tokens_saved"] > 0
+
+
+@pytest.mark.asyncio
+async def test_agent_crawl_results_skip_paragraphs_already_read() -> None:
+    async def crawl(url: str) -> tuple[list[dict], None]:
+        payload = {"status": "success", "result": f"# {url}\n\n{REPEATED}"}
+        return [{"type": "text", "text": json.dumps(payload)}], None
+
+    tool = StructuredTool.from_function(
+        coroutine=crawl,
+        name="crawl_biligame_wiki",
+        description="crawl",
+        response_format="content_and_artifact",
+    )
+    dedup = Deduplicator()
+    deduped = pipeline._with_dedup(tool, dedup)
+
+    first = await deduped.ainvoke({"url": "a"})
+    second = await deduped.ainvoke({"url": "b"})
+
+    assert REPEATED in json.loads(first[0]["text"])["result"]
+    assert json.loads(second[0]["text"])["result"] == "# b"
+    assert dedup.stats.dropped == 1
+    assert await tool.ainvoke({"url": "c"}) == (await crawl("c"))[0]
@@ -0,0 +1,185 @@
+"""
+Response compression middleware tests and a bytes-on-the-wire benchmark.
+
+pytest tests/test_http_compression.py -s
+"""
+
+import gzip
+import json
+import random
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.compression import (
+    CompressionMiddleware,
+    available_encodings,
+    choose_encoding,
+)
+
+needs_zstd = pytest.mark.skipif("zstd" not in available_encodings(), reason="zstandard not installed")
+
+
+def _tool_payload(chars: int, seed: int = 7) -> dict:
+    """A JSON-RPC tools/call reply carrying Markdown like crawl_biligame_wiki returns."""
+    rng = random.Random(seed)
+    common = [chr(0x4E00 + rng.randrange(2000)) for _ in range(600)]
+    words = ["爱慕织姬", "训练员", "天皇赏", "赛马娘"] + [
+        "".join(rng.choices(common, k=rng.randint(1, 3))) for _ in range(400)
+    ]
+    parts = ["# 爱慕织姬\n\n"]
+    size = 0
+    while size < chars:
+        line = "，".join(rng.choice(words) for _ in range(rng.randint(6, 20))) + "。\n\n"
+        if rng.random() < 0.1:
+            line = f"## 章节 {size}\n\n| 项目 | 内容 |\n|---|---|\n| 速度 | {rng.randint(70, 120)} |\n\n"
+        parts.append(line)
+        size += len(line)
+    text = "".join(parts)[:chars]
+    result = {"status": "success", "result": text, "page": 1, "total_pages": 1, "next_cursor": None}
+    return {
+        "jsonrpc": "2.0",
+        "id": 3,
+        "result": {
+            "content": [{"type": "text", "text": json.dumps(result, ensure_ascii=False)}],
+            "isError": False,
+        },
+    }
+
+
+def _app(payload: dict, **options) -> Starlette:
+    async def tool(request):
+        return JSONResponse(payload)
+
+    async def small(request):
+        return JSONResponse({"jsonrpc": "2.0", "id": 1, "result": {}})
+
+    async def stream(request):
+        async def chunks():
+            for idx in range(50):
+                yield f"第{idx}块：爱慕织姬与织女星的约定。\n".encode("utf-8") * 20
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    async def events(request):
+        async def chunks():
+            for idx in range(20):
+                yield f"event: message\ndata: {'x' * 200}{idx}\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    async def encoded(request):
+        return Response(gzip.compress(b"x" * 5000), headers={"content-encoding": "gzip"})
+
+    return Starlette(
+        routes=[
+            Route("/tool", tool),
+            Route("/small", small),
+            Route("/stream", stream),
+            Route("/events", events),
+            Route("/encoded", encoded),
+        ],
+        middleware=[Middleware(CompressionMiddleware, **options)],
+    )
+
+
+def test_choose_encoding_follows_server_preference_and_q_values() -> None:
+    assert choose_encoding("gzip, zstd", ["zstd", "gzip"]) == "zstd"
+    assert choose_encoding("gzip;q=1.0, zstd;q=0", ["zstd", "gzip"]) == "gzip"
+    assert choose_encoding("*;q=0.1", ["zstd", "gzip"]) == "zstd"
+    assert choose_encoding("br", ["zstd", "gzip"]) is None
+    assert choose_encoding("", ["gzip"]) is None
+
+
+def test_large_json_body_is_gzipped_and_small_one_is_not() -> None:
+    payload = _tool_payload(40_000)
+    client = TestClient(_app(payload, encodings=["gzip"]))
+
+    response = client.get("/tool", headers={"accept-encoding": "gzip"})
+    small = client.get("/small", headers={"accept-encoding": "gzip"})
+    plain = client.get("/tool", headers={"accept-encoding": "identity"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(plain.content) / 2
+    assert response.json() == payload
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+
+
+@needs_zstd
+def test_zstd_is_preferred_when_accepted() -> None:
+    payload = _tool_payload(40_000)
+    client = TestClient(_app(payload))
+
+    response = client.get("/tool", headers={"accept-encoding": "gzip, zstd"})
+
+    assert response.headers["content-encoding"] == "zstd"
+    assert response.json() == payload
+
+
+def test_streams_are_compressed_incrementally() -> None:
+    client = TestClient(_app({}, encodings=["gzip"]))
+
+    response = client.get("/stream", headers={"accept-encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("爱慕织姬") == 50 * 20
+
+
+def test_event_streams_and_encoded_bodies_pass_through() -> None:
+    client = TestClient(_app({}, encodings=["gzip"]))
+
+    events = client.get("/events", headers={"accept-encoding": "gzip"})
+    encoded = client.get("/encoded", headers={"accept-encoding": "gzip"})
+
+    assert "content-encoding" not in events.headers
+    assert events.text.count("event: message") == 20
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert encoded.content == b"x" * 5000
+
+
+def test_server_app_compresses_metrics() -> None:
+    client = TestClient(server.create_starlette_app(server.mcp._mcp_server))
+
+    response = client.get("/metrics", headers={"accept-encoding": "gzip"})
+
+    assert response.status_code == 200
+    if len(response.content) >= server.local_config.http_compression_min_bytes:
+        assert response.headers["content-encoding"] == "gzip"
+
+
+def test_compression_benchmark() -> None:
+    print()
+    encodings = available_encodings()
+    for chars in (2_000, 16_000, 40_000):
+        client = TestClient(_app(_tool_payload(chars)))
+        sizes = {}
+        latency = {}
+        for encoding in ["identity", *encodings]:
+            best = float("inf")
+            for _ in range(5):
+                start = time.perf_counter()
+                response = client.get("/tool", headers={"accept-encoding": encoding})
+                response.json()
+                best = min(best, time.perf_counter() - start)
+            latency[encoding] = best
+            sizes[encoding] = int(response.headers["content-length"])
+        # Transfer time on a 20 Mbit/s link, the rough scale of a remote MCP server.
+        print(
+            f"{chars:>6} chars: "
+            + "  ".join(
+                f"{encoding} {sizes[encoding] / 1024:6.1f} KiB "
+                f"{latency[encoding] * 1000:5.2f} ms + {sizes[encoding] * 8 / 20e6 * 1000:5.2f} ms wire"
+                for encoding in sizes
+            )
+        )
+        if chars >= 16_000:
+            assert sizes["gzip"] < sizes["identity"] / 2
@@ -0,0 +1,79 @@
+"""
+Cold-start budget for the MCP server module, measured with -X importtime.
+
+The MCP SDK is imported first so the measured time is what this project adds
+on top of it. The budget check is a benchmark; override the budget with
+IMPORT_TIME_BUDGET_MS.
+
+RUN_BENCHMARKS=1 pytest tests/test_import_time.py -s
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "300"))
+HEAVY_MODULES = ("umamusume_web_crawler", "googleapiclient", "crawl4ai")
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+PROBE = """
+import json, sys
+import mcp.server.fastmcp
+from umamusume_prompt.config import config
+data_files = {str(config.characters_json), str(config.injection_markers_path)}
+opened = []
+sys.addaudithook(
+    lambda event, args: event == "open" and str(args[0]) in data_files and opened.append(str(args[0]))
+)
+import umamusume_prompt.mcp.server as server
+heavy = sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[1:]))
+print(json.dumps({"heavy": heavy, "app_built": "web_mcp_app" in vars(server), "opened": opened}))
+"""
+
+
+def _import_server() -> tuple[dict, dict[str, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, *HEAVY_MODULES],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            cumulative_us[match.group(4)] = int(match.group(2))
+    return json.loads(proc.stdout.strip().splitlines()[-1]), cumulative_us
+
+
+def test_server_import_is_lazy() -> None:
+    probe, _ = _import_server()
+
+    assert probe["heavy"] == []
+    assert not probe["app_built"]
+    # The roster and the injection markers are read on first use.
+    assert probe["opened"] == []
+
+
+@pytest.mark.benchmark
+def test_server_import_within_budget() -> None:
+    _, cumulative_us = _import_server()
+    server_ms = cumulative_us["umamusume_prompt.mcp.server"] / 1000
+    print(f"\nimport umamusume_prompt.mcp.server: {server_ms:.1f}ms (budget {BUDGET_MS:.0f}ms)")
+
+    assert server_ms < BUDGET_MS
+
+
+def test_http_app_is_built_on_first_access() -> None:
+    from umamusume_prompt.mcp import server
+
+    app = server.web_mcp_app
+    assert server.web_mcp_app is app
+    assert {route.path for route in app.routes} >= {"/sse", "/stats", "/metrics", "/mcp"}
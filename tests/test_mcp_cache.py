@@ -0,0 +1,61 @@
+import time
+
+from umamusume_prompt.mcp.cache import ResultCache
+
+
+def test_cache_hit_and_miss(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache.sqlite3", ttl_seconds=60, max_bytes=1 << 20)
+    key = ResultCache.make_key("biligame", "爱慕织姬", 1, 5)
+
+    assert cache.get(key) is None
+    cache.set(key, "# 爱慕织姬")
+    assert cache.get(key) == "# 爱慕织姬"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_cache_expires_entries(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache.sqlite3", ttl_seconds=0.05, max_bytes=1 << 20)
+    cache.set("key", "value")
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache.sqlite3", ttl_seconds=60, max_bytes=250)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y" * 100)
+    assert cache.get("a") is not None
+    cache.set("c", "z" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_is_shared_between_instances(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    ResultCache(path, ttl_seconds=60, max_bytes=1 << 20).set("key", {"a": 1})
+    assert ResultCache(path, ttl_seconds=60, max_bytes=1 << 20).get("key") == {"a": 1}
+
+
+def test_cache_disabled_with_zero_ttl(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache.sqlite3", ttl_seconds=0, max_bytes=1 << 20)
+    cache.set("key", "value")
+    assert cache.get("key") is None
+    assert not (tmp_path / "cache.sqlite3").exists()
+
+
+def test_pickle_codec_round_trips_compressed_objects(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = ResultCache(path, table="parsed", codec="pickle")
+    record = {"sections": [("简介", "天皇赏" * 500)], "infobox": {"生日": (3, 2)}}
+    cache.set("key", record)
+
+    assert ResultCache(path, table="parsed", codec="pickle").get("key") == record
+    assert cache.stats()["bytes"] < len(str(record).encode("utf-8")) / 10
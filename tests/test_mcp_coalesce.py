@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from umamusume_prompt.mcp.coalesce import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution() -> None:
+    flight = SingleFlight()
+    executions = 0
+
+    @flight.coalesce
+    async def fetch(url: str, max_depth: int = 1) -> dict:
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.05)
+        return {"url": url}
+
+    url = "https://wiki.biligame.com/umamusume/爱慕织姬"
+    results = await asyncio.gather(
+        fetch(url),
+        fetch(url, 1),
+        fetch(url, max_depth=1),
+        fetch("https://wiki.biligame.com/umamusume/%E7%88%B1%E6%85%95%E7%BB%87%E5%A7%AC"),
+    )
+
+    assert executions == 1
+    assert all(result == {"url": url} for result in results)
+    assert flight.stats() == {"calls": 4, "executions": 1, "coalesced": 3, "inflight": 0}
+
+
+@pytest.mark.asyncio
+async def test_different_arguments_are_not_coalesced() -> None:
+    flight = SingleFlight()
+
+    @flight.coalesce
+    async def search(keyword: str, limit: int = 5) -> str:
+        await asyncio.sleep(0.01)
+        return f"{keyword}:{limit}"
+
+    results = await asyncio.gather(search("东海帝皇"), search("东海帝皇", limit=3))
+    assert results == ["东海帝皇:5", "东海帝皇:3"]
+    assert flight.coalesced == 0
+
+    # Completed calls are not reused.
+    await search("东海帝皇")
+    assert flight.executions == 3
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter() -> None:
+    flight = SingleFlight()
+
+    @flight.coalesce
+    async def broken() -> None:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(broken(), broken(), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.executions == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call() -> None:
+    flight = SingleFlight()
+
+    @flight.coalesce
+    async def slow() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(slow())
+    second = asyncio.create_task(slow())
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import pytest
+
+from umamusume_prompt import tokens
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.compact import compact_markdown, section_weights
+
+BILIGAME_URL = "https://wiki.biligame.com/umamusume/爱慕织姬"
+
+
+def _section(heading: str, lines: int, level: int = 2) -> str:
+    body = "\n".join(f"{heading}第{idx}行，关于天皇赏与训练员的内容。" for idx in range(lines))
+    return f"{'#' * level} {heading}\n\n{body}\n\n"
+
+
+PAGE = (
+    "# 爱慕织姬\n\n爱慕织姬是一名赛马娘。\n\n"
+    + _section("育成数据", 40)
+    + _section("性格", 10)
+    + _section("幼年", 5, level=3)
+    + _section("参考资料", 30)
+    + _section("人际关系", 10)
+    + "## 台词\n\n| 场景 | 台词 |\n|---|---|\n"
+    + "".join(f"| 场景{idx} | 今天也要在星空下奔跑，第{idx}句。 |\n" for idx in range(30))
+)
+
+
+def test_estimate_counts_cjk_characters_individually() -> None:
+    assert tokens.estimate_tokens("爱慕织姬") == 4
+    assert tokens.estimate_tokens("abcdefgh") == 2
+    assert tokens.count_tokens("") == 0
+    assert tokens.count_tokens("爱慕织姬 Admire Vega") > 0
+
+
+def test_subsections_inherit_parent_weight() -> None:
+    sections = ["# 标题\n", "## 性格\n", "### 幼年\n", "## 注释\n", "### 幼年\n", "## 未知\n"]
+
+    weights = section_weights(sections)
+
+    assert weights[1] == weights[2] > weights[5] > weights[3] == weights[4]
+
+
+def test_keep_sections_are_included_whole_on_top_of_the_budget() -> None:
+    result = compact_markdown(PAGE, 900, keep=["育成"])
+
+    assert _section("育成数据", 40) in result.text
+    assert "育成数据" not in result.omitted_sections
+    assert "## 性格" in result.text
+    assert "参考资料" in result.omitted_sections
+
+
+def test_small_documents_are_left_alone() -> None:
+    result = compact_markdown(PAGE, 100_000)
+
+    assert result.text == PAGE
+    assert result.omitted_sections == []
+
+
+def test_budget_keeps_character_sections_in_document_order() -> None:
+    result = compact_markdown(PAGE, 900)
+
+    assert result.tokens <= 900
+    assert result.tokens < result.original_tokens
+    assert "爱慕织姬是一名赛马娘" in result.text
+    assert result.text.index("## 性格") < result.text.index("### 幼年") < result.text.index("## 人际关系")
+    assert "参考资料" in result.omitted_sections
+    assert "育成数据" in result.omitted_sections
+
+
+def test_partial_sections_are_cut_on_row_boundaries() -> None:
+    result = compact_markdown(PAGE, 700)
+
+    assert "台词" in result.trimmed_sections
+    table = result.text[result.text.index("## 台词") :]
+    rows = [line for line in table.splitlines() if line.startswith("|")]
+    assert 2 < len(rows) < 32
+    assert all(row.endswith("|") for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_wiki_tool_returns_compacted_page(offline_server) -> None:
+    async def fetch(url: str, **_: object) -> str:
+        return PAGE
+
+    offline_server(biligame=fetch)
+
+    response = await server.crawl_biligame_wiki(BILIGAME_URL, token_budget=900)
+    batch = await server.crawl_wiki_batch([BILIGAME_URL], token_budget=900, dedup=False)
+    invalid = await server.crawl_biligame_wiki(BILIGAME_URL, token_budget=0)
+
+    assert response["status"] == "success"
+    assert response["next_cursor"] is None
+    assert response["tokens"] <= response["token_budget"] == 900
+    assert "参考资料" in response["omitted_sections"]
+    assert batch["results"][0]["result"] == response["result"]
+    assert invalid["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_encoding_is_never_loaded_on_the_event_loop(monkeypatch) -> None:
+    loaded = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    threads: list[bool] = []
+
+    def load(name: str) -> object:
+        threads.append(threading.current_thread() is threading.main_thread())
+        tokens._encodings[name] = None
+        loop.call_soon_threadsafe(loaded.set)
+        return None
+
+    monkeypatch.setattr(tokens, "_encodings", {})
+    monkeypatch.setattr(tokens, "_loading", set())
+    monkeypatch.setattr(tokens, "_load", load)
+
+    assert tokens.count_tokens("abcd" * 10, "slow") == tokens.estimate_tokens("abcd" * 10)
+    tokens.count_tokens("abcd", "slow")
+    await asyncio.wait_for(loaded.wait(), 1)
+    assert await tokens.preload_encoding("other") == "heuristic"
+    assert threads == [False, False]
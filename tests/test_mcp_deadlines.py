@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.cache import ResultCache
+from umamusume_prompt.mcp.deadlines import Deadlines, mark_partial, soft_deadline
+from umamusume_prompt.mcp.expand import WikiExpander
+
+API_URL = "https://wiki.biligame.com/umamusume/api.php"
+BILIGAME_URL = "https://wiki.biligame.com/umamusume/爱慕织姬"
+
+
+@pytest.mark.asyncio
+async def test_hard_deadline_cancels_and_reports() -> None:
+    expired = []
+    deadlines = Deadlines(
+        {"slow": 0.05}, default_seconds=10, on_expired=lambda tool, outcome: expired.append(outcome)
+    )
+    cancelled = asyncio.Event()
+
+    @deadlines.bound()
+    async def slow(deadline_seconds: float | None = None) -> dict:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return {"status": "success"}
+
+    start = time.perf_counter()
+    result = await slow()
+
+    assert time.perf_counter() - start < 1
+    assert result["status"] == "error"
+    assert "deadline" in result["message"]
+    assert cancelled.is_set()
+    assert expired == ["timeout"]
+
+
+@pytest.mark.asyncio
+async def test_nested_calls_keep_the_earlier_deadline_and_mark_partial() -> None:
+    deadlines = Deadlines({"outer": 0.2, "inner": 30}, default_seconds=30)
+    seen = {}
+
+    @deadlines.bound()
+    async def inner(deadline_seconds: float | None = None) -> dict:
+        seen["soft"] = soft_deadline()
+        mark_partial("cut short")
+        return {"status": "success"}
+
+    @deadlines.bound()
+    async def outer(deadline_seconds: float | None = None) -> dict:
+        seen["outer_soft"] = soft_deadline()
+        return await inner()
+
+    result = await outer()
+
+    assert seen["soft"] <= asyncio.get_running_loop().time() + 0.2
+    assert seen["soft"] == pytest.approx(seen["outer_soft"], abs=0.05)
+    assert result == {"status": "success", "partial": True, "partial_reasons": ["cut short"]}
+    assert deadlines.seconds_for("inner", 0) is None
+    assert deadlines.seconds_for("other", None) == 30
+
+
+@pytest.fixture
+def wiki_server(offline_server, monkeypatch, tmp_path):
+    # The wiki cache is enabled so the tests can check partial pages stay out of it.
+    offline_server(wiki_cache={})
+
+    class Revisions:
+        async def revision(self, site: str, title: str, *, use_proxy: bool = False) -> str:
+            return {"爱慕织姬": "1:t", "赛马娘/通用": "2:t"}.get(title)
+
+    monkeypatch.setattr(server, "_revisions", Revisions())
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_wiki_tool_returns_root_page_when_transclusions_run_late(
+    wiki_server, monkeypatch
+) -> None:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        revid = int(request.url.params["revids"])
+        if revid == 2:
+            await asyncio.sleep(2)
+        content = {1: "== 简介 ==\n{{:赛马娘/通用}}", 2: "通用内容"}[revid]
+        pages = [{"revisions": [{"revid": revid, "slots": {"main": {"content": content}}}]}]
+        return httpx.Response(200, json={"query": {"pages": pages}})
+
+    expander = WikiExpander(
+        ResultCache(wiki_server / "cache.sqlite3", table="wiki_pages", ttl_seconds=0),
+        {"biligame": API_URL},
+        revision=lambda site, title, use_proxy: server._revisions.revision(site, title),
+        transport=httpx.MockTransport(handler),
+    )
+    monkeypatch.setattr(server, "_expander", expander)
+
+    start = time.perf_counter()
+    response = await server.crawl_biligame_wiki(BILIGAME_URL, deadline_seconds=0.5)
+
+    assert time.perf_counter() - start < 1
+    assert response["status"] == "success"
+    assert response["partial"] is True
+    assert response["result"] == "== 简介 ==\n{{:赛马娘/通用}}"
+    # A partial page is not cached.
+    assert server._wiki_cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_library_expansion_returns_root_page_at_the_deadline(
+    wiki_server, monkeypatch
+) -> None:
+    async def fetch(url: str, **_: object) -> str:
+        await asyncio.sleep(5)
+        return "expanded"
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        pages = [{"revisions": [{"revid": 1, "slots": {"main": {"content": "== 简介 =="}}}]}]
+        return httpx.Response(200, json={"query": {"pages": pages}})
+
+    # offline_server leaves _expander unset, so expansion goes through the library.
+    monkeypatch.setattr(server, "fetch_biligame_wikitext_expanded", fetch)
+    monkeypatch.setattr(
+        server,
+        "_wiki_pages",
+        WikiExpander(
+            ResultCache(wiki_server / "cache.sqlite3", table="wiki_pages", ttl_seconds=0),
+            {"biligame": API_URL},
+            revision=lambda site, title, use_proxy: server._revisions.revision(site, title),
+            transport=httpx.MockTransport(handler),
+        ),
+    )
+
+    start = time.perf_counter()
+    response = await server.crawl_biligame_wiki(BILIGAME_URL, deadline_seconds=0.5)
+
+    assert time.perf_counter() - start < 1
+    assert response["status"] == "success"
+    assert response["partial"] is True
+    assert response["result"] == "== 简介 =="
+    assert server._wiki_cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_returns_finished_pages_at_the_deadline(wiki_server, monkeypatch) -> None:
+    async def fetch(url: str, **_: object) -> str:
+        if "slow" in url:
+            await asyncio.sleep(5)
+        return f"page {url}"
+
+    monkeypatch.setattr(server, "fetch_biligame_wikitext_expanded", fetch)
+    urls = [BILIGAME_URL, "https://wiki.biligame.com/umamusume/slow"]
+
+    start = time.perf_counter()
+    response = await server.crawl_wiki_batch(urls, deadline_seconds=0.5)
+
+    assert time.perf_counter() - start < 1
+    assert response["partial"] is True
+    assert response["results"][0]["status"] == "success"
+    assert response["results"][1]["status"] == "error"
+    assert "deadline" in response["results"][1]["message"]
@@ -0,0 +1,262 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.cache import ResultCache
+from umamusume_prompt.mcp.expand import WikiExpander, transcluded_titles, transclusion_body
+from umamusume_prompt.mcp.revisions import RevisionChecker
+
+API_URL = "https://wiki.biligame.com/umamusume/api.php"
+
+PAGES = {
+    "爱慕织姬": (1, "== 简介 ==\n{{:赛马娘/通用}}\n{{/台词}}\n{{角色信息|名字=爱慕织姬}}"),
+    "特别周": (2, "== 简介 ==\n{{:赛马娘/通用}}"),
+    "赛马娘/通用": (3, "<noinclude>说明</noinclude>通用内容{{:赛马娘/页脚}}"),
+    "赛马娘/页脚": (4, "页脚<includeonly>（嵌入）</includeonly>"),
+    "爱慕织姬/台词": (5, "<onlyinclude>台词内容</onlyinclude>其他"),
+    "东海帝皇": (
+        6,
+        "{{赛马娘信息|名字=东海帝皇|学校={{学校名}}}}\n== 简介 ==\n{{:赛马娘/通用}}\n"
+        "{{台词|训练员，看我的！}}\n{{赛马娘导航}}\n{{PAGENAME}} {{#if:x|{{学校名}}}}",
+    ),
+    "Template:赛马娘信息": (
+        7,
+        "<noinclude>信息框说明</noinclude>{| class=\"infobox\"\n|名字||{{{名字}}}\n"
+        "|学校||{{{学校|特雷森}}}\n|生日||{{{生日|资料未提及}}}\n|}",
+    ),
+    "Template:学校名": (8, "特雷森学园"),
+    "Template:台词": (9, "<includeonly>「{{{1}}}」</includeonly><noinclude>用法</noinclude>"),
+    "Template:赛马娘导航": (10, "导航：[[特别周]]·[[东海帝皇]]"),
+    "目白麦昆": (11, "{{赛马娘信息|名字=目白麦昆}}\n{{赛马娘导航}}"),
+}
+TEIO_EXPANDED = (
+    '{| class="infobox"\n|名字||东海帝皇\n|学校||特雷森学园\n|生日||资料未提及\n|}\n'
+    "== 简介 ==\n通用内容页脚（嵌入）\n「训练员，看我的！」\n导航：[[特别周]]·[[东海帝皇]]\n"
+    "{{PAGENAME}} {{#if:x|特雷森学园}}"
+)
+CONTENT = {revid: text for revid, text in PAGES.values()}
+
+
+class FakeRevisions:
+    def __init__(self) -> None:
+        self.lookups: list[str] = []
+
+    async def revision(self, site: str, title: str, use_proxy: bool = False) -> str | None:
+        self.lookups.append(title)
+        page = PAGES.get(title)
+        return f"{page[0]}:touched" if page else None
+
+
+def _expander(
+    directory, content_requests: list, revisions: FakeRevisions | None = None, **cache_options
+) -> WikiExpander:
+    def handler(request: httpx.Request) -> httpx.Response:
+        revids = [int(revid) for revid in request.url.params["revids"].split("|")]
+        content_requests.append(revids)
+        pages = [
+            {"revisions": [{"revid": revid, "slots": {"main": {"content": CONTENT[revid]}}}]}
+            for revid in revids
+        ]
+        return httpx.Response(200, json={"query": {"pages": pages}})
+
+    return WikiExpander(
+        ResultCache(directory / "cache.sqlite3", table="wiki_pages", **cache_options),
+        {"biligame": API_URL},
+        revision=(revisions or FakeRevisions()).revision,
+        fresh_seconds=0,
+        transport=httpx.MockTransport(handler),
+    )
+
+
+@pytest.fixture
+def wiki(tmp_path):
+    content_requests = []
+    revisions = FakeRevisions()
+    return _expander(tmp_path, content_requests, revisions), revisions, content_requests
+
+
+def test_transclusion_body_sections() -> None:
+    assert transclusion_body("a<noinclude>b</noinclude>c") == "ac"
+    assert transclusion_body("a<includeonly>b</includeonly>c") == "abc"
+    assert transclusion_body("a<onlyinclude>b</onlyinclude>c<onlyinclude>d</onlyinclude>") == "bd"
+
+
+@pytest.mark.asyncio
+async def test_expands_page_and_subpage_transclusions(wiki) -> None:
+    expander, _, content_requests = wiki
+
+    text = await expander.expand("biligame", "爱慕织姬", max_depth=2, max_pages=10)
+
+    assert text == "== 简介 ==\n通用内容页脚（嵌入）\n台词内容\n{{角色信息|名字=爱慕织姬}}"
+    # One request for the root, then one batched request per level.
+    assert content_requests == [[1], [3, 5], [4]]
+
+
+@pytest.mark.asyncio
+async def test_templates_are_expanded_with_their_arguments(wiki) -> None:
+    expander, _, content_requests = wiki
+
+    text = await expander.expand("biligame", "东海帝皇", max_depth=2, max_pages=10)
+
+    assert text == TEIO_EXPANDED
+    # Page transclusions first, then templates; nested template calls included.
+    assert content_requests == [[6], [3, 7, 8, 9, 10], [4]]
+
+
+@pytest.mark.asyncio
+async def test_templates_are_shared_across_characters(wiki) -> None:
+    expander, _, content_requests = wiki
+    await expander.expand("biligame", "东海帝皇", max_depth=2, max_pages=10)
+    content_requests.clear()
+
+    text = await expander.expand("biligame", "目白麦昆", max_depth=2, max_pages=10)
+
+    assert content_requests == [[11]]
+    assert "|名字||目白麦昆\n|学校||特雷森\n" in text
+    assert text.endswith("导航：[[特别周]]·[[东海帝皇]]")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("title", ["爱慕织姬", "特别周", "东海帝皇", "目白麦昆"])
+async def test_cached_expansion_matches_uncached(title: str, tmp_path) -> None:
+    # Parity: the shared cache must not change what an expansion returns,
+    # cold, warm, or with the cache switched off entirely.
+    requests: list = []
+    cached = _expander(tmp_path / "cached", requests)
+    uncached = _expander(tmp_path / "uncached", [], ttl_seconds=0)
+
+    cold = await cached.expand("biligame", title, max_depth=2, max_pages=10)
+    requests.clear()
+    warm = await cached.expand("biligame", title, max_depth=2, max_pages=10)
+    direct = await uncached.expand("biligame", title, max_depth=2, max_pages=10)
+
+    assert cold == warm == direct
+    assert requests == []
+    assert "{{:" not in cold and "{{/" not in cold
+
+
+def test_magic_words_and_parser_functions_are_not_fetched() -> None:
+    text = "{{PAGENAME}}{{!}}{{#if:a|{{学校名}}}}{{subst:台词}}{{DISPLAYTITLE:x}}{{模板:台词|a}}"
+
+    assert transcluded_titles("东海帝皇", text) == ["Template:学校名", "Template:台词"]
+
+
+@pytest.mark.asyncio
+async def test_shared_pages_are_fetched_once(wiki) -> None:
+    expander, _, content_requests = wiki
+
+    first, second = await asyncio.gather(
+        expander.expand("biligame", "爱慕织姬", max_depth=2, max_pages=10),
+        expander.expand("biligame", "特别周", max_depth=2, max_pages=10),
+    )
+
+    assert second == "== 简介 ==\n通用内容页脚（嵌入）"
+    assert "通用内容" in first
+    fetched = [revid for batch in content_requests for revid in batch]
+    assert sorted(fetched) == [1, 2, 3, 4, 5]
+    assert expander.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_revisions_skip_content_requests(wiki) -> None:
+    expander, revisions, content_requests = wiki
+    await expander.expand("biligame", "爱慕织姬", max_depth=2, max_pages=10)
+    content_requests.clear()
+
+    await expander.expand("biligame", "爱慕织姬", max_depth=2, max_pages=10)
+
+    assert content_requests == []
+    assert expander.stats()["pages_cached"] == 4
+    assert revisions.lookups.count("赛马娘/通用") == 2
+
+
+@pytest.mark.asyncio
+async def test_depth_and_page_limits(wiki) -> None:
+    expander, _, _ = wiki
+
+    shallow = await expander.expand("biligame", "爱慕织姬", max_depth=1, max_pages=10)
+    limited = await expander.expand("biligame", "爱慕织姬", max_depth=2, max_pages=1)
+
+    assert "通用内容{{:赛马娘/页脚}}" in shallow
+    assert "通用内容{{:赛马娘/页脚}}" in limited
+    assert "{{/台词}}" in limited
+
+
+@pytest.mark.asyncio
+async def test_missing_root_page_raises(wiki) -> None:
+    expander, _, _ = wiki
+
+    with pytest.raises(LookupError):
+        await expander.expand("biligame", "不存在", max_depth=1, max_pages=5)
+
+
+@pytest.mark.asyncio
+async def test_server_falls_back_to_library_expansion(offline_server, monkeypatch) -> None:
+    async def broken(*args: object, **kwargs: object) -> str:
+        raise httpx.ConnectError("api.php unreachable")
+
+    async def fetch(url: str, **_: object) -> str:
+        return "library wikitext"
+
+    class BrokenExpander:
+        expand_until = staticmethod(broken)
+
+    offline_server(biligame=fetch)
+    monkeypatch.setattr(server, "_expander", BrokenExpander())
+
+    text, complete, _ = await server._fetch_expanded(
+        "biligame",
+        "https://wiki.biligame.com/umamusume/爱慕织姬",
+        "爱慕织姬",
+        max_depth=1,
+        max_pages=5,
+        use_proxy=False,
+        page_revision=None,
+    )
+
+    assert text == "library wikitext"
+    assert complete
+
+
+@pytest.mark.skipif(
+    not os.getenv("RUN_LIVE_WIKI_TESTS"), reason="live wiki; set RUN_LIVE_WIKI_TESTS=1 to run"
+)
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("site", "title"),
+    [("biligame", "东海帝皇"), ("biligame", "爱慕织姬"), ("moegirl", "东海帝王")],
+)
+async def test_shared_expander_matches_library(site: str, title: str, tmp_path) -> None:
+    # Character pages mix {{:Page}} transclusions with infobox templates; what
+    # the agent sees is the parsed markdown, so that is what must agree.
+    from umamusume_web_crawler.web.biligame import fetch_biligame_wikitext_expanded
+    from umamusume_web_crawler.web.moegirl import fetch_moegirl_wikitext_expanded
+    from umamusume_web_crawler.web.parse_wiki_infobox import (
+        parse_wiki_page,
+        wiki_page_to_llm_markdown,
+    )
+
+    api_urls = {"biligame": server._BILIGAME_API_URL, "moegirl": server._MOEGIRL_API_URL}
+    revisions = RevisionChecker(api_urls)
+    expander = WikiExpander(
+        ResultCache(tmp_path / "pages.sqlite3", table="wiki_pages", ttl_seconds=0),
+        api_urls,
+        revision=lambda site, title, use_proxy: revisions.revision(site, title, use_proxy=use_proxy),
+    )
+    fetch = (
+        fetch_biligame_wikitext_expanded
+        if site == "biligame"
+        else fetch_moegirl_wikitext_expanded
+    )
+    base = server._BILIGAME_BASE_URL if site == "biligame" else server._MOEGIRL_BASE_URL
+
+    library = await fetch(base + title, max_depth=1, max_pages=5)
+    shared = await expander.expand(site, title, max_depth=1, max_pages=5)
+
+    assert "{{" in library
+    assert wiki_page_to_llm_markdown(
+        title, parse_wiki_page(shared, site=site), site=site
+    ) == wiki_page_to_llm_markdown(title, parse_wiki_page(library, site=site), site=site)
@@ -0,0 +1,126 @@
+"""
+Wiki tools must keep working while blocking Google calls run.
+
+The latency comparison is a benchmark:
+RUN_BENCHMARKS=1 pytest tests/test_mcp_google_offload.py -s
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.offload import BlockingPool
+
+GOOGLE_DELAY_S = 0.5
+WIKI_DELAY_S = 0.02
+
+
+def _slow_google(query: str, num: int = 5, use_proxy: bool | None = None) -> list:
+    time.sleep(GOOGLE_DELAY_S)
+    return [{"url": f"https://example.com/{query}", "priority": 1}]
+
+
+async def _fake_fetch(url: str, **_: object) -> str:
+    await asyncio.sleep(WIKI_DELAY_S)
+    return f"== 简介 ==\n{url}"
+
+
+@pytest.fixture
+def google_server(offline_server, monkeypatch):
+    offline_server(biligame=_fake_fetch, max_concurrency=100)
+    monkeypatch.setattr(server, "google_search_urls", _slow_google)
+    monkeypatch.setattr(server, "google_search_page_urls", _slow_google)
+    monkeypatch.setattr(
+        server,
+        "_google_pool",
+        BlockingPool("google", max_workers=4, timeout_seconds=5),
+    )
+    return server
+
+
+async def _timed_wiki_call(idx: int) -> float:
+    start = time.perf_counter()
+    result = await server.crawl_biligame_wiki(f"角色{idx}")
+    assert result["status"] == "success"
+    return time.perf_counter() - start
+
+
+def _gate_google(monkeypatch) -> threading.Event:
+    release = threading.Event()
+
+    def gated_google(query: str, num: int = 5, use_proxy: bool | None = None) -> list:
+        release.wait(timeout=10)
+        return [{"url": f"https://example.com/{query}", "priority": 1}]
+
+    monkeypatch.setattr(server, "google_search_urls", gated_google)
+    monkeypatch.setattr(server, "google_search_page_urls", gated_google)
+    return release
+
+
+@pytest.mark.asyncio
+async def test_wiki_calls_finish_while_google_calls_block(google_server, monkeypatch) -> None:
+    release = _gate_google(monkeypatch)
+    google_calls = [
+        asyncio.create_task(google_server.web_search_google(f"query {i}"))
+        for i in range(4)
+    ] + [
+        asyncio.create_task(google_server.crawl_google_page(f"page {i}"))
+        for i in range(4)
+    ]
+    try:
+        wiki_results = await asyncio.gather(
+            *(server.crawl_biligame_wiki(f"角色{i}") for i in range(10))
+        )
+        assert all(result["status"] == "success" for result in wiki_results)
+        # Google calls are still held in their threads; a blocked event loop
+        # could not have finished the wiki calls first.
+        assert not any(task.done() for task in google_calls)
+    finally:
+        release.set()
+    google_results = await asyncio.gather(*google_calls)
+    assert all(result.get("results") for result in google_results)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_wiki_latency_flat_during_google_calls(google_server) -> None:
+    baseline = await asyncio.gather(*(_timed_wiki_call(i) for i in range(10)))
+
+    google_calls = [
+        asyncio.create_task(google_server.web_search_google(f"query {i}"))
+        for i in range(4)
+    ] + [
+        asyncio.create_task(google_server.crawl_google_page(f"page {i}"))
+        for i in range(4)
+    ]
+    await asyncio.sleep(0.05)
+    under_load = await asyncio.gather(*(_timed_wiki_call(i + 100) for i in range(10)))
+    google_results = await asyncio.gather(*google_calls)
+
+    print(
+        f"\nwiki latency baseline max={max(baseline) * 1000:.1f}ms, "
+        f"under google load max={max(under_load) * 1000:.1f}ms"
+    )
+    assert all(result.get("results") for result in google_results)
+    # A blocked event loop would add at least one full Google call to every wiki call.
+    assert max(under_load) < GOOGLE_DELAY_S / 2
+
+
+@pytest.mark.asyncio
+async def test_google_call_timeout(google_server, monkeypatch) -> None:
+    monkeypatch.setattr(
+        server,
+        "_google_pool",
+        BlockingPool("google", max_workers=1, timeout_seconds=0.1),
+    )
+    release = _gate_google(monkeypatch)
+    try:
+        # The search is held until after the call returns.
+        result = await google_server.web_search_google("timeout query")
+    finally:
+        release.set()
+    assert result["results"] == []
+    assert "timed out" in result["error"]
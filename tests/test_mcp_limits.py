@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+from umamusume_prompt.mcp.limits import (
+    HostLimits,
+    UpstreamBusyError,
+    UpstreamGovernor,
+)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_out_requests() -> None:
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=20, burst=2, max_concurrency=10)
+    )
+
+    async def call() -> None:
+        async with governor.slot("wiki.biligame.com"):
+            pass
+
+    start = time.monotonic()
+    await asyncio.gather(*(call() for _ in range(6)))
+    elapsed = time.monotonic() - start
+
+    # Two requests use the burst, the other four wait 1/20s each.
+    assert elapsed >= 0.18
+    stats = governor.stats()["wiki.biligame.com"]
+    assert stats["acquired"] == 6
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait_seconds"] > 0
+
+
+@pytest.mark.asyncio
+async def test_multi_request_slot_is_charged_per_request() -> None:
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=50, burst=1, max_concurrency=10)
+    )
+
+    async with governor.slot("wiki.biligame.com", cost=6):
+        pass
+    start = time.monotonic()
+    async with governor.slot("wiki.biligame.com"):
+        pass
+    elapsed = time.monotonic() - start
+
+    # The expansion left the bucket five requests in debt: 6/50s to refill.
+    assert elapsed >= 0.1
+    assert governor.stats()["wiki.biligame.com"]["acquired"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_host() -> None:
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=0, burst=1, max_concurrency=2)
+    )
+    running = 0
+    peak = 0
+
+    async def call(host: str) -> None:
+        nonlocal running, peak
+        async with governor.slot(host):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+    await asyncio.gather(*(call("mzh.moegirl.org.cn") for _ in range(6)))
+    assert peak == 2
+
+    # Hosts do not share limits.
+    peak = 0
+    await asyncio.gather(call("a.example"), call("b.example"), call("c.example"))
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_queue_deadline_raises_busy_error() -> None:
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=0, burst=1, max_concurrency=1),
+        queue_timeout_seconds=0.05,
+    )
+    release = asyncio.Event()
+
+    async def holder() -> None:
+        async with governor.slot("www.googleapis.com"):
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    assert governor.stats()["www.googleapis.com"]["in_flight"] == 1
+
+    with pytest.raises(UpstreamBusyError):
+        async with governor.slot("www.googleapis.com"):
+            pass
+
+    release.set()
+    await task
+    stats = governor.stats()["www.googleapis.com"]
+    assert stats["timeouts"] == 1
+    assert stats["in_flight"] == 0
+
+    # The slot is usable again once the holder releases it.
+    async with governor.slot("www.googleapis.com"):
+        pass
+
+
+def test_host_overrides() -> None:
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=2, burst=4, max_concurrency=4),
+        host_limits={"wiki.biligame.com": HostLimits(1, 1, 1)},
+    )
+    assert governor.for_host("WIKI.biligame.com").limits == HostLimits(1, 1, 1)
+    assert governor.for_host("mzh.moegirl.org.cn").limits.max_concurrency == 4
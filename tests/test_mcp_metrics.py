@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.limits import HostLimits, UpstreamGovernor
+from umamusume_prompt.mcp.metrics import MetricsRegistry, ToolMetrics
+
+
+def test_render_counters_and_histograms() -> None:
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls.", ("tool",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("tool",), buckets=(0.1, 1.0))
+    calls.inc('say "hi"')
+    calls.inc("b", amount=2)
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "b")
+
+    text = registry.render()
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{tool="say \\"hi\\""} 1' in text
+    assert 'calls_total{tool="b"} 2' in text
+    assert 'latency_seconds_bucket{tool="b",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{tool="b",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{tool="b",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{tool="b"} 3' in text
+
+
+@pytest.mark.asyncio
+async def test_instrument_counts_outcomes_and_exception_types() -> None:
+    metrics = ToolMetrics()
+
+    @metrics.instrument
+    async def lookup(ok: bool) -> dict:
+        try:
+            if not ok:
+                raise LookupError("missing")
+            return {"status": "success"}
+        except LookupError as exc:
+            metrics.exception(exc)
+            return {"status": "error", "message": str(exc)}
+
+    @metrics.instrument
+    async def broken() -> dict:
+        raise TimeoutError
+
+    await lookup(True)
+    await lookup(False)
+    with pytest.raises(TimeoutError):
+        await broken()
+
+    assert metrics.calls.value("lookup", "success") == 1
+    assert metrics.calls.value("lookup", "error") == 1
+    assert metrics.calls.value("broken", "error") == 1
+    assert metrics.errors.value("lookup", "LookupError") == 1
+    assert metrics.errors.value("broken", "TimeoutError") == 1
+    assert metrics.latency.count("lookup") == 2
+
+
+@pytest.mark.asyncio
+async def test_upstream_queue_depth_and_wait_are_exported() -> None:
+    metrics = ToolMetrics()
+    governor = UpstreamGovernor(
+        HostLimits(rate_per_second=0, burst=1, max_concurrency=1),
+        on_queue=metrics.queued,
+        on_wait=metrics.waited,
+    )
+    release = asyncio.Event()
+
+    async def call() -> None:
+        async with governor.slot("wiki.biligame.com"):
+            await release.wait()
+
+    tasks = [asyncio.create_task(call()) for _ in range(3)]
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert metrics.upstream_queue_depth.value("wiki.biligame.com") == 2
+    assert 'mcp_upstream_queue_depth{host="wiki.biligame.com"} 2' in metrics.render()
+
+    release.set()
+    await asyncio.gather(*tasks)
+    text = metrics.render()
+    assert "# TYPE mcp_upstream_queue_depth gauge" in text
+    assert 'mcp_upstream_queue_depth{host="wiki.biligame.com"} 0' in text
+    assert metrics.upstream_wait.count("wiki.biligame.com") == 3
+    assert 'mcp_upstream_wait_seconds_count{host="wiki.biligame.com"} 3' in text
+
+
+@pytest.mark.asyncio
+async def test_server_tools_report_metrics(offline_server) -> None:
+    async def fetch(url: str, **_: object) -> str:
+        await asyncio.sleep(0)
+        if "missing" in url:
+            raise KeyError(url)
+        return "ウマ娘" * 10
+
+    offline_server(biligame=fetch)
+    metrics = server._tool_metrics
+    before_bytes = metrics.upstream_bytes.value(server._BILIGAME_HOST)
+    before_errors = metrics.errors.value("crawl_wiki_batch", "KeyError")
+    before_batches = metrics.calls.value("crawl_wiki_batch", "success")
+    before_pages = metrics.calls.value("crawl_biligame_wiki", "success")
+
+    await server.crawl_wiki_batch(
+        [
+            "https://wiki.biligame.com/umamusume/爱慕织姬",
+            "https://wiki.biligame.com/umamusume/missing",
+        ]
+    )
+
+    assert metrics.upstream_bytes.value(server._BILIGAME_HOST) - before_bytes == 90
+    assert metrics.errors.value("crawl_wiki_batch", "KeyError") - before_errors == 1
+    assert metrics.calls.value("crawl_wiki_batch", "success") - before_batches == 1
+    # Batch pages are crawled through the helpers, not counted again as tool calls.
+    assert metrics.calls.value("crawl_biligame_wiki", "success") == before_pages
+
+    client = TestClient(server.create_starlette_app(server.mcp._mcp_server))
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'mcp_tool_errors_total{tool="crawl_wiki_batch",exception="KeyError"}' in response.text
+    assert "# TYPE mcp_tool_latency_seconds histogram" in response.text
+
+
+async def _best_of(fn, rounds: int, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_instrumentation_overhead_is_small() -> None:
+    metrics = ToolMetrics()
+
+    async def noop() -> dict:
+        return {"status": "success"}
+
+    rounds = 20_000
+    plain = await _best_of(noop, rounds)
+    wrapped = await _best_of(metrics.instrument(noop), rounds)
+    per_call_us = (wrapped - plain) / rounds * 1e6
+    assert per_call_us < 20
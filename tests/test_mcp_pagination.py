@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.cache import ResultCache
+from umamusume_prompt.mcp.pagination import CursorError, DocumentStore, split_sections
+
+BILIGAME_URL = "https://wiki.biligame.com/umamusume/爱慕织姬"
+
+
+def _wiki_markdown(sections: int) -> str:
+    parts = ["# 爱慕织姬\n\n简介。\n\n"]
+    for idx in range(sections):
+        body = "\n\n".join(f"第{idx}节第{line}段，天皇赏与训练员的故事。" for line in range(12))
+        parts.append(f"## 章节 {idx}\n\n{body}\n\n")
+    return "".join(parts)
+
+
+def test_pages_join_back_and_start_at_headings() -> None:
+    text = _wiki_markdown(40)
+    pages = split_sections(text, 1200)
+
+    assert "".join(pages) == text
+    assert len(pages) > 1
+    assert all(len(page) <= 1200 for page in pages)
+    assert all(page.startswith("## ") for page in pages[1:])
+
+
+def test_oversized_sections_fall_back_to_smaller_boundaries() -> None:
+    text = "## 台词\n\n" + "\n".join("“我会在星空下奔跑。”" * 3 for _ in range(200)) + "x" * 5000
+    pages = split_sections(text, 500)
+
+    assert "".join(pages) == text
+    assert all(len(page) <= 500 for page in pages)
+    assert split_sections("short", 500) == ["short"]
+
+
+def test_store_walks_pages_by_cursor(tmp_path) -> None:
+    store = DocumentStore(ResultCache(tmp_path / "docs.sqlite3"), page_chars=1200)
+    text = _wiki_markdown(20)
+
+    page = store.first_page(text)
+    collected = [page["result"]]
+    while page["next_cursor"]:
+        page = store.page(page["next_cursor"])
+        collected.append(page["result"])
+
+    assert "".join(collected) == text
+    assert page["page"] == page["total_pages"] == len(collected)
+    with pytest.raises(CursorError):
+        store.page("unknown:1")
+    with pytest.raises(CursorError):
+        store.page(f"{store.first_page(text)['next_cursor'].split(':')[0]}:999")
+
+
+def test_store_without_cache_cuts_at_page_size(tmp_path) -> None:
+    store = DocumentStore(ResultCache(tmp_path / "docs.sqlite3", ttl_seconds=0), page_chars=100)
+    text = _wiki_markdown(5)
+    page = store.first_page(text)
+
+    assert page["total_pages"] == 1
+    assert page["next_cursor"] is None
+    assert len(page["result"]) <= 100
+    assert text.startswith(page["result"])
+    assert page["truncated"] is True
+    assert page["original_length"] == len(text)
+    assert "truncated" not in store.first_page(text[:50])
+
+
+@pytest.mark.asyncio
+async def test_wiki_tool_serves_follow_up_pages_without_refetching(
+    offline_server, monkeypatch, tmp_path
+) -> None:
+    fetches = []
+
+    async def fetch(url: str, **_: object) -> str:
+        fetches.append(url)
+        await asyncio.sleep(0)
+        return _wiki_markdown(30)
+
+    offline_server(biligame=fetch)
+    monkeypatch.setattr(
+        server,
+        "_documents",
+        DocumentStore(ResultCache(tmp_path / "cache.sqlite3", table="documents"), page_chars=2000),
+    )
+
+    response = await server.crawl_biligame_wiki(BILIGAME_URL)
+    pages = [response["result"]]
+    while response["next_cursor"]:
+        response = await server.crawl_biligame_wiki(BILIGAME_URL, cursor=response["next_cursor"])
+        assert response["status"] == "success"
+        pages.append(response["result"])
+
+    assert len(pages) > 1
+    assert "".join(pages) == _wiki_markdown(30)
+    assert fetches == [BILIGAME_URL]
+
+    expired = await server.crawl_biligame_wiki(BILIGAME_URL, cursor="gone:1")
+    assert expired["status"] == "error"
+    assert "without a cursor" in expired["message"]
@@ -0,0 +1,91 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from umamusume_prompt.mcp import server
+
+ROSTER = ["爱慕织姬", "特别周", "东海帝皇", "无声铃鹿"]
+
+
+@dataclass
+class ParsedPage:
+    title: str
+    sections: dict[str, str]
+
+
+class FixedRevisions:
+    async def revision(self, site: str, title: str, *, use_proxy: bool = False) -> str:
+        return "1:2025-01-01T00:00:00Z"
+
+
+@pytest.fixture
+def counts(offline_server, monkeypatch):
+    counts = {"fetch": 0, "parse": 0}
+
+    async def fetch(url: str, **_: object) -> str:
+        counts["fetch"] += 1
+        await asyncio.sleep(0)
+        return f"== 简介 ==\n{url}\n== 性格 ==\n" + "认真而温柔。" * 200
+
+    def parse(wikitext: str, site: str) -> ParsedPage:
+        counts["parse"] += 1
+        intro, personality = wikitext.split("== 性格 ==\n")
+        return ParsedPage(site, {"简介": intro, "性格": personality})
+
+    offline_server(
+        biligame=fetch,
+        parse=parse,
+        render=lambda heading, page, site: f"# {heading}\n\n{page.sections['简介']}",
+        wiki_cache={"table": "wiki_sources"},
+        parsed_cache={"table": "parsed_pages", "codec": "pickle"},
+    )
+    monkeypatch.setattr(server, "_revisions", FixedRevisions())
+    return counts
+
+
+async def _crawl_roster() -> list[str]:
+    results = []
+    for name in ROSTER:
+        results.append(
+            await server._crawl_wiki(
+                "biligame",
+                f"https://wiki.biligame.com/umamusume/{name}",
+                max_depth=1,
+                max_pages=5,
+                use_proxy=None,
+            )
+        )
+    return results
+
+
+@pytest.mark.asyncio
+async def test_renderer_change_reuses_parsed_pages(monkeypatch, counts) -> None:
+    first = await _crawl_roster()
+    assert counts == {"fetch": len(ROSTER), "parse": len(ROSTER)}
+    assert first[0].startswith("# 爱慕织姬")
+
+    monkeypatch.setattr(
+        server,
+        "wiki_page_to_llm_markdown",
+        lambda heading, page, site: f"## {heading}\n\n{page.sections['性格'][:6]}",
+    )
+    rerendered = await _crawl_roster()
+
+    assert counts == {"fetch": len(ROSTER), "parse": len(ROSTER)}
+    assert rerendered[1] == "## 特别周\n\n认真而温柔。"
+    assert server._parsed_cache.stats()["bytes"] < server._wiki_cache.stats()["bytes"]
+
+
+@pytest.mark.asyncio
+async def test_unreadable_parsed_record_is_parsed_again(monkeypatch, counts) -> None:
+    await _crawl_roster()
+    def stale_class(payload: bytes) -> object:
+        raise ModuleNotFoundError("parser module moved")
+
+    monkeypatch.setattr(server._parsed_cache, "_decode", stale_class)
+
+    results = await _crawl_roster()
+
+    assert results[0].startswith("# 爱慕织姬")
+    assert counts == {"fetch": len(ROSTER), "parse": 2 * len(ROSTER)}
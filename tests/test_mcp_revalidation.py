@@ -0,0 +1,181 @@
+import asyncio
+import dataclasses
+import json
+
+import httpx
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.revisions import RevisionChecker, parse_info_response
+
+API_URL = "https://wiki.biligame.com/umamusume/api.php"
+
+
+def test_parse_info_follows_normalization_and_redirects() -> None:
+    payload = {
+        "query": {
+            "normalized": [{"from": "爱慕_织姬", "to": "爱慕 织姬"}],
+            "redirects": [{"from": "爱慕 织姬", "to": "爱慕织姬"}],
+            "pages": [
+                {"title": "爱慕织姬", "lastrevid": 42, "touched": "2025-01-01T00:00:00Z"},
+                {"title": "不存在", "missing": True},
+            ],
+        }
+    }
+    revisions = parse_info_response(payload, ["爱慕_织姬", "爱慕织姬", "不存在"])
+
+    assert revisions == {
+        "爱慕_织姬": "42:2025-01-01T00:00:00Z",
+        "爱慕织姬": "42:2025-01-01T00:00:00Z",
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_query() -> None:
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        titles = request.url.params["titles"].split("|")
+        pages = [{"title": title, "lastrevid": idx, "touched": "t"} for idx, title in enumerate(titles)]
+        return httpx.Response(200, json={"query": {"pages": pages}})
+
+    checker = RevisionChecker({"biligame": API_URL}, transport=httpx.MockTransport(handler))
+    titles = ["爱慕织姬", "特别周", "东海帝皇", "特别周"]
+    revisions = await asyncio.gather(*(checker.revision("biligame", title) for title in titles))
+
+    assert len(requests) == 1
+    assert requests[0].url.params["prop"] == "info"
+    assert revisions[1] == revisions[3]
+    assert len(set(revisions)) == 3
+    assert checker.stats()["queries"] == 1
+
+
+def test_batch_left_by_a_closed_loop_does_not_block_the_next(monkeypatch) -> None:
+    body = json.dumps({"query": {"pages": [{"title": "特别周", "lastrevid": 7, "touched": "t"}]}})
+    checker = RevisionChecker(
+        {"biligame": API_URL},
+        batch_window_seconds=60,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)),
+    )
+
+    async def abandon() -> None:
+        # Opens a batch whose flush timer never fires before the loop closes.
+        asyncio.ensure_future(checker.revision("biligame", "特别周"))
+        await asyncio.sleep(0)
+
+    asyncio.run(abandon())
+    checker.batch_window_seconds = 0.01
+
+    async def lookup() -> str | None:
+        return await asyncio.wait_for(checker.revision("biligame", "特别周"), timeout=1)
+
+    assert asyncio.run(lookup()) == "7:t"
+
+
+class FakeRevisions:
+    def __init__(self) -> None:
+        self.current = {"爱慕织姬": "100:2025-01-01T00:00:00Z"}
+        self.lookups = 0
+        self.fail = False
+        self.before: asyncio.Event | None = None
+
+    async def revision(self, site: str, title: str, *, use_proxy: bool = False) -> str | None:
+        self.lookups += 1
+        if self.before is not None:
+            await self.before.wait()
+        if self.fail:
+            raise httpx.ConnectError("wiki unreachable")
+        return self.current.get(title)
+
+
+@pytest.fixture
+def cached_wiki(offline_server, monkeypatch):
+    fetches = []
+    revisions = FakeRevisions()
+
+    async def fetch(url: str, **_: object) -> str:
+        fetches.append(url)
+        if revisions.before is not None:
+            revisions.before.set()
+        await asyncio.sleep(0)
+        return f"== 简介 ==\nrevision {len(fetches)}"
+
+    offline_server(
+        biligame=fetch,
+        wiki_cache={"table": "wiki_sources"},
+        parsed_cache={"table": "parsed_pages", "ttl_seconds": 0},
+    )
+    monkeypatch.setattr(
+        server,
+        "local_config",
+        dataclasses.replace(server.local_config, wiki_revalidate_after_seconds=0),
+    )
+    monkeypatch.setattr(server, "_revisions", revisions)
+    return fetches, revisions
+
+
+async def _crawl() -> str:
+    response = await server.crawl_biligame_wiki("https://wiki.biligame.com/umamusume/爱慕织姬")
+    assert response["status"] == "success"
+    return response["result"]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_page_is_served_from_cache(cached_wiki) -> None:
+    fetches, revisions = cached_wiki
+
+    assert await _crawl() == "== 简介 ==\nrevision 1"
+    assert await _crawl() == "== 简介 ==\nrevision 1"
+    assert len(fetches) == 1
+    assert revisions.lookups == 2
+
+    revisions.current["爱慕织姬"] = "101:2025-02-01T00:00:00Z"
+    assert await _crawl() == "== 简介 ==\nrevision 2"
+    assert len(fetches) == 2
+
+
+@pytest.mark.asyncio
+async def test_cold_miss_does_not_wait_for_a_revision_lookup(cached_wiki) -> None:
+    fetches, revisions = cached_wiki
+    # The lookup only answers once the fetch has started.
+    revisions.before = asyncio.Event()
+
+    assert await asyncio.wait_for(_crawl(), timeout=1) == "== 简介 ==\nrevision 1"
+    revisions.before = None
+    assert await _crawl() == "== 简介 ==\nrevision 1"
+    assert len(fetches) == 1
+
+
+@pytest.mark.asyncio
+async def test_touched_change_from_transclusion_triggers_refetch(cached_wiki) -> None:
+    fetches, revisions = cached_wiki
+    await _crawl()
+    revisions.current["爱慕织姬"] = "100:2025-03-01T00:00:00Z"
+
+    assert await _crawl() == "== 简介 ==\nrevision 2"
+
+
+@pytest.mark.asyncio
+async def test_cached_copy_is_served_when_revalidation_fails(cached_wiki) -> None:
+    fetches, revisions = cached_wiki
+    await _crawl()
+    revisions.fail = True
+
+    assert await _crawl() == "== 简介 ==\nrevision 1"
+    assert len(fetches) == 1
+    assert server._tool_metrics.revalidations.value("biligame", "error") >= 1
+
+
+def test_checker_reports_response_bytes() -> None:
+    seen = []
+    body = json.dumps({"query": {"pages": [{"title": "特别周", "lastrevid": 7, "touched": "t"}]}})
+    checker = RevisionChecker(
+        {"biligame": API_URL},
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)),
+        on_response=lambda site, content: seen.append((site, len(content))),
+    )
+
+    assert asyncio.run(checker.revision("biligame", "特别周")) == "7:t"
+    assert seen == [("biligame", len(body.encode()))]
+    assert len(body) < 500
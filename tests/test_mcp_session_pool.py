@@ -0,0 +1,112 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from mcp import McpError
+from mcp.types import (
+    CONNECTION_CLOSED,
+    CallToolResult,
+    ErrorData,
+    ListToolsResult,
+    TextContent,
+    Tool,
+)
+
+from umamusume_prompt.pipeline import McpSessionPool
+
+
+class FakeSession:
+    def __init__(self, server: "FakeServer", number: int) -> None:
+        self.server = server
+        self.number = number
+        self.dropped = False
+
+    async def list_tools(self, cursor: str | None = None, **_: object) -> ListToolsResult:
+        self.server.list_calls += 1
+        schema = {"type": "object", "properties": {"keyword": {"type": "string"}}}
+        return ListToolsResult(tools=[Tool(name="biligame_wiki_search", inputSchema=schema)])
+
+    async def call_tool(self, name: str, arguments: dict | None = None, **_: object):
+        if self.dropped:
+            raise McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed"))
+        await asyncio.sleep(0.01)
+        text = f"{name}:{arguments['keyword']}@{self.number}"
+        return CallToolResult(content=[TextContent(type="text", text=text)])
+
+
+class FakeServer:
+    def __init__(self) -> None:
+        self.sessions: list[FakeSession] = []
+        self.open = 0
+        self.list_calls = 0
+
+    @asynccontextmanager
+    async def connect(self):
+        session = FakeSession(self, len(self.sessions))
+        self.sessions.append(session)
+        self.open += 1
+        try:
+            yield session
+        finally:
+            self.open -= 1
+
+
+async def _invoke(tool, keyword: str) -> str:
+    (block,) = await tool.ainvoke({"keyword": keyword})
+    return block["text"]
+
+
+@pytest.mark.asyncio
+async def test_tools_load_once_and_calls_share_sessions() -> None:
+    server = FakeServer()
+    async with McpSessionPool("http://mcp", 2, connect=server.connect) as pool:
+        first, second = await asyncio.gather(pool.tools(), pool.tools())
+        assert first is second
+        (tool,) = first
+
+        results = await asyncio.gather(
+            *(_invoke(tool, f"角色{idx}") for idx in range(10))
+        )
+
+        assert server.list_calls == 1
+        assert len(server.sessions) == 2
+        assert sorted({result.rsplit("@", 1)[1] for result in results}) == ["0", "1"]
+        assert pool.stats() == {"sessions": 2, "connects": 2, "reconnects": 0}
+    assert server.open == 0
+
+
+@pytest.mark.asyncio
+async def test_dropped_session_reconnects_and_retries() -> None:
+    server = FakeServer()
+    async with McpSessionPool("http://mcp", 1, connect=server.connect) as pool:
+        (tool,) = await pool.tools()
+        server.sessions[0].dropped = True
+
+        result = await _invoke(tool, "黄金船")
+
+        assert result == "biligame_wiki_search:黄金船@1"
+        assert pool.stats()["reconnects"] == 1
+        await asyncio.sleep(0)
+        assert server.open == 1
+    assert server.open == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_connect_is_retried_on_next_use() -> None:
+    attempts = 0
+    server = FakeServer()
+
+    @asynccontextmanager
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise ConnectionError("server not up yet")
+        async with server.connect() as session:
+            yield session
+
+    async with McpSessionPool("http://mcp", 1, connect=flaky) as pool:
+        with pytest.raises(ConnectionError):
+            await pool.tools()
+        (tool,) = await pool.tools()
+        assert await _invoke(tool, "特别周") == "biligame_wiki_search:特别周@0"
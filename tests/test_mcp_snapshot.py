@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.snapshot import Snapshot
+from umamusume_prompt.mcp.title_index import TitleIndex
+
+ROSTER = {"爱慕织姬": "Admire Vega", "特别周": "Special Week", "东海帝皇": "Tokai Teio"}
+
+
+@pytest.fixture
+def wiki(offline_server, monkeypatch, tmp_path):
+    state = {"online": True, "fetches": 0, "searches": 0, "running": 0, "peak": 0}
+
+    def make_search(site: str):
+        async def search(keyword: str, limit: int = 5, use_proxy=None) -> list[str]:
+            if not state["online"]:
+                raise ConnectionError("network unreachable")
+            state["searches"] += 1
+            await asyncio.sleep(0)
+            return [keyword, f"{keyword}/语音"][:limit]
+
+        return search
+
+    def make_fetch(site: str):
+        async def fetch(url: str, **_: object) -> str:
+            if not state["online"]:
+                raise ConnectionError("network unreachable")
+            state["fetches"] += 1
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+            return f"{site}:{server._title_from_url(url)}"
+
+        return fetch
+
+    offline_server(
+        biligame=make_fetch("biligame"), moegirl=make_fetch("moegirl"), max_concurrency=100
+    )
+    for site in ("biligame", "moegirl"):
+        monkeypatch.setattr(server, f"search_{site}_titles", make_search(site))
+    monkeypatch.setattr(server, "_snapshot", None)
+    monkeypatch.setattr(
+        server,
+        "_title_index",
+        TitleIndex(tmp_path / "titles.json", sources={}, refresh_after_seconds=0),
+    )
+    return state
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_bounded_and_resumable(wiki, tmp_path) -> None:
+    directory = tmp_path / "snapshot"
+    failures = await server.prefetch_snapshot(Snapshot(directory), ROSTER, concurrency=2)
+
+    assert failures == {}
+    assert wiki["fetches"] == 2 * len(ROSTER)
+    assert wiki["peak"] <= 2
+    assert json.loads((directory / "manifest.json").read_text(encoding="utf-8"))["characters"] == 3
+
+    await server.prefetch_snapshot(Snapshot(directory), ROSTER, concurrency=2)
+    assert wiki["fetches"] == 2 * len(ROSTER)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_serves_tools_offline(monkeypatch, wiki, tmp_path) -> None:
+    directory = tmp_path / "snapshot"
+    await server.prefetch_snapshot(Snapshot(directory), ROSTER, concurrency=4)
+    monkeypatch.setattr(server, "_snapshot", Snapshot(directory))
+    wiki["online"] = False
+
+    search = await server.moegirl_wiki_search("admire  vega", limit=1)
+    assert [item["title"] for item in search["results"]] == ["爱慕织姬"]
+
+    crawl = await server.crawl_wiki_batch(
+        [item["url"] for item in search["results"]]
+        + ["https://wiki.biligame.com/umamusume/特别周"]
+    )
+    assert [item["result"] for item in crawl["results"]] == [
+        "moegirl:爱慕织姬",
+        "biligame:特别周",
+    ]
+
+    # Misses go to the live wiki, which is unreachable here.
+    miss = await server.biligame_wiki_search("无声铃鹿")
+    assert "network unreachable" in miss["error"]
+    wiki["online"] = True
+    live = await server.crawl_biligame_wiki("https://wiki.biligame.com/umamusume/无声铃鹿")
+    assert live["result"] == "biligame:无声铃鹿"
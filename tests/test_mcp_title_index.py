@@ -0,0 +1,226 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from umamusume_prompt.config import config
+from umamusume_prompt.characters import load_characters
+from umamusume_prompt.mcp import server
+from umamusume_prompt.mcp.limits import HostLimits, UpstreamGovernor
+from umamusume_prompt.mcp.title_index import IndexSource, TitleIndex
+
+API_URL = "https://wiki.biligame.com/umamusume/api.php"
+
+
+def _listing(titles: list[str]) -> httpx.MockTransport:
+    pages = [{"title": title} for title in titles]
+    return httpx.MockTransport(lambda request: httpx.Response(200, json={"query": {"pages": pages}}))
+
+
+async def _roster_index(tmp_path, titles: list[str] | None = None) -> TitleIndex:
+    """Roster-seeded index whose biligame listing holds ``titles`` (default: the roster)."""
+    roster = load_characters(config.characters_json)
+    source = IndexSource(API_URL, {"generator": "allpages"})
+    index = TitleIndex(
+        tmp_path / "titles.json",
+        sources={"biligame": source},
+        refresh_after_seconds=0,
+        transport=_listing(list(roster) if titles is None else titles),
+        roster=lambda: roster,
+    )
+    await index.refresh("biligame")
+    return index
+
+
+def test_roster_is_read_on_first_use(tmp_path) -> None:
+    reads = []
+
+    def roster() -> dict[str, str]:
+        reads.append(1)
+        return {"特别周": "Special Week"}
+
+    index = TitleIndex(tmp_path / "titles.json", sources={}, roster=roster)
+    assert reads == []
+
+    index.search("biligame", "特别周", 5)
+    index.search("biligame", "特别周", 5)
+    assert reads == [1]
+
+
+@pytest.mark.asyncio
+async def test_roster_names_resolve_once_title_is_confirmed(tmp_path) -> None:
+    index = await _roster_index(tmp_path, ["特别周", "目白麦昆", "东海帝皇"])
+
+    assert index.search("biligame", "特别周", 5)[0] == "特别周"
+    assert index.search("biligame", "special  week", 5)[0] == "特别周"
+    assert index.search("biligame", "Mejiro-McQueen", 1) == ["目白麦昆"]
+    assert index.search("biligame", "Tokai Teio", 1) == ["东海帝皇"]
+    assert index.search("biligame", "完全无关的词条", 5) == []
+    # Not listed, so the roster name is only a hint and the remote search decides.
+    assert index.search("biligame", "Admire Vega", 5) == []
+
+
+@pytest.mark.asyncio
+async def test_roster_hint_does_not_cross_sites(tmp_path) -> None:
+    source = IndexSource(API_URL, {"generator": "categorymembers"})
+    index = TitleIndex(
+        tmp_path / "titles.json",
+        sources={"moegirl": source},
+        refresh_after_seconds=0,
+        transport=_listing(["东海帝王"]),
+    )
+    index.seed_characters({"东海帝皇": "Tokai Teio"})
+    await index.refresh("moegirl")
+
+    # Moegirl titles the page 东海帝王; the biligame name must not answer locally,
+    # and the near-miss bigram score is too weak to stand in for it.
+    assert index.search("moegirl", "Tokai Teio", 5) == []
+    assert index.search("moegirl", "东海帝皇", 5) == []
+    assert index.search("moegirl", "东海帝王", 5) == ["东海帝王"]
+    await index.flush()
+
+
+@pytest.mark.asyncio
+async def test_only_keywords_naming_a_result_are_learned(tmp_path) -> None:
+    index = TitleIndex(tmp_path / "titles.json", sources={})
+
+    # "帝王" could mean several pages; the first remote result must not stick.
+    index.learn("moegirl", "帝王", ["东海帝王", "帝王光环"])
+    index.learn("moegirl", "tokai_teio", ["Tokai Teio", "东海帝王"])
+
+    assert index.search("moegirl", "帝王", 5) == []
+    assert index.search("moegirl", "Tokai Teio", 5) == ["Tokai Teio"]
+    assert index.search("moegirl", "帝王光环", 5) == ["帝王光环"]
+    await index.flush()
+
+
+@pytest.mark.asyncio
+async def test_learned_results_are_saved_in_one_batch(tmp_path, monkeypatch) -> None:
+    index = await _roster_index(tmp_path, [])
+    index.save_delay_seconds = 60
+    writes = []
+    write = index._write
+    monkeypatch.setattr(index, "_write", lambda payload: writes.append(payload) or write(payload))
+
+    index.learn("biligame", "新角色", ["新角色"])
+    index.learn("biligame", "另一个", ["另一个", "另一个/台词"])
+    await asyncio.sleep(0)
+    assert writes == []
+
+    await index.flush()
+    assert len(writes) == 1
+    reloaded = TitleIndex(tmp_path / "titles.json", sources={})
+    assert reloaded.search("biligame", "另一个", 1) == ["另一个"]
+    assert reloaded.search("biligame", "另一个/台词", 1) == ["另一个/台词"]
+    assert reloaded.search("biligame", "新角色", 1) == ["新角色"]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_lookup_is_microseconds(tmp_path) -> None:
+    index = await _roster_index(tmp_path)
+    roster = list(load_characters(config.characters_json).items())
+    index.search("biligame", "warmup", 1)
+
+    start = time.perf_counter()
+    for name_cn, name_en in roster:
+        index.search("biligame", name_cn, 5)
+        index.search("biligame", name_en, 5)
+    per_lookup_us = (time.perf_counter() - start) / (2 * len(roster)) * 1e6
+    print(f"\ntitle index lookup {per_lookup_us:.1f}us")
+    assert per_lookup_us < 500
+
+
+@pytest.mark.asyncio
+async def test_refresh_lists_pages_and_redirects_then_goes_incremental(tmp_path) -> None:
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        requests.append(dict(params))
+        if params.get("list") == "recentchanges":
+            return httpx.Response(200, json={"query": {"recentchanges": [{"title": "真弓快车"}]}})
+        if "gapcontinue" not in params:
+            return httpx.Response(
+                200,
+                json={
+                    "continue": {"gapcontinue": "东", "continue": "gapcontinue||"},
+                    "query": {
+                        "pages": [{"title": "爱慕织姬"}],
+                        "redirects": [{"from": "织姬", "to": "爱慕织姬"}],
+                    },
+                },
+            )
+        return httpx.Response(200, json={"query": {"pages": [{"title": "东海帝皇"}]}})
+
+    path = tmp_path / "titles.json"
+    source = IndexSource(API_URL, {"generator": "allpages", "gaplimit": "500"}, incremental=True)
+    index = TitleIndex(path, sources={"biligame": source}, transport=httpx.MockTransport(handler))
+
+    assert await index.refresh("biligame") == 3
+    assert len(requests) == 2
+    assert requests[0]["redirects"] == "1"
+
+    reloaded = TitleIndex(path, sources={"biligame": source}, transport=httpx.MockTransport(handler))
+    assert reloaded.search("biligame", "织姬", 5)[0] == "爱慕织姬"
+    await reloaded.refresh("biligame")
+    assert requests[-1]["list"] == "recentchanges"
+    assert reloaded.search("biligame", "真弓快车", 1) == ["真弓快车"]
+
+
+@pytest.mark.asyncio
+async def test_search_tool_uses_index_and_learns_from_remote(monkeypatch, tmp_path) -> None:
+    remote = []
+
+    async def search(keyword: str, limit: int = 5, use_proxy=None) -> list[str]:
+        remote.append(keyword)
+        await asyncio.sleep(0)
+        return {"Admire Vega": ["爱慕织姬", "爱慕织姬/台词"]}.get(keyword, ["新角色"])
+
+    monkeypatch.setattr(server, "search_biligame_titles", search)
+    monkeypatch.setattr(server, "_title_index", await _roster_index(tmp_path))
+    monkeypatch.setattr(server, "_snapshot", None)
+    monkeypatch.setattr(
+        server,
+        "_upstream",
+        UpstreamGovernor(HostLimits(rate_per_second=0, burst=1, max_concurrency=10)),
+    )
+
+    single = await server.biligame_wiki_search("Admire Vega", limit=1)
+    assert [item["title"] for item in single["results"]] == ["爱慕织姬"]
+    assert remote == []
+
+    # Fewer local hits than the limit: topped up from the remote search.
+    topped_up = await server.biligame_wiki_search("Admire Vega")
+    assert [item["title"] for item in topped_up["results"]] == ["爱慕织姬", "爱慕织姬/台词"]
+    assert remote == ["Admire Vega"]
+
+    await server.biligame_wiki_search("新角色", limit=1)
+    again = await server.biligame_wiki_search("新角色", limit=1)
+    assert again["results"][0]["title"] == "新角色"
+    assert remote == ["Admire Vega", "新角色"]
+    await server._title_index.flush()
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_uses_the_callers_proxy(tmp_path, monkeypatch) -> None:
+    proxies = []
+    index = TitleIndex(
+        tmp_path / "titles.json",
+        sources={"biligame": IndexSource(API_URL, {"generator": "allpages"})},
+        proxy="http://proxy.example:8080",
+        transport=_listing(["特别周"]),
+    )
+    client = httpx.AsyncClient
+
+    def recording_client(**kwargs):
+        proxies.append(kwargs.get("proxy"))
+        return client(**kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", recording_client)
+    index.search("biligame", "特别周", 5, use_proxy=True)
+    await asyncio.gather(*index._tasks)
+    await index.refresh("biligame")
+
+    assert proxies == ["http://proxy.example:8080", None]
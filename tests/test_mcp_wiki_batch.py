@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from umamusume_prompt.mcp import server
+
+BILIGAME_URL = "https://wiki.biligame.com/umamusume/爱慕织姬"
+MOEGIRL_URL = "https://mzh.moegirl.org.cn/爱慕织姬"
+
+
+@pytest.fixture
+def fetch_state(offline_server):
+    state = {"running": 0, "peak": 0}
+
+    def make_fetch(site: str):
+        async def fetch(url: str, **_: object) -> str:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.02)
+            state["running"] -= 1
+            if "missing" in url:
+                raise RuntimeError(f"{site}: page not found")
+            return f"{site}:{url}"
+
+        return fetch
+
+    offline_server(
+        biligame=make_fetch("biligame"), moegirl=make_fetch("moegirl"), max_concurrency=100
+    )
+    return state
+
+
+@pytest.mark.asyncio
+async def test_batch_keeps_input_order_and_item_errors(fetch_state) -> None:
+    urls = [
+        MOEGIRL_URL,
+        "https://example.com/not-a-wiki",
+        BILIGAME_URL,
+        "https://wiki.biligame.com/umamusume/missing",
+    ]
+    response = await server.crawl_wiki_batch(urls)
+    results = response["results"]
+
+    assert [item["url"] for item in results] == urls
+    assert results[0]["status"] == "success"
+    assert results[0]["site"] == "moegirl"
+    assert results[0]["result"] == f"moegirl:{MOEGIRL_URL}"
+    assert results[1]["status"] == "error"
+    assert results[2]["status"] == "success"
+    assert results[2]["site"] == "biligame"
+    assert results[3]["status"] == "error"
+    assert "page not found" in results[3]["message"]
+
+
+@pytest.mark.asyncio
+async def test_batch_fan_out_is_bounded(fetch_state, monkeypatch) -> None:
+    monkeypatch.setattr(
+        server,
+        "local_config",
+        type("Cfg", (), {"wiki_batch_concurrency": 3})(),
+    )
+    urls = [f"https://wiki.biligame.com/umamusume/角色{idx}" for idx in range(9)]
+    response = await server.crawl_wiki_batch(urls)
+
+    assert all(item["status"] == "success" for item in response["results"])
+    assert fetch_state["peak"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_oversized_requests(fetch_state) -> None:
+    urls = [BILIGAME_URL] * (server._MAX_WIKI_BATCH_URLS + 1)
+    response = await server.crawl_wiki_batch(urls)
+    assert response["results"] == []
+    assert "Too many URLs" in response["error"]
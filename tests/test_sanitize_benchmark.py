@@ -0,0 +1,198 @@
+"""
+Equivalence checks and microbenchmark for the crawl_page sanitizer.
+
+Recorded pages placed in tests/data/crawl_pages/*.html (or *.md) are included
+automatically; a synthetic MediaWiki-style page is always used.
+
+RUN_BENCHMARKS=1 pytest tests/test_sanitize_benchmark.py -s
+"""
+
+import html
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from umamusume_prompt.mcp.sanitize import sanitize_crawl_result
+
+MAX_CHARS = 40_000
+RECORDED_DIR = Path(__file__).parent / "data" / "crawl_pages"
+
+
+def _reference_sanitize(raw_text: str, max_chars: int) -> tuple[str, bool, int]:
+    """The regex chain crawl_page used before the single-pass sanitizer."""
+    original_length = len(raw_text)
+    text = raw_text
+    if "<html" in raw_text.lower() or "<!doctype html" in raw_text.lower():
+        text = re.sub(
+            r"(?is)<(script|style|noscript|svg|iframe|head).*?>.*?</\1>", " ", raw_text
+        )
+        text = re.sub(r"(?i)<br\s*/?>", "\n", text)
+        text = re.sub(r"(?i)</p>", "\n", text)
+        text = re.sub(r"(?s)<[^>]+>", " ", text)
+        text = html.unescape(text)
+    text = text.replace("\r", "\n")
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    truncated = len(text) > max_chars
+    if truncated:
+        text = text[:max_chars]
+    return text, truncated, original_length
+
+
+def _synthetic_wiki_html(paragraphs: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    words = ["爱慕织姬", "特别周", "东海帝皇", "Admire Vega", "训练员", "天皇赏", "&amp;", "&lt;b&gt;", "&#12354;", "赛马娘"]
+    parts = [
+        "<!DOCTYPE html>\r\n<html lang=\"zh\"><head><meta charset=\"utf-8\">",
+        "<title>爱慕织姬 - 赛马娘WIKI</title><style>.mw-body{color:#222}\r\n</style>",
+        "<script>window.RLQ=window.RLQ||[];</script></head>\r\n<body class=\"mediawiki\">",
+        "<div id=\"mw-navigation\"><ul><li><a href=\"/\">首页</a></li></ul></div>",
+    ]
+    for idx in range(paragraphs):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 30)))
+        kind = idx % 6
+        if kind == 0:
+            parts.append(f"<h2><span class=\"mw-headline\" id=\"s{idx}\">章节 {idx}</span></h2>\r\n")
+        elif kind == 1:
+            parts.append(
+                "<table class=\"wikitable\"><tr><th>项目</th><th>内容</th></tr>"
+                f"<tr><td>速度</td><td>{rng.randint(70, 120)}</td></tr></table>\n\n\n"
+            )
+        elif kind == 2:
+            parts.append(f"<p>{sentence}<br/>{sentence}</p>\t\t\n")
+        elif kind == 3:
+            parts.append(f"<script type=\"text/javascript\">var x{idx} = '{sentence}';</script>")
+        elif kind == 4:
+            parts.append("<svg width=\"16\" height=\"16\"><path d=\"M0 0h16v16H0z\"/></svg>")
+        else:
+            parts.append(f"<p>  {sentence}  &nbsp; </P>\r\n\r\n\r\n")
+    parts.append("<noscript><img src=\"x.png\"></noscript></body></html>")
+    return "".join(parts)
+
+
+def _pages() -> list[tuple[str, str]]:
+    pages = [
+        ("synthetic-small", _synthetic_wiki_html(50)),
+        ("synthetic-large", _synthetic_wiki_html(40_000)),
+        ("markdown", "# 爱慕织姬\r\n\r\n\r\n" + "| 项目 | 内容 |\t\t\n" * 20_000),
+    ]
+    if RECORDED_DIR.is_dir():
+        for path in sorted(RECORDED_DIR.glob("*")):
+            if path.suffix in {".html", ".md", ".txt"}:
+                pages.append((path.name, path.read_text(encoding="utf-8")))
+    return pages
+
+
+@pytest.mark.parametrize("name,raw", _pages())
+def test_sanitizer_matches_reference(name: str, raw: str) -> None:
+    text, truncated, original_length = sanitize_crawl_result(raw, MAX_CHARS)
+    expected, expected_truncated, expected_length = _reference_sanitize(raw, MAX_CHARS)
+
+    assert truncated == expected_truncated
+    assert original_length == expected_length
+    if truncated:
+        body, marker = text.rsplit("\n\n[truncated, ", 1)
+        assert body == expected
+        assert marker == f"original_length={original_length}]"
+    else:
+        assert text == expected
+
+
+def test_sanitizer_edge_cases() -> None:
+    cases = [
+        "",
+        "  plain\r\ntext\r\r\n\n\n\tend  ",
+        "<html><body>a<br>b<BR />c</p>d&amp;e&#13;f</body></html>",
+        "<!doctype html><head><title>x</title></head><p>　全角　</p>",
+        "<html>" + "x" * (MAX_CHARS - 1) + "\n\r\n" + "y" * 10,
+    ]
+    for raw in cases:
+        expected, _, _ = _reference_sanitize(raw, MAX_CHARS)
+        text, truncated, _ = sanitize_crawl_result(raw, MAX_CHARS)
+        if truncated:
+            text = text.rsplit("\n\n[truncated, ", 1)[0]
+        assert text == expected, raw[:80]
+
+
+# Fragments for randomized pages: well-formed tags, stray '<', unclosed
+# tags, character references cut short, and whitespace runs.
+_FRAGMENTS = [
+    "<p>", "</p>", "</P>", "<br>", "<BR/>", "<br />", "<script>", "</script>",
+    "<style a='<'>", "</style>", "<head>", "</head>", "<svg", "</svg>", "<a href='x'>",
+    "</a>", "<!-- c -->", "<div>\n</div>\n", "<", ">", "<>", "</", "<br", "<br <p>",
+    "&amp;", "&amp", "&#3", "&#32;", "&#10;", "&nbsp;", "&lt;b&gt;", "&", "#", ";",
+    " ", "  ", "\t", "\n", "\n\n\n", "\r", "\r\n", "\u3000", "a", "bc",
+]
+_STRAY = {"<style a='<'>", "<svg", "<", "<>", "</", "<br", "<br <p>"}
+
+
+def _random_page(rng: random.Random, stray: bool) -> str:
+    fragments = [item for item in _FRAGMENTS if stray or item not in _STRAY]
+    parts = ["<html>" if rng.random() < 0.8 else ""]
+    for _ in range(rng.randint(0, 300)):
+        if rng.random() < 0.7:
+            parts.append(rng.choice(fragments))
+        else:
+            parts.append("字" * rng.randint(1, 30))
+    if rng.random() < 0.3:
+        # Long whitespace-only markup after the content.
+        parts.append("<div>\n</div>\n" * rng.randint(1, 200))
+    return "".join(parts)
+
+
+def _assert_matches_reference(raw: str, max_chars: int) -> None:
+    text, truncated, _ = sanitize_crawl_result(raw, max_chars)
+    expected, expected_truncated, _ = _reference_sanitize(raw, max_chars)
+    assert truncated == expected_truncated, (max_chars, raw[:200])
+    if truncated:
+        text = text.rsplit("\n\n[truncated, ", 1)[0]
+    assert text == expected, (max_chars, raw[:200])
+
+
+@pytest.mark.parametrize("stray", [False, True])
+def test_sanitizer_matches_reference_on_random_pages(stray: bool) -> None:
+    rng = random.Random(20240 + stray)
+    for _ in range(1500):
+        _assert_matches_reference(_random_page(rng, stray), rng.randint(1, 300))
+
+
+def test_trailing_whitespace_markup_is_not_truncation() -> None:
+    cap = 1000
+    raw = (
+        "<html><body><p>" + "字" * (cap - 10) + "</p>"
+        + "<div>\n</div>\n" * 40_000 + "</body></html>"
+    )
+
+    text, truncated, _ = sanitize_crawl_result(raw, cap)
+
+    assert not truncated
+    assert text == "字" * (cap - 10)
+
+
+def _best_of(fn, raw: str, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(raw, MAX_CHARS)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.benchmark
+def test_sanitizer_benchmark() -> None:
+    print()
+    speedups = {}
+    for name, raw in _pages():
+        old = _best_of(_reference_sanitize, raw)
+        new = _best_of(sanitize_crawl_result, raw)
+        speedups[name] = old / new
+        print(
+            f"{name:>18}: {len(raw) / 1e6:6.2f} MB  "
+            f"regex chain {old * 1000:8.2f} ms  single pass {new * 1000:8.2f} ms  "
+            f"x{old / new:.1f}"
+        )
+    # Large pages hit the early stop and must be clearly faster.
+    assert speedups["synthetic-large"] > 2
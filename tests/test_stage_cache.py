@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from umamusume_prompt import pipeline
+from umamusume_prompt.stage_cache import StageCache
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    calls = {"collect": 0, "write": 0}
+    templates = {
+        "collect_web.md": "collect {character_cn}",
+        "summarize_web.md": "summarize {character_cn}",
+        "web_info_format.md": "format",
+        "build_prompt.md": "write v1",
+        "umamusume_base_info.md": "base",
+    }
+
+    async def collect(mcp_url, character_cn, character_en, **_):
+        calls["collect"] += 1
+        return f"web info for {character_cn}", {"tool_calls": []}
+
+    async def write(web_info, character_cn, character_en):
+        calls["write"] += 1
+        return f"{templates['build_prompt.md']}: {web_info}"
+
+    monkeypatch.setattr(pipeline, "collect_web_info", collect)
+    monkeypatch.setattr(pipeline, "build_role_prompt", write)
+    monkeypatch.setattr(pipeline, "_load_prompt", lambda name: templates[name])
+    return calls, templates
+
+
+async def _run(tmp_path, **cache_options) -> str:
+    cache = StageCache(tmp_path / "stages", **cache_options)
+    _, prompt_path = await pipeline.run_pipeline(
+        "http://mcp", "特别周", "Special Week", tmp_path / "out", cache=cache
+    )
+    return prompt_path.read_text(encoding="utf-8")
+
+
+@pytest.mark.asyncio
+async def test_unchanged_stages_are_skipped(stages, tmp_path) -> None:
+    calls, _ = stages
+
+    first = await _run(tmp_path)
+    second = await _run(tmp_path)
+
+    assert first == second == "write v1: web info for 特别周"
+    assert calls == {"collect": 1, "write": 1}
+    assert (tmp_path / "out" / "Special_Week" / "web_info.md").exists()
+
+
+@pytest.mark.asyncio
+async def test_template_change_only_reruns_its_stage(stages, tmp_path) -> None:
+    calls, templates = stages
+    await _run(tmp_path)
+
+    templates["build_prompt.md"] = "write v2"
+    assert await _run(tmp_path) == "write v2: web info for 特别周"
+    assert calls == {"collect": 1, "write": 2}
+
+    templates["collect_web.md"] = "collect more about {character_cn}"
+    await _run(tmp_path)
+    # Stage 1 re-ran but produced the same web info, so stage 2 is reused.
+    assert calls == {"collect": 2, "write": 2}
+
+
+@pytest.mark.asyncio
+async def test_force_stage_overrides_the_cache(stages, tmp_path) -> None:
+    calls, _ = stages
+    await _run(tmp_path)
+
+    await _run(tmp_path, force=["write"])
+    assert calls == {"collect": 1, "write": 2}
+
+    with pytest.raises(ValueError):
+        StageCache(tmp_path, force=["stage3"])
+
+
+@pytest.mark.asyncio
+async def test_collect_entries_expire_after_ttl(stages, tmp_path, monkeypatch) -> None:
+    calls, _ = stages
+    await _run(tmp_path, ttl_seconds={"collect": 3600})
+    await _run(tmp_path, ttl_seconds={"collect": 3600})
+    assert calls == {"collect": 1, "write": 1}
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 7200)
+    cache = StageCache(tmp_path / "stages", ttl_seconds={"collect": 3600})
+    await pipeline.run_pipeline(
+        "http://mcp", "特别周", "Special Week", tmp_path / "out", cache=cache
+    )
+    # The web info came out the same, so the write stage is still reused.
+    assert calls == {"collect": 2, "write": 1}
+    assert cache.stats()["expired"] == 1
+
+    # Without a TTL the entry is kept for as long as the inputs match.
+    await _run(tmp_path)
+    assert calls == {"collect": 2, "write": 1}
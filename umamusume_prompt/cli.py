@@ -2,15 +2,41 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import functools
 import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 import httpx
 
 from umamusume_prompt.characters import load_characters, resolve_character
 from umamusume_prompt.config import config
-from umamusume_prompt.pipeline import run_pipeline
-from umamusume_prompt.pipeline_sillytavern import run_pipeline_sillytavern
+from umamusume_prompt.pipeline import (
+    COLLECT_MODES,
+    McpSessionPool,
+    collect_web_info_cached,
+    write_role_prompt_outputs,
+)
+from umamusume_prompt.pipeline_sillytavern import write_sillytavern_outputs
+from umamusume_prompt.stage_cache import STAGES, StageCache
+
+# Stage-2 writers by build target, and their default output directories.
+WRITERS = {
+    "prompt": write_role_prompt_outputs,
+    "sillytavern": write_sillytavern_outputs,
+}
+DEFAULT_OUTPUTS = {"prompt": "results", "sillytavern": "results_SillyTavern"}
+
+
+def _build_targets(value: str) -> List[str]:
+    targets = list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+    unknown = [target for target in targets if target not in WRITERS]
+    if not targets or unknown:
+        raise argparse.ArgumentTypeError(
+            f"invalid build target {value!r} (choose from {', '.join(WRITERS)})"
+        )
+    return targets
 
 
 def parse_args() -> argparse.Namespace:
@@ -20,6 +46,17 @@ def parse_args() -> argparse.Namespace:
         action="append",
         help="Character name (CN or EN). Can be provided multiple times.",
     )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Run every character in --characters-json.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Characters processed in parallel (default: 1)",
+    )
     parser.add_argument(
         "--characters-json",
         default=str(config.characters_json),
@@ -36,14 +73,39 @@ def parse_args() -> argparse.Namespace:
         help=(
             "Output directory for collected info and prompts. "
             "Default is 'results' for prompt mode and "
-            "'results_SillyTavern' for sillytavern mode."
+            "'results_SillyTavern' for sillytavern mode. With several build "
+            "targets, each target writes to a subdirectory named after it."
         ),
     )
     parser.add_argument(
         "--build-target",
-        choices=["prompt", "sillytavern"],
-        default="prompt",
-        help="Build target: prompt (original) or sillytavern (character card style).",
+        type=_build_targets,
+        default=["prompt"],
+        help=(
+            "Build target: prompt (original) or sillytavern (character card style). "
+            "Comma-separate several, e.g. prompt,sillytavern, to collect web info "
+            "once and run their writers concurrently."
+        ),
+    )
+    parser.add_argument(
+        "--collect-mode",
+        choices=COLLECT_MODES,
+        default=config.collect_mode,
+        help=(
+            "Stage-1 collection: direct (search and crawl both wikis with direct tool "
+            "calls, one LLM call to organise them), agent (LLM agent picks the tools), "
+            f"or auto (direct, agent only if too little was found). Default: {config.collect_mode}"
+        ),
+    )
+    parser.add_argument(
+        "--force-stage",
+        action="append",
+        choices=[*STAGES, "all"],
+        default=[],
+        help=(
+            "Re-run a stage even if its cached output is still valid: "
+            "collect (stage 1), write (stage 2) or all. Can be provided multiple times."
+        ),
     )
     parser.add_argument(
         "--wait-mcp",
@@ -86,38 +148,185 @@ def _wait_for_mcp(mcp_url: str, timeout_s: int, interval_s: float) -> None:
     )
 
 
-async def _run(args: argparse.Namespace) -> None:
-    if not args.character:
-        raise SystemExit("Please provide at least one --character.")
+PipelineRunner = Callable[[str, str], Awaitable[Tuple[Path, ...]]]
 
-    _wait_for_mcp(args.mcp_url, args.wait_mcp, args.wait_interval)
 
-    mapping = load_characters(Path(args.characters_json))
-    if args.output:
-        output_dir = Path(args.output)
-    else:
-        output_dir = Path(
-            "results_SillyTavern" if args.build_target == "sillytavern" else "results"
+async def run_targets(
+    mcp_url: str,
+    character_cn: str,
+    character_en: str,
+    outputs: Dict[str, Path],
+    *,
+    pool: Optional[McpSessionPool] = None,
+    cache: Optional[StageCache] = None,
+    collect_mode: Optional[str] = None,
+) -> Tuple[Path, ...]:
+    """Collect web info once, then run each target's writer concurrently.
+
+    Returns the web info path followed by each target's role prompt path.
+    """
+    print(f"[run] character: {character_cn} ({character_en})")
+    web_info, tool_info = await collect_web_info_cached(
+        mcp_url, character_cn, character_en, pool=pool, cache=cache, mode=collect_mode
+    )
+    results = await asyncio.gather(
+        *(
+            WRITERS[target](
+                web_info, tool_info, character_cn, character_en, output_dir, cache=cache
+            )
+            for target, output_dir in outputs.items()
+        ),
+        return_exceptions=True,
+    )
+    # Let every writer finish (and cache its output) before reporting a failure.
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    web_path = results[0][0]
+    return (web_path, *(prompt_path for _, prompt_path in results))
+
+
+@dataclass
+class CharacterResult:
+    character_cn: str
+    character_en: str
+    seconds: float
+    paths: Optional[Tuple[Path, ...]] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_characters(
+    pipeline_runner: PipelineRunner,
+    characters: List[Tuple[str, str]],
+    *,
+    concurrency: int = 1,
+    label: str = "prompt",
+) -> List[CharacterResult]:
+    """Run the pipeline for each character; a failure only fails that character."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def run_one(cn_name: str, en_name: str) -> CharacterResult:
+        nonlocal done
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                paths = await pipeline_runner(cn_name, en_name)
+            except Exception as exc:
+                result = CharacterResult(
+                    cn_name,
+                    en_name,
+                    time.perf_counter() - start,
+                    error=f"{type(exc).__name__}: {exc}",
+                )
+            else:
+                result = CharacterResult(
+                    cn_name, en_name, time.perf_counter() - start, paths
+                )
+        done += 1
+        progress = f"[{done}/{len(characters)}]" if len(characters) > 1 else ""
+        if result.ok:
+            print(
+                f"[ok][{label}]{progress} {cn_name} ({en_name}) -> "
+                + " | ".join(str(path) for path in result.paths)
+            )
+        else:
+            print(f"[fail][{label}]{progress} {cn_name} ({en_name}): {result.error}")
+        return result
+
+    return list(
+        await asyncio.gather(*(run_one(cn_name, en_name) for cn_name, en_name in characters))
+    )
+
+
+def format_summary(results: List[CharacterResult], build_target: str) -> str:
+    rows = [("character", "status", "seconds", "output")]
+    for result in results:
+        if result.ok:
+            detail = ", ".join(str(path) for path in (result.paths or ())[1:])
+        else:
+            detail = result.error or ""
+        rows.append(
+            (
+                f"{result.character_cn} ({result.character_en})",
+                "ok" if result.ok else "failed",
+                f"{result.seconds:.1f}",
+                detail,
+            )
         )
+    widths = [max(len(row[col]) for row in rows) for col in range(3)]
+    lines = [
+        "  ".join(cell.ljust(width) for cell, width in zip(row[:3], widths)) + "  " + row[3]
+        for row in rows
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    failed = sum(not result.ok for result in results)
+    lines.append(
+        f"[{build_target}] {len(results) - failed}/{len(results)} characters succeeded"
+        + (f", {failed} failed" if failed else "")
+    )
+    return "\n".join(lines)
 
-    pipeline_runner = run_pipeline
-    if args.build_target == "sillytavern":
-        pipeline_runner = run_pipeline_sillytavern
 
-    for name in args.character:
+async def _run(args: argparse.Namespace) -> None:
+    if not args.character and not args.all:
+        raise SystemExit("Please provide at least one --character, or --all.")
+
+    mapping = load_characters(Path(args.characters_json))
+    characters: List[Tuple[str, str]] = []
+    if args.all:
+        characters.extend(mapping.items())
+    for name in args.character or []:
         cn_name, en_name, found = resolve_character(name, mapping)
         if not found:
             raise SystemExit(
                 f"Character '{name}' not found in {args.characters_json}. "
                 "Please add it to the mapping first."
             )
-        web_path, prompt_path = await pipeline_runner(
-            args.mcp_url, cn_name, en_name, output_dir
-        )
-        print(
-            f"[ok][{args.build_target}] {cn_name} ({en_name}) -> "
-            f"{web_path} | {prompt_path}"
+        characters.append((cn_name, en_name))
+    # The same character twice would write the same output directory.
+    characters = list(dict.fromkeys(characters))
+
+    _wait_for_mcp(args.mcp_url, args.wait_mcp, args.wait_interval)
+
+    targets = args.build_target
+    if args.output and len(targets) > 1:
+        outputs = {target: Path(args.output) / target for target in targets}
+    elif args.output:
+        outputs = {targets[0]: Path(args.output)}
+    else:
+        outputs = {target: Path(DEFAULT_OUTPUTS[target]) for target in targets}
+    label = ",".join(targets)
+
+    force = STAGES if "all" in args.force_stage else args.force_stage
+    cache = StageCache(
+        config.stage_cache_dir,
+        force=force,
+        ttl_seconds={"collect": config.stage_cache_collect_ttl_seconds},
+    )
+    pool_size = min(config.mcp_session_pool_size, max(1, args.concurrency), len(characters))
+    async with McpSessionPool(args.mcp_url, pool_size) as pool:
+        results = await run_characters(
+            functools.partial(
+                run_targets,
+                args.mcp_url,
+                outputs=outputs,
+                pool=pool,
+                cache=cache,
+                collect_mode=args.collect_mode,
+            ),
+            characters,
+            concurrency=args.concurrency,
+            label=label,
         )
+    if len(results) > 1 or not all(result.ok for result in results):
+        print(format_summary(results, label))
+    if not all(result.ok for result in results):
+        raise SystemExit(1)
 
 
 def main() -> None:
@@ -29,10 +29,32 @@ class Config:
     writer_llm_model_api_key: str = os.getenv("WRITER_LLM_MODEL_API_KEY", "")
 
     user_agent: str = os.getenv("USER_AGENT", "UmamusumePrompt/1.0")
+    # MCP client sessions shared by the character runs of one CLI batch
+    mcp_session_pool_size: int = int(os.getenv("MCP_SESSION_POOL_SIZE", "2"))
+    # Stage-1 collection: "auto" calls the wiki tools directly and falls back to
+    # the agent when coverage is too thin, "direct" never falls back, "agent"
+    # always uses the agent. Pages are compacted to the token budget each
+    # (game-data sections kept whole); 0 fetches whole pages by cursor.
+    collect_mode: str = os.getenv("COLLECT_MODE", "auto")
+    direct_collect_min_chars: int = int(os.getenv("DIRECT_COLLECT_MIN_CHARS", "3000"))
+    direct_collect_token_budget: int = int(os.getenv("DIRECT_COLLECT_TOKEN_BUDGET", "8000"))
+    # Content-addressed cache of stage outputs (web info, role prompts)
+    stage_cache_dir: Path = Path(
+        os.getenv("STAGE_CACHE_DIR") or ROOT_DIR / ".cache" / "stages"
+    )
+    # Collected web info is redone after this long so wiki edits are picked
+    # up (0 keeps it until the inputs change)
+    stage_cache_collect_ttl_seconds: float = float(
+        os.getenv("STAGE_CACHE_COLLECT_TTL_SECONDS", "604800")
+    )
 
     # Prompt/templates
     prompt_dir: Path = ROOT_DIR / "umamusume_prompt" / "prompts"
     characters_json: Path = ROOT_DIR / "umamusume_characters.json"
+    injection_markers_path: Path = Path(
+        os.getenv("INJECTION_MARKERS_PATH")
+        or ROOT_DIR / "umamusume_prompt" / "mcp" / "injection_markers.txt"
+    )
 
     # Proxy settings
     http_proxy: str | None = os.getenv("HTTP_PROXY")
@@ -41,9 +63,78 @@ class Config:
     # Google Search settings
     google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
     google_cse_id: str = os.getenv("GOOGLE_CSE_ID", "")
+    # The Google client is blocking; calls run on a bounded thread pool.
+    google_max_concurrency: int = int(os.getenv("GOOGLE_MAX_CONCURRENCY", "4"))
+    google_call_timeout_seconds: float = float(
+        os.getenv("GOOGLE_CALL_TIMEOUT_SECONDS", "20")
+    )
 
     crawler_pruned_threshold: float = float(os.getenv("CRAWLER_PRUNED_THRESHOLD", "0.3"))
     crawler_pruned_min_words: int = int(os.getenv("CRAWLER_PRUNED_MIN_WORDS", "5"))
+    # Warm browsers kept by the HTTP server for crawl_page (0 disables the pool)
+    browser_pool_size: int = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+    browser_pool_max_pages: int = int(os.getenv("BROWSER_POOL_MAX_PAGES", "50"))
+
+    # Upstream rate limits shared by all MCP tools. Per-host overrides use
+    # "host=rate:burst:concurrency" entries separated by commas.
+    upstream_rate_per_second: float = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "2"))
+    upstream_burst: int = int(os.getenv("UPSTREAM_BURST", "4"))
+    upstream_max_concurrency: int = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "4"))
+    upstream_queue_timeout_seconds: float = float(
+        os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "30")
+    )
+    upstream_host_limits: str = os.getenv("UPSTREAM_HOST_LIMITS", "")
+    # Per-call tool deadlines: overrides of the built-in per-tool defaults as
+    # "tool=seconds" entries separated by commas (0 disables), and the
+    # deadline for tools without one
+    tool_deadlines: str = os.getenv("TOOL_DEADLINES", "")
+    tool_deadline_seconds: float = float(os.getenv("TOOL_DEADLINE_SECONDS", "60"))
+
+    # Local title index for the wiki search tools (refresh 0 disables remote listing)
+    title_index_path: Path = Path(
+        os.getenv("TITLE_INDEX_PATH") or ROOT_DIR / ".cache" / "title_index.json"
+    )
+    title_index_refresh_seconds: float = float(
+        os.getenv("TITLE_INDEX_REFRESH_SECONDS", "86400")
+    )
+    moegirl_index_category: str = os.getenv(
+        "MOEGIRL_INDEX_CATEGORY", "Category:赛马娘_Pretty_Derby"
+    )
+
+    # Parallel page fetches per crawl_wiki_batch call
+    wiki_batch_concurrency: int = int(os.getenv("WIKI_BATCH_CONCURRENCY", "4"))
+
+    # MCP server cache settings (TTL 0 disables the cache)
+    mcp_cache_path: Path = Path(
+        os.getenv("MCP_CACHE_PATH") or ROOT_DIR / ".cache" / "mcp_cache.sqlite3"
+    )
+    mcp_cache_ttl_seconds: float = float(os.getenv("MCP_CACHE_TTL_SECONDS", "86400"))
+    mcp_cache_max_bytes: int = int(os.getenv("MCP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Parsed pages are keyed by content revision, so they can live much longer
+    mcp_parsed_cache_ttl_seconds: float = float(
+        os.getenv("MCP_PARSED_CACHE_TTL_SECONDS", str(30 * 86400))
+    )
+    # Cached wikitext older than this is revalidated against the page's
+    # lastrevid/touched before it is served again
+    wiki_revalidate_after_seconds: float = float(
+        os.getenv("WIKI_REVALIDATE_AFTER_SECONDS", "600")
+    )
+    # "shared" expands page transclusions and templates through the server's
+    # revision-keyed page cache, falling back to the crawler's expansion on
+    # errors; "library" always uses the crawler's own expansion
+    wiki_expander: str = os.getenv("WIKI_EXPANDER", "shared")
+
+    # Long tool results are returned in pages of about this many characters;
+    # the remaining pages are kept server-side for cursor follow-up calls.
+    mcp_page_chars: int = int(os.getenv("MCP_PAGE_CHARS", "16000"))
+    mcp_document_ttl_seconds: float = float(os.getenv("MCP_DOCUMENT_TTL_SECONDS", "3600"))
+    # HTTP response compression, in order of preference ("" disables);
+    # bodies smaller than the threshold are sent uncompressed
+    http_compression: str = os.getenv("HTTP_COMPRESSION", "zstd,gzip")
+    http_compression_min_bytes: int = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+    # tiktoken encoding for token budgets; a character heuristic is used when
+    # tiktoken or the encoding file is unavailable
+    token_encoding: str = os.getenv("TOKEN_ENCODING", "o200k_base")
 
     def validate_web_tools(self) -> None:
         missing = []
@@ -64,6 +155,39 @@ class Config:
         if not self.writer_llm_model_api_key:
             raise EnvironmentError("Missing required environment variable: WRITER_LLM_MODEL_API_KEY")
 
+    def parse_upstream_host_limits(self) -> dict[str, tuple[float, int, int]]:
+        limits: dict[str, tuple[float, int, int]] = {}
+        for entry in self.upstream_host_limits.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            host, sep, spec = entry.partition("=")
+            parts = spec.split(":")
+            if not sep or len(parts) != 3:
+                raise ValueError(
+                    f"Invalid UPSTREAM_HOST_LIMITS entry: {entry!r} "
+                    "(expected host=rate:burst:concurrency)"
+                )
+            limits[host.strip().lower()] = (float(parts[0]), int(parts[1]), int(parts[2]))
+        return limits
+
+    def parse_tool_deadlines(self) -> dict[str, float]:
+        deadlines: dict[str, float] = {}
+        for entry in self.tool_deadlines.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            tool, sep, seconds = entry.partition("=")
+            try:
+                deadlines[tool.strip()] = float(seconds)
+            except ValueError:
+                sep = ""
+            if not sep:
+                raise ValueError(
+                    f"Invalid TOOL_DEADLINES entry: {entry!r} (expected tool=seconds)"
+                )
+        return deadlines
+
     def proxy_url(self) -> str | None:
         if self.http_proxy:
             return self.http_proxy
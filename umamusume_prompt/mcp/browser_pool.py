@@ -0,0 +1,234 @@
+"""
+Pool of pre-launched Crawl4AI browsers for crawl_page.
+
+Browsers are started once in the HTTP server lifespan and handed out in FIFO
+order, so a crawl only pays for the page load. Each browser is replaced after
+serving a fixed number of pages (or after a failure) to keep memory bounded.
+A browser that cannot be relaunched after a few attempts is dropped; once no
+browsers are left or being relaunched the pool is degraded and acquire()
+raises BrowserPoolUnavailable straight away, until a browser comes back.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+CrawlerFactory = Callable[[], Awaitable[Any]]
+
+
+class BrowserPoolUnavailable(RuntimeError):
+    pass
+
+
+async def _launch_crawl4ai() -> Any:
+    from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+    crawler = AsyncWebCrawler(config=BrowserConfig(headless=True, verbose=False))
+    await crawler.start()
+    return crawler
+
+
+class _Slot:
+    def __init__(self, crawler: Any) -> None:
+        self.crawler = crawler
+        self.pages = 0
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int,
+        *,
+        max_pages_per_browser: int = 50,
+        factory: CrawlerFactory = _launch_crawl4ai,
+        relaunch_attempts: int = 3,
+        relaunch_delay_seconds: float = 5.0,
+    ) -> None:
+        self.size = size
+        self.max_pages_per_browser = max_pages_per_browser
+        self.relaunch_attempts = max(1, relaunch_attempts)
+        self.relaunch_delay_seconds = relaunch_delay_seconds
+        self.pages_served = 0
+        self.recycled = 0
+        self.lost = 0
+        self.waiting = 0
+        self.relaunching = 0
+        self._factory = factory
+        self._failure: str | None = None
+        # None entries wake waiters once the pool has no browsers left.
+        self._idle: asyncio.Queue[_Slot | None] | None = None
+        self._slots: set[_Slot] = set()
+        self._background: set[asyncio.Task[None]] = set()
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    @property
+    def degraded(self) -> bool:
+        return self._failure is not None
+
+    @property
+    def available(self) -> bool:
+        return self.started and not self.degraded
+
+    async def start(self) -> None:
+        if self.started or self.size <= 0:
+            return
+        crawlers = await asyncio.gather(
+            *(self._factory() for _ in range(self.size)), return_exceptions=True
+        )
+        errors = [item for item in crawlers if isinstance(item, BaseException)]
+        if errors:
+            await asyncio.gather(
+                *(item.close() for item in crawlers if not isinstance(item, BaseException)),
+                return_exceptions=True,
+            )
+            raise errors[0]
+        self._idle = asyncio.Queue()
+        for crawler in crawlers:
+            slot = _Slot(crawler)
+            self._slots.add(slot)
+            self._idle.put_nowait(slot)
+
+    async def close(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        slots, self._slots = self._slots, set()
+        self._idle = None
+        self._failure = None
+        await asyncio.gather(
+            *(slot.crawler.close() for slot in slots), return_exceptions=True
+        )
+
+    async def _recycle(self, slot: _Slot) -> None:
+        self._slots.discard(slot)
+        self.relaunching += 1
+        try:
+            fresh = await self._relaunch(slot)
+        finally:
+            self.relaunching -= 1
+        if isinstance(fresh, Exception):
+            self._drop(fresh)
+            return
+        self.recycled += 1
+        if self._idle is None:
+            await fresh.crawler.close()
+            return
+        if self._failure is not None:
+            print("browser pool recovered: a browser was relaunched")
+            self._failure = None
+        self._slots.add(fresh)
+        self._idle.put_nowait(fresh)
+
+    async def _relaunch(self, slot: _Slot) -> _Slot | Exception:
+        with contextlib.suppress(Exception):
+            await slot.crawler.close()
+        for attempt in range(1, self.relaunch_attempts + 1):
+            try:
+                return _Slot(await self._factory())
+            except Exception as exc:
+                error = exc
+                print(
+                    f"WARNING: browser relaunch failed ({exc}); "
+                    f"attempt {attempt}/{self.relaunch_attempts}"
+                )
+                if attempt < self.relaunch_attempts:
+                    await asyncio.sleep(self.relaunch_delay_seconds)
+        return error
+
+    def _drop(self, error: Exception) -> None:
+        self.lost += 1
+        # Another relaunch still in progress may bring a browser back.
+        if self._idle is None or self._slots or self.relaunching:
+            return
+        self._failure = f"no browsers left after relaunch failures ({error})"
+        print(f"WARNING: browser pool degraded: {self._failure}")
+        for _ in range(self.waiting):
+            self._idle.put_nowait(None)
+
+    def _release(self, slot: _Slot, *, failed: bool) -> None:
+        if self._idle is None:
+            return
+        if failed or slot.pages >= self.max_pages_per_browser:
+            # Relaunch in the background so the caller is not held up.
+            task = asyncio.create_task(self._recycle(slot))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        else:
+            self._idle.put_nowait(slot)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        if self._idle is None:
+            raise RuntimeError("browser pool is not started")
+        # asyncio.Queue serves waiting getters in arrival order.
+        slot = None
+        while slot is None:
+            if self._failure is not None:
+                raise BrowserPoolUnavailable(f"browser pool is degraded: {self._failure}")
+            self.waiting += 1
+            try:
+                slot = await self._idle.get()
+            finally:
+                self.waiting -= 1
+        failed = False
+        try:
+            yield slot.crawler
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            slot.pages += 1
+            self.pages_served += 1
+            self._release(slot, failed=failed)
+
+    async def crawl(
+        self,
+        url: str,
+        *,
+        css_selector: str | None = None,
+        pruned_threshold: float = 0.3,
+        pruned_min_words: int = 5,
+    ) -> str:
+        from crawl4ai import CacheMode, CrawlerRunConfig
+        from crawl4ai.content_filter_strategy import PruningContentFilter
+        from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+
+        run_config = CrawlerRunConfig(
+            css_selector=css_selector,
+            cache_mode=CacheMode.BYPASS,
+            markdown_generator=DefaultMarkdownGenerator(
+                content_filter=PruningContentFilter(
+                    threshold=pruned_threshold,
+                    threshold_type="fixed",
+                    min_word_threshold=pruned_min_words,
+                )
+            ),
+        )
+        async with self.acquire() as crawler:
+            result = await crawler.arun(url=url, config=run_config)
+        if not result.success:
+            raise RuntimeError(result.error_message or f"failed to crawl {url}")
+        markdown = result.markdown
+        text = (
+            getattr(markdown, "fit_markdown", None)
+            or getattr(markdown, "raw_markdown", None)
+            or (str(markdown) if markdown else "")
+        )
+        return text or result.cleaned_html or result.html or ""
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self.size if self.started else 0,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "waiting": self.waiting,
+            "pages_served": self.pages_served,
+            "recycled": self.recycled,
+            "relaunching": self.relaunching,
+            "lost": self.lost,
+            "degraded": int(self.degraded),
+        }
@@ -0,0 +1,168 @@
+"""
+On-disk result cache for the MCP server.
+
+Entries live in a SQLite database (WAL mode) so several server processes can
+share one cache file. Each table is an independent cache tier with its own TTL
+and size cap; the least recently used entries are evicted first. Values are
+stored as JSON, or as zlib-compressed pickles for tiers that hold structured
+Python objects (the cache file is local and trusted).
+"""
+from __future__ import annotations
+
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Literal
+
+
+class ResultCache:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        table: str = "results",
+        ttl_seconds: float = 86_400.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        codec: Literal["json", "pickle"] = "json",
+    ) -> None:
+        if not table.isidentifier():
+            raise ValueError(f"invalid cache table name: {table!r}")
+        if codec not in ("json", "pickle"):
+            raise ValueError(f"invalid cache codec: {codec!r}")
+        self.path = Path(path)
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+
+    def _encode(self, value: Any) -> str | bytes:
+        if self.codec == "pickle":
+            return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return json.dumps(value, ensure_ascii=False)
+
+    def _decode(self, payload: str | bytes) -> Any:
+        if self.codec == "pickle":
+            return pickle.loads(zlib.decompress(payload))
+        return json.loads(payload)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=10.0, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed "
+                f"ON {self.table} (accessed_at)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return self._decode(value)
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        payload = self._encode(value)
+        size = len(payload) if isinstance(payload, bytes) else len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} "
+                "(key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (total,) = conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        stale: list[str] = []
+        for key, size in conn.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append(key)
+            total -= size
+        conn.executemany(
+            f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in stale]
+        )
+        self.evictions += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> dict[str, int]:
+        entries = 0
+        total = 0
+        if self.enabled:
+            with self._lock:
+                entries, total = self._connect().execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+                ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,85 @@
+"""
+Single-flight coalescing for MCP tool calls.
+
+Concurrent calls with the same key share one execution: the first caller runs
+the coroutine, later callers wait on the same task and receive its result.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+from urllib.parse import unquote
+
+T = TypeVar("T")
+
+
+def _normalize_argument(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("http://") or value.startswith("https://"):
+            return unquote(value)
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_normalize_argument(item) for item in value]
+    return value
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Task[Any]] = {}
+
+    @staticmethod
+    def make_key(name: str, arguments: dict[str, Any]) -> str:
+        normalized = {key: _normalize_argument(value) for key, value in arguments.items()}
+        return json.dumps(
+            [name, normalized], ensure_ascii=False, sort_keys=True, default=str
+        )
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.executions += 1
+            task.add_done_callback(functools.partial(self._forget, key))
+        # Shield the shared task so one cancelled caller does not cancel the others.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task[Any]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away.
+            task.exception()
+
+    def coalesce(
+        self, fn: Callable[..., Awaitable[T]]
+    ) -> Callable[..., Awaitable[T]]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = self.make_key(fn.__name__, dict(bound.arguments))
+            return await self.do(key, lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
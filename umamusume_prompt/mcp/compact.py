@@ -0,0 +1,155 @@
+"""
+Token-budgeted compaction of Markdown tool results.
+
+The document is split into Markdown sections, each section is ranked by how
+useful its heading is for writing a character prompt (profile, personality,
+relationships, quotes first; references, navigation and game data last),
+and sections are added greedily until the budget is spent. Kept sections
+stay in document order. A section that does not fit whole is cut on a line
+boundary, so tables lose whole rows rather than half of one. Callers that
+need low-ranked sections (the game data for web_info, say) name them in
+``keep``; those are included whole on top of the budget.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+
+from ..tokens import count_tokens
+
+_SECTION_RE = re.compile(r"^(?=#{1,6}\s)", re.MULTILINE)
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$", re.MULTILINE)
+
+# Heading keyword -> weight; the best match of a heading wins.
+_SECTION_WEIGHTS: tuple[tuple[tuple[str, ...], float], ...] = (
+    (("简介", "概要", "介绍", "基本资料", "基本信息", "角色资料", "人物", "profile"), 10.0),
+    (("性格", "个性", "特点", "形象", "personality"), 9.0),
+    (("人际关系", "关系", "交友", "relationship"), 8.0),
+    (("台词", "语音", "口癖", "名言", "对话", "quote", "voice"), 8.0),
+    (("经历", "背景", "剧情", "故事", "生平", "原型", "历史", "story"), 6.0),
+    (("趣闻", "轶事", "其他", "补充", "trivia"), 4.0),
+    (("相关", "服装", "决胜服", "外观"), 3.0),
+    (("育成", "技能", "支援卡", "属性", "数据", "适性", "赛程", "成绩", "skill"), 1.0),
+    (("参考", "注释", "脚注", "外部链接", "导航", "来源", "参见", "reference"), 0.1),
+)
+_DEFAULT_WEIGHT = 2.0
+# Partial sections smaller than this are not worth including.
+_MIN_PARTIAL_TOKENS = 48
+
+
+@dataclass
+class Compaction:
+    text: str
+    tokens: int
+    original_tokens: int
+    omitted_sections: list[str] = field(default_factory=list)
+    trimmed_sections: list[str] = field(default_factory=list)
+
+    def info(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "original_tokens": self.original_tokens,
+            "omitted_sections": self.omitted_sections,
+            "trimmed_sections": self.trimmed_sections,
+        }
+
+
+def _heading(section: str) -> str:
+    match = _HEADING_RE.match(section)
+    return match.group(2).strip() if match else ""
+
+
+def heading_weight(heading: str) -> float | None:
+    lowered = heading.lower()
+    weights = [
+        weight for keywords, weight in _SECTION_WEIGHTS if any(k in lowered for k in keywords)
+    ]
+    return max(weights) if weights else None
+
+
+def section_weights(sections: list[str], keep: Iterable[str] = ()) -> list[float]:
+    """Weight per section; unmatched subsections inherit their parent's weight.
+
+    Headings containing a ``keep`` keyword weigh ``math.inf``.
+    """
+    keep = tuple(keyword.lower() for keyword in keep)
+    weights: list[float] = []
+    parents: list[tuple[int, float]] = []
+    for idx, section in enumerate(sections):
+        match = _HEADING_RE.match(section)
+        if idx == 0:
+            # The page title and lead, or text before the first heading.
+            weights.append(10.0)
+            if match is not None:
+                parents.append((len(match.group(1)), _DEFAULT_WEIGHT))
+            continue
+        if match is None:
+            weights.append(_DEFAULT_WEIGHT)
+            continue
+        level = len(match.group(1))
+        while parents and parents[-1][0] >= level:
+            parents.pop()
+        weight = heading_weight(match.group(2))
+        if any(keyword in match.group(2).lower() for keyword in keep):
+            weight = math.inf
+        elif weight is None:
+            weight = parents[-1][1] if parents else _DEFAULT_WEIGHT
+        parents.append((level, weight))
+        weights.append(weight)
+    return weights
+
+
+def _trim_lines(section: str, budget: int, count: Callable[[str], int]) -> str:
+    kept: list[str] = []
+    used = 0
+    for line in section.splitlines(keepends=True):
+        cost = count(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return "".join(kept)
+
+
+def compact_markdown(
+    text: str,
+    token_budget: int,
+    *,
+    keep: Iterable[str] = (),
+    count: Callable[[str], int] = count_tokens,
+) -> Compaction:
+    original_tokens = count(text)
+    if original_tokens <= token_budget:
+        return Compaction(text, original_tokens, original_tokens)
+    sections = [section for section in _SECTION_RE.split(text) if section]
+    costs = [count(section) for section in sections]
+    weights = section_weights(sections, keep)
+    # Shorter sections first among equally relevant ones, so more of them fit.
+    order = sorted(range(len(sections)), key=lambda idx: (-weights[idx], costs[idx], idx))
+    chosen: dict[int, str] = {}
+    trimmed: list[int] = []
+    remaining = token_budget
+    for idx in order:
+        if weights[idx] == math.inf:
+            chosen[idx] = sections[idx]
+        elif costs[idx] <= remaining:
+            chosen[idx] = sections[idx]
+            remaining -= costs[idx]
+        elif remaining >= _MIN_PARTIAL_TOKENS:
+            partial = _trim_lines(sections[idx], remaining, count)
+            if partial.strip() and partial.strip() != sections[idx].split("\n", 1)[0].strip():
+                chosen[idx] = partial
+                trimmed.append(idx)
+                remaining -= count(chosen[idx])
+    compacted = "".join(chosen[idx] for idx in sorted(chosen))
+    return Compaction(
+        text=compacted,
+        tokens=count(compacted),
+        original_tokens=original_tokens,
+        omitted_sections=[
+            _heading(sections[idx]) or "(lead)" for idx in range(len(sections)) if idx not in chosen
+        ],
+        trimmed_sections=[_heading(sections[idx]) or "(lead)" for idx in sorted(trimmed)],
+    )
@@ -0,0 +1,201 @@
+"""
+Negotiated response compression for the HTTP transports.
+
+An ASGI middleware that compresses response bodies with zstd (when the
+zstandard package is installed) or gzip, picked from the client's
+Accept-Encoding. Bodies below a size threshold are sent as-is, since a
+small JSON-RPC reply gains nothing and pays the compressor latency.
+Server-sent event streams are passed through untouched: compressing them
+would buffer events, and the /sse stream must deliver each one as it
+happens.
+"""
+from __future__ import annotations
+
+import gzip
+import zlib
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_PASSTHROUGH_TYPES = ("text/event-stream",)
+
+
+def _zstd() -> Any | None:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_encodings() -> list[str]:
+    return (["zstd"] if _zstd() is not None else []) + ["gzip"]
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    accepted: dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header: str, preferred: Iterable[str]) -> str | None:
+    """First server-preferred encoding the client accepts with a non-zero q."""
+    accepted = parse_accept_encoding(header)
+    for encoding in preferred:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, *, gzip_level: int, zstd_level: int) -> None:
+        if encoding == "zstd":
+            self._compressor = _zstd().ZstdCompressor(level=zstd_level).compressobj()
+            self._flush_mode = _zstd().COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(self._flush_mode)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def compress(data: bytes, encoding: str, *, gzip_level: int = 6, zstd_level: int = 3) -> bytes:
+    if encoding == "zstd":
+        return _zstd().ZstdCompressor(level=zstd_level).compress(data)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        encodings: Iterable[str] = ("zstd", "gzip"),
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        supported = available_encodings()
+        self.encodings = [encoding for encoding in encodings if encoding in supported]
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        header = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                header = value.decode("latin-1")
+                break
+        encoding = choose_encoding(header, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start: Message | None = None
+        self.passthrough = False
+        self.buffer = b""
+        self.compressor: _Compressor | None = None
+
+    async def run(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.on_send)
+
+    def _headers(self, body_length: int | None) -> list[tuple[bytes, bytes]]:
+        assert self.start is not None
+        headers = [
+            (name, value)
+            for name, value in self.start.get("headers", [])
+            if name.lower() not in (b"content-length", b"content-encoding")
+        ]
+        headers.append((b"content-encoding", self.encoding.encode("ascii")))
+        if not any(
+            name.lower() == b"vary" and b"accept-encoding" in value.lower()
+            for name, value in headers
+        ):
+            headers.append((b"vary", b"Accept-Encoding"))
+        if body_length is not None:
+            headers.append((b"content-length", str(body_length).encode("ascii")))
+        return headers
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = {name.lower(): value for name, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+            self.passthrough = b"content-encoding" in headers or content_type.startswith(
+                _PASSTHROUGH_TYPES
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is not None:
+            data = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        self.buffer += body
+        if more_body and len(self.buffer) < self.middleware.minimum_size:
+            return
+        assert self.start is not None
+        if len(self.buffer) < self.middleware.minimum_size:
+            # Complete and small: send unchanged.
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": self.buffer})
+            return
+        if not more_body:
+            data = compress(
+                self.buffer,
+                self.encoding,
+                gzip_level=self.middleware.gzip_level,
+                zstd_level=self.middleware.zstd_level,
+            )
+            await self.send({**self.start, "headers": self._headers(len(data))})
+            await self.send({"type": "http.response.body", "body": data})
+            return
+        # Large streamed body: compress chunk by chunk from here on.
+        self.compressor = _Compressor(
+            self.encoding,
+            gzip_level=self.middleware.gzip_level,
+            zstd_level=self.middleware.zstd_level,
+        )
+        await self.send({**self.start, "headers": self._headers(None)})
+        data = self.compressor.chunk(self.buffer)
+        self.buffer = b""
+        await self.send({"type": "http.response.body", "body": data, "more_body": True})
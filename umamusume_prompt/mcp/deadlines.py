@@ -0,0 +1,112 @@
+"""
+Per-tool deadlines with partial results.
+
+Every tool call runs under a hard deadline (the tool's default or the
+caller's deadline_seconds, never later than an enclosing call's deadline).
+Code that can stop early with something useful, like transclusion expansion
+or a batch crawl, works against a slightly earlier soft deadline and marks
+the result partial instead of losing everything; when the hard deadline
+passes, the call is cancelled and an error result is returned.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+# Share of the deadline kept back for rendering what was gathered, capped.
+_RESERVE_FRACTION = 0.2
+_MAX_RESERVE_SECONDS = 5.0
+
+
+@dataclass
+class _Deadline:
+    at: float
+    soft_at: float
+    reasons: list[str] = field(default_factory=list)
+
+
+_current: contextvars.ContextVar[_Deadline | None] = contextvars.ContextVar(
+    "mcp_tool_deadline", default=None
+)
+
+
+def soft_deadline() -> float | None:
+    """Loop time by which partial-capable work should stop, or None."""
+    deadline = _current.get()
+    return deadline.soft_at if deadline is not None else None
+
+
+def mark_partial(reason: str) -> None:
+    deadline = _current.get()
+    if deadline is not None and reason not in deadline.reasons:
+        deadline.reasons.append(reason)
+
+
+def _status_error(message: str) -> dict:
+    return {"status": "error", "message": message}
+
+
+class Deadlines:
+    def __init__(
+        self,
+        defaults: dict[str, float],
+        *,
+        default_seconds: float,
+        on_expired: Callable[[str, str], None] | None = None,
+    ) -> None:
+        self.defaults = defaults
+        self.default_seconds = default_seconds
+        self._on_expired = on_expired
+
+    def seconds_for(self, tool: str, requested: float | None) -> float | None:
+        seconds = requested if requested is not None else self.defaults.get(
+            tool, self.default_seconds
+        )
+        return seconds if seconds and seconds > 0 else None
+
+    def bound(
+        self, error: Callable[[str], dict] = _status_error
+    ) -> Callable[[F], F]:
+        def decorate(fn: F) -> F:
+            name = fn.__name__
+
+            @functools.wraps(fn)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                seconds = self.seconds_for(name, kwargs.get("deadline_seconds"))
+                outer = _current.get()
+                if seconds is None and outer is None:
+                    return await fn(*args, **kwargs)
+                now = asyncio.get_running_loop().time()
+                at = now + seconds if seconds is not None else float("inf")
+                if outer is not None:
+                    at = min(at, outer.at)
+                reserve = min(_MAX_RESERVE_SECONDS, (at - now) * _RESERVE_FRACTION)
+                deadline = _Deadline(at=at, soft_at=at - reserve)
+                token = _current.set(deadline)
+                try:
+                    async with asyncio.timeout_at(at):
+                        result = await fn(*args, **kwargs)
+                except TimeoutError:
+                    if self._on_expired is not None:
+                        self._on_expired(name, "timeout")
+                    return error(
+                        f"{name} did not finish within its deadline of "
+                        f"{at - now:.1f}s; retry with a larger deadline_seconds"
+                    )
+                finally:
+                    _current.reset(token)
+                if deadline.reasons and isinstance(result, dict):
+                    if self._on_expired is not None:
+                        self._on_expired(name, "partial")
+                    result = {**result, "partial": True, "partial_reasons": deadline.reasons}
+                return result
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorate
@@ -0,0 +1,384 @@
+"""
+Transclusion expansion with a shared, revision-keyed page cache.
+
+Character pages transclude the same subpages, navboxes, infobox templates and
+shared character templates over and over. Here every transcluded title is
+resolved to its current revision id through the batched revision lookups,
+and page content is cached by (site, revid), so across a roster run each
+shared page or template is downloaded once and later expansions only pay for
+a small info query (skipped entirely while the title was checked recently).
+Missing revisions of one expansion level are fetched in a single batched
+prop=revisions request, and concurrent expansions share in-flight fetches.
+
+Page transclusions ({{:Page}}, relative {{/Subpage}}) and template calls
+({{Name|...}} from the Template namespace) are inlined, honouring
+<noinclude>, <includeonly> and <onlyinclude>; template parameters
+({{{1}}}, {{{name|default}}}) are filled in from the call. Page
+transclusions take the page budget first. Parser functions, magic words and
+calls whose target is missing or over budget are left as written.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import re
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, AsyncContextManager
+
+import httpx
+
+from .cache import ResultCache
+from .revisions import mediawiki_get, no_slot
+
+# Opening of each call, nested ones included: used to find what to fetch.
+_CALL_NAME_RE = re.compile(r"(?<!\{)\{\{(?!\{)\s*([^{}|\n]*?)\s*(?=\||\}\})")
+_PARAMETER_RE = re.compile(r"\{\{\{([^{}|]*)(?:\|([^{}]*))?\}\}\}")
+_ONLYINCLUDE_RE = re.compile(r"<onlyinclude>(.*?)</onlyinclude>", re.DOTALL)
+_NOINCLUDE_RE = re.compile(r"<noinclude>.*?(?:</noinclude>|$)", re.DOTALL)
+_INCLUDEONLY_TAG_RE = re.compile(r"</?includeonly>")
+_TEMPLATE_NAMESPACES = ("template", "模板", "樣板", "样板")
+_MAX_REVISIONS_PER_QUERY = 50
+_MAX_PARAMETER_PASSES = 10
+
+RevisionLookup = Callable[[str, str, bool], Awaitable[str | None]]
+
+
+def _target_title(page: str, name: str) -> str | None:
+    """The page a call transcludes, or None for parser functions and magic words."""
+    name = " ".join(name.replace("_", " ").split())
+    if not name or "{" in name or name.startswith("#"):
+        return None
+    if name.startswith("/"):
+        return page + name.rstrip("/")
+    if name.startswith(":"):
+        return name[1:].strip() or None
+    prefix, colon, rest = name.partition(":")
+    if colon:
+        if prefix.strip().casefold() not in _TEMPLATE_NAMESPACES:
+            # subst:, DISPLAYTITLE:, other namespaces and the like.
+            return None
+        name = rest.strip()
+    elif name.isupper() or not any(char.isalnum() for char in name):
+        # {{PAGENAME}}, {{!}} and other variables.
+        return None
+    if not name:
+        return None
+    return f"Template:{name[0].upper()}{name[1:]}"
+
+
+def transcluded_titles(page: str, text: str) -> list[str]:
+    """Titles transcluded by ``text``, page transclusions before templates."""
+    targets = dict.fromkeys(
+        target
+        for target in (_target_title(page, match.group(1)) for match in _CALL_NAME_RE.finditer(text))
+        if target is not None
+    )
+    return sorted(targets, key=lambda target: target.startswith("Template:"))
+
+
+def transclusion_body(text: str) -> str:
+    parts = _ONLYINCLUDE_RE.findall(text)
+    if parts:
+        return "".join(parts)
+    return _INCLUDEONLY_TAG_RE.sub("", _NOINCLUDE_RE.sub("", text))
+
+
+def _calls(text: str) -> list[tuple[int, int]]:
+    """Spans of the outermost {{...}} calls in ``text``; {{{...}}} is skipped."""
+    spans: list[tuple[int, int]] = []
+    stack: list[tuple[int, int]] = []
+    pos = 0
+    while pos < len(text):
+        if text.startswith("{{", pos):
+            width = 3 if text.startswith("{{{", pos) else 2
+            stack.append((pos, width))
+            pos += width
+        elif text.startswith("}}", pos) and stack:
+            start, width = stack[-1]
+            if width == 3 and not text.startswith("}}}", pos):
+                # A call closing inside a parameter default.
+                width = 2
+            stack.pop()
+            pos += width
+            if width == 2 and not stack:
+                spans.append((start, pos))
+        else:
+            pos += 1
+    return spans
+
+
+def _split_arguments(inner: str) -> list[str]:
+    parts: list[str] = []
+    depth = 0
+    current = 0
+    pos = 0
+    while pos < len(inner):
+        pair = inner[pos : pos + 2]
+        if pair in ("{{", "[["):
+            depth += 1
+            pos += 2
+        elif pair in ("}}", "]]") and depth:
+            depth -= 1
+            pos += 2
+        elif inner[pos] == "|" and not depth:
+            parts.append(inner[current:pos])
+            current = pos = pos + 1
+        else:
+            pos += 1
+    parts.append(inner[current:])
+    return parts
+
+
+def _arguments(parts: list[str]) -> dict[str, str]:
+    args: dict[str, str] = {}
+    position = 0
+    for part in parts:
+        key, sep, value = part.partition("=")
+        if sep and "{" not in key and "[" not in key:
+            args[key.strip()] = value.strip()
+        else:
+            position += 1
+            args[str(position)] = part
+    return args
+
+
+def _substitute(text: str, args: dict[str, str]) -> str:
+    def replace(match: re.Match[str]) -> str:
+        name = match.group(1).strip()
+        if name in args:
+            return args[name]
+        if match.group(2) is not None:
+            return match.group(2)
+        return match.group(0)
+
+    # Innermost parameters first, so defaults may name other parameters.
+    for _ in range(_MAX_PARAMETER_PASSES):
+        replaced = _PARAMETER_RE.sub(replace, text)
+        if replaced == text:
+            break
+        text = replaced
+    return text
+
+
+def _inline(
+    page: str,
+    texts: dict[str, str],
+    depth: int,
+    stack: tuple[str, ...] = (),
+    args: dict[str, str] | None = None,
+) -> str:
+    text = texts[page] if args is None else _substitute(texts[page], args)
+    return _expand(page, text, texts, depth, stack)
+
+
+def _expand(page: str, text: str, texts: dict[str, str], depth: int, stack: tuple[str, ...]) -> str:
+    if depth <= 0:
+        return text
+    out: list[str] = []
+    pos = 0
+    for start, end in _calls(text):
+        parts = _split_arguments(text[start + 2 : end - 2])
+        target = _target_title(page, parts[0])
+        out.append(text[pos:start])
+        if target in texts and target not in stack and target != page:
+            out.append(_inline(target, texts, depth - 1, (*stack, page), _arguments(parts[1:])))
+        else:
+            # Kept as written; calls in its arguments are still expanded.
+            out.append("{{" + _expand(page, text[start + 2 : end - 2], texts, depth, stack) + "}}")
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+class WikiExpander:
+    def __init__(
+        self,
+        cache: ResultCache,
+        api_urls: dict[str, str],
+        *,
+        revision: RevisionLookup,
+        fresh_seconds: float = 600.0,
+        slot: Callable[[str], AsyncContextManager[Any]] = no_slot,
+        proxy: str | None = None,
+        timeout_seconds: float = 20.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+        on_response: Callable[[str, bytes], None] | None = None,
+    ) -> None:
+        self.cache = cache
+        self.api_urls = api_urls
+        self.fresh_seconds = fresh_seconds
+        self.pages_fetched = 0
+        self.pages_cached = 0
+        self.revision_queries = 0
+        self._revision = revision
+        self._slot = slot
+        self._proxy = proxy
+        self._timeout_seconds = timeout_seconds
+        self._transport = transport
+        self._on_response = on_response
+        # (site, title) -> (revid, checked at, "<revid>:<touched>" token)
+        self._known: dict[tuple[str, str], tuple[int | None, float, str | None]] = {}
+        self._inflight: dict[tuple[str, int], asyncio.Task[dict[int, str]]] = {}
+
+    async def expand(
+        self,
+        site: str,
+        title: str,
+        *,
+        max_depth: int,
+        max_pages: int,
+        use_proxy: bool = False,
+        revision: str | None = None,
+    ) -> str:
+        """Expand ``title``; ``revision`` is a lookup the caller already made for it."""
+        text, _ = await self.expand_until(
+            site,
+            title,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            use_proxy=use_proxy,
+            revision=revision,
+        )
+        return text
+
+    async def expand_until(
+        self,
+        site: str,
+        title: str,
+        *,
+        max_depth: int,
+        max_pages: int,
+        use_proxy: bool = False,
+        revision: str | None = None,
+        deadline: float | None = None,
+    ) -> tuple[str, bool]:
+        """Like expand, but stops at loop time ``deadline`` with what it has.
+
+        Returns the text and whether the expansion is complete.
+        """
+        if revision is not None:
+            self._known[(site, title)] = (int(revision.split(":", 1)[0]), time.time(), revision)
+        root = await self.pages(site, [title], use_proxy=use_proxy)
+        if title not in root:
+            raise LookupError(f"{site}: page not found: {title}")
+        texts = {title: root[title]}
+        level = [title]
+        complete = True
+        for _ in range(max(0, max_depth)):
+            wanted: list[str] = []
+            for page in level:
+                for target in transcluded_titles(page, texts[page]):
+                    if target in texts or target in wanted:
+                        continue
+                    if len(texts) - 1 + len(wanted) >= max_pages:
+                        break
+                    wanted.append(target)
+            if not wanted:
+                break
+            try:
+                async with asyncio.timeout_at(deadline):
+                    fetched = await self.pages(site, wanted, use_proxy=use_proxy)
+            except TimeoutError:
+                complete = False
+                break
+            texts.update({page: transclusion_body(text) for page, text in fetched.items()})
+            level = [page for page in wanted if page in fetched]
+        return _inline(title, texts, max_depth), complete
+
+    async def pages(self, site: str, titles: list[str], *, use_proxy: bool = False) -> dict[str, str]:
+        revids = dict(
+            zip(titles, await asyncio.gather(*(self._revid(site, t, use_proxy) for t in titles)))
+        )
+        contents = await self._contents(
+            site, [revid for revid in revids.values() if revid is not None], use_proxy
+        )
+        return {
+            title: contents[revid]
+            for title, revid in revids.items()
+            if revid is not None and contents.get(revid) is not None
+        }
+
+    async def _revid(self, site: str, title: str, use_proxy: bool) -> int | None:
+        known = self._known.get((site, title))
+        if known is not None and time.time() - known[1] < self.fresh_seconds:
+            return known[0]
+        self.revision_queries += 1
+        token = await self._revision(site, title, use_proxy)
+        revid = int(token.split(":", 1)[0]) if token else None
+        self._known[(site, title)] = (revid, time.time(), token)
+        return revid
+
+    def revision_token(self, site: str, title: str) -> str | None:
+        """The revision lookup last used for ``title``, as the checker returns it."""
+        known = self._known.get((site, title))
+        return known[2] if known is not None else None
+
+    async def _contents(self, site: str, revids: list[int], use_proxy: bool) -> dict[int, str | None]:
+        contents: dict[int, str | None] = {}
+        tasks: dict[int, asyncio.Task[dict[int, str]]] = {}
+        to_fetch: list[int] = []
+        for revid in dict.fromkeys(revids):
+            cached = self.cache.get(ResultCache.make_key(site, revid))
+            if cached is not None:
+                self.pages_cached += 1
+                contents[revid] = cached
+            elif (site, revid) in self._inflight:
+                tasks[revid] = self._inflight[(site, revid)]
+            else:
+                to_fetch.append(revid)
+        if to_fetch:
+            # The fetch runs as its own task, so an expansion that gives up
+            # at its deadline does not cancel it for the others waiting on it,
+            # and a finished fetch still lands in the cache.
+            task = asyncio.ensure_future(self._fetch_revisions(site, to_fetch, use_proxy))
+            task.add_done_callback(functools.partial(self._fetched, site, to_fetch))
+            for revid in to_fetch:
+                self._inflight[(site, revid)] = tasks[revid] = task
+        for revid, task in tasks.items():
+            contents[revid] = (await asyncio.shield(task)).get(revid)
+        return contents
+
+    def _fetched(self, site: str, revids: list[int], task: asyncio.Task[dict[int, str]]) -> None:
+        for revid in revids:
+            if self._inflight.get((site, revid)) is task:
+                del self._inflight[(site, revid)]
+        if task.cancelled() or task.exception() is not None:
+            return
+        for revid, text in task.result().items():
+            self.cache.set(ResultCache.make_key(site, revid), text)
+
+    async def _fetch_revisions(self, site: str, revids: list[int], use_proxy: bool) -> dict[int, str]:
+        fetched: dict[int, str] = {}
+        for start in range(0, len(revids), _MAX_REVISIONS_PER_QUERY):
+            chunk = revids[start : start + _MAX_REVISIONS_PER_QUERY]
+            response = await mediawiki_get(
+                self.api_urls[site],
+                {
+                    "prop": "revisions",
+                    "revids": "|".join(str(revid) for revid in chunk),
+                    "rvprop": "ids|content",
+                    "rvslots": "main",
+                },
+                slot=self._slot,
+                proxy=self._proxy if use_proxy else None,
+                timeout_seconds=self._timeout_seconds,
+                transport=self._transport,
+            )
+            if self._on_response is not None:
+                self._on_response(site, response.content)
+            for page in (response.json().get("query") or {}).get("pages") or []:
+                for revision in page.get("revisions") or []:
+                    content = (revision.get("slots") or {}).get("main", {}).get("content")
+                    if content is not None:
+                        fetched[revision["revid"]] = content
+            self.pages_fetched += len(chunk)
+        return fetched
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pages_fetched": self.pages_fetched,
+            "pages_cached": self.pages_cached,
+            "revision_queries": self.revision_queries,
+            "inflight": len(self._inflight),
+        }
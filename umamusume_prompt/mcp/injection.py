@@ -0,0 +1,66 @@
+"""
+Prompt-injection marker scanner for crawled pages.
+
+Markers are folded into a prefix trie and compiled once into a single regular
+expression, so the C regex engine walks the shared-prefix automaton at each
+position instead of running one substring scan per marker. Lookups stay flat
+as the marker list grows to hundreds of entries.
+"""
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable
+from pathlib import Path
+
+
+class InjectionDetected(ValueError):
+    def __init__(self, marker: str) -> None:
+        super().__init__(f"prompt-injection marker found: {marker!r}")
+        self.marker = marker
+
+
+def _trie_pattern(node: dict[str, dict]) -> str:
+    # A terminal node already detects every longer marker sharing its prefix.
+    if "" in node:
+        return ""
+    alternatives = [
+        re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())
+    ]
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+class InjectionScanner:
+    def __init__(self, markers: Iterable[str]) -> None:
+        self.markers = tuple(dict.fromkeys(marker for marker in markers if marker))
+        self.max_marker_length = max((len(marker) for marker in self.markers), default=0)
+        self._pattern: re.Pattern[str] | None = None
+        if self.markers:
+            trie: dict[str, dict] = {}
+            for marker in self.markers:
+                node = trie
+                for char in marker:
+                    node = node.setdefault(char, {})
+                node[""] = {}
+            self._pattern = re.compile(_trie_pattern(trie))
+
+    @classmethod
+    def from_file(cls, path: Path) -> InjectionScanner:
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+        return cls(
+            line.strip()
+            for line in lines
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+
+    def find(self, text: str, start: int = 0, end: int | None = None) -> str | None:
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text, start, len(text) if end is None else end)
+        return match.group() if match else None
+
+    def check(self, text: str, start: int = 0, end: int | None = None) -> None:
+        marker = self.find(text, start, end)
+        if marker is not None:
+            raise InjectionDetected(marker)
@@ -0,0 +1,173 @@
+"""
+Per-upstream rate limiting for the MCP server.
+
+Each upstream host gets a token bucket (requests per second with a burst
+allowance) and a concurrency semaphore. Callers that are throttled wait in
+line until a queue deadline instead of failing straight away. A slot that
+covers several upstream requests is charged that many tokens; the bucket may
+go into debt, which later callers wait out.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+
+QueueCallback = Callable[[str, int], None]
+WaitCallback = Callable[[str, float], None]
+
+
+class UpstreamBusyError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class HostLimits:
+    rate_per_second: float
+    burst: int
+    max_concurrency: int
+
+
+class HostGovernor:
+    def __init__(
+        self,
+        host: str,
+        limits: HostLimits,
+        *,
+        queue_timeout_seconds: float,
+        on_queue: QueueCallback | None = None,
+        on_wait: WaitCallback | None = None,
+    ) -> None:
+        self.host = host
+        self.limits = limits
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._on_queue = on_queue
+        self._on_wait = on_wait
+        self.waiting = 0
+        self.in_flight = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.last_wait_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(max(1, limits.max_concurrency))
+        self._bucket_lock = asyncio.Lock()
+        self._tokens = float(max(1, limits.burst))
+        self._refilled_at = time.monotonic()
+
+    async def _take_token(self, cost: int) -> None:
+        if self.limits.rate_per_second <= 0:
+            return
+        capacity = float(max(1, self.limits.burst))
+        # The lock hands out tokens in arrival order.
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    capacity,
+                    self._tokens + (now - self._refilled_at) * self.limits.rate_per_second,
+                )
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.limits.rate_per_second)
+
+    async def _acquire(self, cost: int) -> None:
+        await self._semaphore.acquire()
+        try:
+            await self._take_token(cost)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, timeout_seconds: float | None = None, *, cost: int = 1
+    ) -> AsyncIterator[None]:
+        """Hold a concurrency slot; ``cost`` is the number of requests it covers."""
+        cost = max(1, cost)
+        timeout = self.queue_timeout_seconds if timeout_seconds is None else timeout_seconds
+        start = time.monotonic()
+        self.waiting += 1
+        if self._on_queue is not None:
+            self._on_queue(self.host, self.waiting)
+        try:
+            if timeout > 0:
+                await asyncio.wait_for(self._acquire(cost), timeout)
+            else:
+                await self._acquire(cost)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise UpstreamBusyError(
+                f"{self.host} is throttled; gave up after waiting {timeout:g}s"
+            ) from None
+        finally:
+            self.waiting -= 1
+            if self._on_queue is not None:
+                self._on_queue(self.host, self.waiting)
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.last_wait_seconds = waited
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if self._on_wait is not None:
+            self._on_wait(self.host, waited)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, float | int]:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "total_wait_seconds": round(self.total_wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "last_wait_seconds": round(self.last_wait_seconds, 6),
+        }
+
+
+class UpstreamGovernor:
+    def __init__(
+        self,
+        default_limits: HostLimits,
+        *,
+        host_limits: dict[str, HostLimits] | None = None,
+        queue_timeout_seconds: float = 30.0,
+        on_queue: QueueCallback | None = None,
+        on_wait: WaitCallback | None = None,
+    ) -> None:
+        self.default_limits = default_limits
+        self.host_limits = dict(host_limits or {})
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._on_queue = on_queue
+        self._on_wait = on_wait
+        self._hosts: dict[str, HostGovernor] = {}
+
+    def for_host(self, host: str) -> HostGovernor:
+        host = host.lower()
+        governor = self._hosts.get(host)
+        if governor is None:
+            governor = HostGovernor(
+                host,
+                self.host_limits.get(host, self.default_limits),
+                queue_timeout_seconds=self.queue_timeout_seconds,
+                on_queue=self._on_queue,
+                on_wait=self._on_wait,
+            )
+            self._hosts[host] = governor
+        return governor
+
+    def slot(self, host: str, timeout_seconds: float | None = None, *, cost: int = 1):
+        return self.for_host(host).slot(timeout_seconds, cost=cost)
+
+    def stats(self) -> dict[str, dict[str, float | int]]:
+        return {host: governor.stats() for host, governor in self._hosts.items()}
@@ -0,0 +1,232 @@
+"""
+Prometheus text-format metrics for the MCP server.
+
+A minimal in-process registry (counters, gauges and histograms with labels) rendered
+at /metrics, so no extra client library is needed. Updates are plain dict
+operations on the event loop thread, cheap enough to leave on for every call.
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple[str, ...], list[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Gauge | Histogram] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        metric = Gauge(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets=buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def _is_error_result(result: Any) -> bool:
+    return isinstance(result, dict) and (
+        result.get("status") == "error" or bool(result.get("error"))
+    )
+
+
+class ToolMetrics:
+    def __init__(self, registry: MetricsRegistry | None = None) -> None:
+        self.registry = registry or MetricsRegistry()
+        self.calls = self.registry.counter(
+            "mcp_tool_calls_total", "MCP tool calls by outcome.", ("tool", "status")
+        )
+        self.latency = self.registry.histogram(
+            "mcp_tool_latency_seconds", "MCP tool call latency in seconds.", ("tool",)
+        )
+        self.errors = self.registry.counter(
+            "mcp_tool_errors_total", "MCP tool errors by exception type.", ("tool", "exception")
+        )
+        self.upstream_bytes = self.registry.counter(
+            "mcp_upstream_bytes_total", "Bytes of content fetched from upstream hosts.", ("host",)
+        )
+        self.upstream_queue_depth = self.registry.gauge(
+            "mcp_upstream_queue_depth", "Requests waiting for an upstream slot.", ("host",)
+        )
+        self.upstream_wait = self.registry.histogram(
+            "mcp_upstream_wait_seconds",
+            "Time spent waiting for an upstream slot in seconds.",
+            ("host",),
+        )
+        self.truncations = self.registry.counter(
+            "mcp_crawl_truncations_total", "crawl_page results cut off at the size cap."
+        )
+        self.injection_rejections = self.registry.counter(
+            "mcp_injection_rejections_total", "crawl_page results dropped for injection markers."
+        )
+        self.revalidations = self.registry.counter(
+            "mcp_wiki_revalidations_total",
+            "Cached wiki pages checked against the live revision.",
+            ("site", "result"),
+        )
+        self.deadlines = self.registry.counter(
+            "mcp_tool_deadlines_total",
+            "Tool calls that hit their deadline, returning partial results or timing out.",
+            ("tool", "outcome"),
+        )
+        self._current_tool: contextvars.ContextVar[str] = contextvars.ContextVar(
+            "mcp_current_tool", default="unknown"
+        )
+
+    def instrument(self, fn: F) -> F:
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = self._current_tool.set(name)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                if not _is_error_result(result):
+                    status = "success"
+                return result
+            except BaseException as exc:
+                self.errors.inc(name, type(exc).__name__)
+                raise
+            finally:
+                self.latency.observe(time.perf_counter() - start, name)
+                self.calls.inc(name, status)
+                self._current_tool.reset(token)
+
+        return wrapper  # type: ignore[return-value]
+
+    def exception(self, exc: BaseException) -> None:
+        """Count an exception a tool handled itself and turned into an error result."""
+        self.errors.inc(self._current_tool.get(), type(exc).__name__)
+
+    def fetched(self, host: str, content: str | bytes) -> None:
+        size = len(content) if isinstance(content, bytes) else len(content.encode("utf-8"))
+        self.upstream_bytes.inc(host, amount=size)
+
+    def queued(self, host: str, depth: int) -> None:
+        self.upstream_queue_depth.set(depth, host)
+
+    def waited(self, host: str, seconds: float) -> None:
+        self.upstream_wait.observe(seconds, host)
+
+    def render(self) -> str:
+        return self.registry.render()
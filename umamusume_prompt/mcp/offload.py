@@ -0,0 +1,52 @@
+"""
+Bounded thread pool for blocking upstream clients.
+
+The Google helpers in umamusume-web-crawler are synchronous; calling them from
+an ``async def`` tool stalls every session on the event loop. ``BlockingPool``
+runs them on a fixed number of worker threads with a per-call timeout.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class BlockingPool:
+    def __init__(self, name: str, *, max_workers: int, timeout_seconds: float) -> None:
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.timeout_seconds = timeout_seconds
+        self.timeouts = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._get_executor(), functools.partial(fn, *args, **kwargs)
+        )
+        if self.timeout_seconds <= 0:
+            return await future
+        try:
+            return await asyncio.wait_for(future, self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(
+                f"{self.name} call timed out after {self.timeout_seconds:g}s"
+            ) from None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,111 @@
+"""
+Cursor pagination for long tool results.
+
+Documents are split on Markdown section boundaries (falling back to
+paragraphs, lines and finally fixed-size cuts for oversized sections).
+Multi-page documents are kept in a server-side store, and follow-up calls
+return the next page by cursor without fetching the source again. With the
+store disabled only the first page is returned, marked truncated.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from collections.abc import Callable
+
+from .cache import ResultCache
+
+_HEADING_RE = re.compile(r"^(?=#{1,6}\s)", re.MULTILINE)
+
+
+def _split_on(separator: str) -> Callable[[str], list[str]]:
+    def split(text: str) -> list[str]:
+        parts = text.split(separator)
+        return [part + separator for part in parts[:-1]] + [parts[-1]]
+
+    return split
+
+
+# Coarsest boundary first; each piece keeps its separator so pages join back
+# into the original text.
+_SPLITTERS: tuple[Callable[[str], list[str]], ...] = (
+    _HEADING_RE.split,
+    _split_on("\n\n"),
+    _split_on("\n"),
+)
+
+
+def _pack(text: str, max_chars: int, level: int) -> list[str]:
+    if level == len(_SPLITTERS):
+        return [text[start : start + max_chars] for start in range(0, len(text), max_chars)]
+    pages: list[str] = []
+    current = ""
+    for piece in _SPLITTERS[level](text):
+        if not piece:
+            continue
+        if len(piece) > max_chars:
+            if current:
+                pages.append(current)
+                current = ""
+            pages.extend(_pack(piece, max_chars, level + 1))
+        elif len(current) + len(piece) > max_chars:
+            pages.append(current)
+            current = piece
+        else:
+            current += piece
+    if current:
+        pages.append(current)
+    return pages
+
+
+def split_sections(text: str, max_chars: int) -> list[str]:
+    if len(text) <= max_chars:
+        return [text]
+    return _pack(text, max_chars, 0)
+
+
+class CursorError(ValueError):
+    pass
+
+
+class DocumentStore:
+    def __init__(self, cache: ResultCache, *, page_chars: int) -> None:
+        self.cache = cache
+        self.page_chars = page_chars
+
+    def first_page(self, text: str) -> dict:
+        if self.page_chars <= 0:
+            return self._page("", [text], 0)
+        pages = split_sections(text, self.page_chars)
+        if not self.cache.enabled:
+            # Without a backing store a cursor could not be honoured, so only
+            # the first page is returned and the rest is reported as cut off.
+            page = self._page("", pages[:1], 0)
+            if len(pages) > 1:
+                page.update(truncated=True, original_length=len(text))
+            return page
+        doc_id = ""
+        if len(pages) > 1:
+            digest = hashlib.sha1(f"{self.page_chars}\0{text}".encode("utf-8"))
+            doc_id = digest.hexdigest()[:20]
+            self.cache.set(doc_id, pages)
+        return self._page(doc_id, pages, 0)
+
+    def page(self, cursor: str) -> dict:
+        doc_id, _, index = cursor.partition(":")
+        pages = self.cache.get(doc_id) if doc_id and index.isdigit() else None
+        if pages is None or int(index) >= len(pages):
+            raise CursorError(
+                f"Unknown or expired cursor: {cursor!r}. Call the tool again without a cursor."
+            )
+        return self._page(doc_id, pages, int(index))
+
+    @staticmethod
+    def _page(doc_id: str, pages: list[str], index: int) -> dict:
+        has_more = index + 1 < len(pages)
+        return {
+            "result": pages[index],
+            "page": index + 1,
+            "total_pages": len(pages),
+            "next_cursor": f"{doc_id}:{index + 1}" if has_more else None,
+        }
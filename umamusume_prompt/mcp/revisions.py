@@ -0,0 +1,163 @@
+"""
+Batched MediaWiki revision lookups for cache revalidation.
+
+Titles requested within a short window are folded into one
+action=query&prop=info call per site (up to 50 titles), which returns the
+latest revision id and the touched timestamp of each page. The touched
+timestamp also moves when a transcluded page changes, so the pair tells
+whether cached expanded wikitext is still current for a few hundred bytes.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import weakref
+from collections.abc import AsyncIterator, Callable
+from typing import Any, AsyncContextManager
+
+import httpx
+
+_MAX_TITLES_PER_QUERY = 50
+
+
+@contextlib.asynccontextmanager
+async def no_slot(host: str) -> AsyncIterator[None]:
+    yield
+
+
+async def mediawiki_get(
+    api_url: str,
+    params: dict[str, str],
+    *,
+    slot: Callable[[str], AsyncContextManager[Any]] = no_slot,
+    proxy: str | None = None,
+    timeout_seconds: float = 10.0,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.Response:
+    query = {"action": "query", "format": "json", "formatversion": "2", **params}
+    async with slot(httpx.URL(api_url).host):
+        async with httpx.AsyncClient(
+            timeout=timeout_seconds, proxy=proxy, transport=transport
+        ) as client:
+            response = await client.get(api_url, params=query)
+    response.raise_for_status()
+    return response
+
+
+class RevisionChecker:
+    def __init__(
+        self,
+        api_urls: dict[str, str],
+        *,
+        timeout_seconds: float = 10.0,
+        batch_window_seconds: float = 0.05,
+        slot: Callable[[str], AsyncContextManager[Any]] = no_slot,
+        proxy: str | None = None,
+        on_response: Callable[[str, bytes], None] | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.api_urls = api_urls
+        self.timeout_seconds = timeout_seconds
+        self.batch_window_seconds = batch_window_seconds
+        self.queries = 0
+        self.titles = 0
+        self._slot = slot
+        self._proxy = proxy
+        self._on_response = on_response
+        self._transport = transport
+        # Open batches per event loop: their futures and flush timer belong to it.
+        self._pending: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple[str, bool], dict[str, asyncio.Future[str | None]]]
+        ] = weakref.WeakKeyDictionary()
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def revision(self, site: str, title: str, *, use_proxy: bool = False) -> str | None:
+        """Return "<lastrevid>:<touched>" for a page, or None if it is unknown."""
+        loop = asyncio.get_running_loop()
+        pending = self._pending.setdefault(loop, {})
+        batch_key = (site, bool(use_proxy))
+        batch = pending.get(batch_key)
+        if batch is None:
+            batch = pending[batch_key] = {}
+            loop.call_later(self.batch_window_seconds, self._flush, pending, batch_key)
+        future = batch.get(title)
+        if future is None:
+            future = batch[title] = loop.create_future()
+            if len(batch) >= _MAX_TITLES_PER_QUERY:
+                self._flush(pending, batch_key)
+        return await asyncio.shield(future)
+
+    def _flush(
+        self,
+        pending: dict[tuple[str, bool], dict[str, asyncio.Future[str | None]]],
+        batch_key: tuple[str, bool],
+    ) -> None:
+        batch = pending.pop(batch_key, None)
+        if batch:
+            task = asyncio.ensure_future(self._resolve(batch_key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(
+        self, batch_key: tuple[str, bool], batch: dict[str, asyncio.Future[str | None]]
+    ) -> None:
+        site, use_proxy = batch_key
+        try:
+            revisions = await self._query(site, list(batch), use_proxy=use_proxy)
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for title, future in batch.items():
+            if not future.done():
+                future.set_result(revisions.get(title))
+
+    async def _query(self, site: str, titles: list[str], *, use_proxy: bool) -> dict[str, str]:
+        response = await mediawiki_get(
+            self.api_urls[site],
+            {"prop": "info", "titles": "|".join(titles), "redirects": "1"},
+            slot=self._slot,
+            proxy=self._proxy if use_proxy else None,
+            timeout_seconds=self.timeout_seconds,
+            transport=self._transport,
+        )
+        self.queries += 1
+        self.titles += len(titles)
+        if self._on_response is not None:
+            self._on_response(site, response.content)
+        return parse_info_response(response.json(), titles)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queries": self.queries,
+            "titles": self.titles,
+            "pending": sum(
+                len(batch) for pending in self._pending.values() for batch in pending.values()
+            ),
+        }
+
+
+def parse_info_response(payload: dict, titles: list[str]) -> dict[str, str]:
+    query = payload.get("query") or {}
+    aliases: dict[str, str] = {}
+    for key in ("normalized", "redirects"):
+        for item in query.get(key) or []:
+            aliases[item["from"]] = item["to"]
+    pages = {
+        page["title"]: page
+        for page in query.get("pages") or []
+        if not page.get("missing") and not page.get("invalid") and "lastrevid" in page
+    }
+    revisions: dict[str, str] = {}
+    for title in titles:
+        resolved = title
+        # normalized -> redirect target, at most a couple of hops
+        for _ in range(3):
+            if resolved in pages or resolved not in aliases:
+                break
+            resolved = aliases[resolved]
+        page = pages.get(resolved)
+        if page is not None:
+            revisions[title] = f"{page['lastrevid']}:{page.get('touched', '')}"
+    return revisions
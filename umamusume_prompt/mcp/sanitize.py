@@ -0,0 +1,166 @@
+"""
+Single-pass sanitizer for crawl_page output.
+
+Fallback HTML is tokenized with one precompiled pattern (script/style blocks,
+line-break tags and all other tags) instead of a chain of full-document
+substitutions. Large pages are converted incrementally so processing stops
+once the character cap is reached. An optional injection scanner runs over
+each finalized stretch of output, so noisy pages are rejected as soon as a
+marker shows up.
+
+The output matches the substitution chain exactly. The one-pass tokenizer
+reads markup the same way as long as every '<' starts a tag and no tag
+contains another '<'; a page with stray '<' is handed to the chain instead.
+"""
+from __future__ import annotations
+
+import html
+import re
+from collections.abc import Iterator
+
+from .injection import InjectionScanner
+
+_HTML_MARKER_RE = re.compile(r"<html|<!doctype html", re.IGNORECASE)
+_HTML_TOKEN_RE = re.compile(
+    r"<(script|style|noscript|svg|iframe|head).*?>.*?</\1>"
+    r"|(<br\s*/?>|</p>)"
+    r"|<[^>]+>",
+    re.IGNORECASE | re.DOTALL,
+)
+# The same rules as successive substitutions, for pages with stray '<'.
+_BLOCK_RE = re.compile(r"<(script|style|noscript|svg|iframe|head).*?>.*?</\1>", re.I | re.S)
+_BREAK_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_PARAGRAPH_END_RE = re.compile(r"</p>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+# Only runs that normalize to something different are matched, so the
+# replacement stays on the C fast path for ordinary text.
+_SPACE_RUN_RE = re.compile(r"[ \t]{2,}|\t")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_PLAIN_CHUNK_CHARS = 64 * 1024
+# The end of a normalized prefix may still change once more input follows:
+# a character reference cut short (at most 33 characters) or a whitespace
+# run. Everything before this many trailing characters is final.
+_UNSTABLE_TAIL = 40
+
+
+class _StrayMarkup(Exception):
+    """A '<' the one-pass tokenizer would read differently from the chain."""
+
+
+def _replace_tag(match: re.Match[str]) -> str:
+    if match.lastindex == 2:
+        return "\n"
+    if match.lastindex is None and match.string.find("<", match.start() + 1, match.end()) != -1:
+        raise _StrayMarkup
+    return " "
+
+
+def _strip_tags(raw_text: str) -> str:
+    text = _HTML_TOKEN_RE.sub(_replace_tag, raw_text)
+    # Replacements never contain '<', so one left over was never part of a tag.
+    if "<" in text:
+        raise _StrayMarkup
+    return text
+
+
+def _strip_tags_chain(raw_text: str) -> str:
+    text = _BLOCK_RE.sub(" ", raw_text)
+    text = _BREAK_RE.sub("\n", text)
+    text = _PARAGRAPH_END_RE.sub("\n", text)
+    return _TAG_RE.sub(" ", text)
+
+
+def _normalize(text: str, is_html: bool) -> str:
+    if is_html:
+        text = html.unescape(text)
+    if "\r" in text:
+        text = text.replace("\r", "\n")
+    text = _SPACE_RUN_RE.sub(" ", text)
+    return _BLANK_LINES_RE.sub("\n\n", text)
+
+
+def _iter_html_text(raw_text: str) -> Iterator[str]:
+    pos = 0
+    for match in _HTML_TOKEN_RE.finditer(raw_text):
+        start = match.start()
+        if start > pos:
+            if raw_text.find("<", pos, start) != -1:
+                raise _StrayMarkup
+            yield raw_text[pos:start]
+        yield _replace_tag(match)
+        pos = match.end()
+    if pos < len(raw_text):
+        if raw_text.find("<", pos) != -1:
+            raise _StrayMarkup
+        yield raw_text[pos:]
+
+
+def _iter_plain_text(raw_text: str) -> Iterator[str]:
+    for start in range(0, len(raw_text), _PLAIN_CHUNK_CHARS):
+        yield raw_text[start : start + _PLAIN_CHUNK_CHARS]
+
+
+def _truncate(text: str, max_chars: int, original_length: int) -> str:
+    return text[:max_chars] + f"\n\n[truncated, original_length={original_length}]"
+
+
+def _sanitize(
+    raw_text: str, max_chars: int, is_html: bool, scanner: InjectionScanner | None
+) -> tuple[str, bool]:
+    """Normalized text (not yet cut to max_chars) and whether it exceeds the cap."""
+    # Pages within the cap are never truncated, so they are converted in one
+    # substitution; longer ones are streamed so processing stops at the cap.
+    if len(raw_text) <= max_chars:
+        pieces = [_strip_tags(raw_text) if is_html else raw_text]
+    elif is_html:
+        pieces = _iter_html_text(raw_text)
+    else:
+        pieces = _iter_plain_text(raw_text)
+
+    buffer: list[str] = []
+    produced = 0
+    scanned = 0
+    # Normalization never lengthens text, so nothing can be cut before the
+    # raw output passes the cap. A little slack for whitespace it removes
+    # lets typical pages stop at the first checkpoint.
+    checkpoint = max_chars + max_chars // 16 + _UNSTABLE_TAIL + 1
+    for piece in pieces:
+        buffer.append(piece)
+        produced += len(piece)
+        if produced < checkpoint:
+            continue
+        text = _normalize("".join(buffer), is_html).lstrip()
+        stable = len(text) - _UNSTABLE_TAIL
+        if scanner is not None:
+            final = max(0, min(stable, max_chars))
+            scanner.check(text, scanned, final)
+            # Re-scan the tail next time in case a marker straddles the boundary.
+            scanned = max(0, final - scanner.max_marker_length + 1)
+        # Only non-whitespace past the cap means truncation: trailing
+        # whitespace is stripped from the final text.
+        if stable > max_chars and not text[max_chars:stable].isspace():
+            return text, True
+        checkpoint = produced * 2
+
+    text = _normalize("".join(buffer), is_html).strip()
+    if scanner is not None:
+        scanner.check(text, scanned, max_chars)
+    return text, len(text) > max_chars
+
+
+def sanitize_crawl_result(
+    raw_text: str, max_chars: int, scanner: InjectionScanner | None = None
+) -> tuple[str, bool, int]:
+    original_length = len(raw_text)
+    # If crawler fell back to full HTML, strip scripts/styles/tags aggressively.
+    is_html = _HTML_MARKER_RE.search(raw_text) is not None
+    try:
+        text, truncated = _sanitize(raw_text, max_chars, is_html, scanner)
+    except _StrayMarkup:
+        text = _normalize(_strip_tags_chain(raw_text), True).strip()
+        if scanner is not None:
+            scanner.check(text, 0, max_chars)
+        truncated = len(text) > max_chars
+    if truncated:
+        text = _truncate(text, max_chars, original_length)
+    return text, truncated, original_length
@@ -0,0 +1,93 @@
+"""
+Offline snapshot of wiki search results and expanded page sources.
+
+Layout of a snapshot directory:
+
+    manifest.json              when it was built and from which roster
+    search.json                {site: {keyword: [title, ...]}}
+    pages/<site>/<hash>.json   {"title", "revision", "wikitext", ...}
+
+Pages hold the expanded wikitext, so parsing and Markdown rendering still
+happen at serve time and follow the current renderer.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+
+def _normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.split()).lower()
+
+
+def _write_json(path: Path, payload: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        search_path = self.directory / "search.json"
+        self._searches: dict[str, dict[str, list[str]]] = (
+            json.loads(search_path.read_text(encoding="utf-8")) if search_path.exists() else {}
+        )
+
+    def _page_path(self, site: str, title: str) -> Path:
+        digest = hashlib.sha1(title.encode("utf-8")).hexdigest()[:20]
+        return self.directory / "pages" / site / f"{digest}.json"
+
+    def search(self, site: str, keyword: str, limit: int) -> list[str] | None:
+        titles = self._searches.get(site, {}).get(_normalize_keyword(keyword))
+        if titles is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return titles[:limit]
+
+    def source(self, site: str, title: str) -> dict | None:
+        path = self._page_path(site, title)
+        if not path.exists():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def has_source(self, site: str, title: str) -> bool:
+        return self._page_path(site, title).exists()
+
+    def add_search(self, site: str, keywords: list[str], titles: list[str]) -> None:
+        with self._lock:
+            site_searches = self._searches.setdefault(site, {})
+            for keyword in keywords:
+                if keyword:
+                    site_searches[_normalize_keyword(keyword)] = list(titles)
+
+    def add_source(self, site: str, title: str, source: dict) -> None:
+        _write_json(self._page_path(site, title), {"title": title, **source})
+
+    def save(self, **manifest: Any) -> None:
+        with self._lock:
+            _write_json(self.directory / "search.json", self._searches)
+        _write_json(
+            self.directory / "manifest.json",
+            {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), **manifest},
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "keywords": sum(len(items) for items in self._searches.values()),
+        }
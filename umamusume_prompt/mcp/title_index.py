@@ -0,0 +1,351 @@
+"""
+Local title index for the wiki search tools.
+
+Each site keeps an alias -> title map (page titles, redirects, roster names
+from umamusume_characters.json and keywords learned from remote searches)
+with a character-bigram inverted index over normalized aliases. Lookups are
+an exact alias hit followed by close Dice-scored bigram matches, so resolving
+a character name takes microseconds; the remote search API tops up lookups
+with fewer local hits than asked for.
+
+Titles come from MediaWiki list queries: a full listing (generator plus
+redirects) on the first refresh, then recentchanges for new pages where the
+source supports it, and from remote search results; a search keyword is
+only kept as an alias when it names one of the titles returned for it, so
+ambiguous keywords keep going to the remote search. Roster names are only
+hints: they resolve locally once their title has been seen on that site,
+since the two wikis title some characters differently. The map is persisted
+as JSON between runs; saves after remote searches are batched and written
+off the event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncContextManager
+
+import httpx
+
+_STRIP_RE = re.compile(r"[\s_·・.\-'’\"“”()（）\[\]【】/]+")
+# Bigram Dice of near-miss names is already ~0.6 (东海帝皇 vs 东海帝王 is
+# 0.67), so weaker fuzzy matches go to the remote search instead.
+_MIN_SCORE = 0.8
+_FORMAT_VERSION = 2
+
+
+def normalize_alias(text: str) -> str:
+    return _STRIP_RE.sub("", text).casefold()
+
+
+def _grams(key: str) -> set[str]:
+    if len(key) < 2:
+        return {key} if key else set()
+    return {key[idx : idx + 2] for idx in range(len(key) - 1)}
+
+
+@dataclass(frozen=True)
+class IndexSource:
+    api_url: str
+    # Generator params for the full listing, e.g. {"generator": "allpages", ...}
+    listing: dict[str, str]
+    # Whether new pages can be picked up from list=recentchanges in between
+    incremental: bool = False
+    full_refresh_seconds: float = 7 * 86400
+
+
+@dataclass
+class _SiteIndex:
+    aliases: dict[str, str] = field(default_factory=dict)
+    # Titles seen on the site itself (listings, redirect targets, remote search).
+    titles: set[str] = field(default_factory=set)
+    refreshed_at: float = 0.0
+    full_refresh_at: float = 0.0
+    # Roster aliases by title, added once the title is confirmed.
+    hints: dict[str, list[str]] = field(default_factory=dict)
+    _keys: dict[str, str] = field(default_factory=dict)
+    _gram_counts: dict[str, int] = field(default_factory=dict)
+    _postings: dict[str, set[str]] = field(default_factory=dict)
+
+    def add(self, alias: str, title: str) -> None:
+        key = normalize_alias(alias)
+        if not key or not title:
+            return
+        self.aliases[alias] = title
+        self._keys[key] = title
+        grams = _grams(key)
+        self._gram_counts[key] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def add_title(self, title: str, alias: str | None = None) -> None:
+        self.add(title, title)
+        if alias:
+            self.add(alias, title)
+        if title and title not in self.titles:
+            self.titles.add(title)
+            for hint in self.hints.get(title, ()):
+                self.add(hint, title)
+
+    def search(self, keyword: str, limit: int) -> list[str]:
+        query = normalize_alias(keyword)
+        if not query or limit <= 0:
+            return []
+        results: list[str] = []
+        exact = self._keys.get(query)
+        if exact is not None:
+            results.append(exact)
+        query_grams = _grams(query)
+        overlap: Counter[str] = Counter()
+        for gram in query_grams:
+            overlap.update(self._postings.get(gram, ()))
+        scored = []
+        for key, hits in overlap.items():
+            score = 2 * hits / (len(query_grams) + self._gram_counts[key])
+            if score >= _MIN_SCORE:
+                scored.append((-score, len(key), self._keys[key]))
+        for _, _, title in sorted(scored):
+            if len(results) >= limit:
+                break
+            if title not in results:
+                results.append(title)
+        return results[:limit]
+
+
+@contextlib.asynccontextmanager
+async def _no_slot(host: str) -> AsyncIterator[None]:
+    yield
+
+
+class TitleIndex:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        sources: dict[str, IndexSource],
+        refresh_after_seconds: float = 86_400.0,
+        timeout_seconds: float = 30.0,
+        slot: Callable[[str], AsyncContextManager[Any]] = _no_slot,
+        proxy: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        save_delay_seconds: float = 2.0,
+        roster: Callable[[], dict[str, str]] | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.sources = sources
+        self.refresh_after_seconds = refresh_after_seconds
+        self.timeout_seconds = timeout_seconds
+        self.hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+        self._slot = slot
+        self._proxy = proxy
+        self._transport = transport
+        self._sites: dict[str, _SiteIndex] | None = None
+        self.save_delay_seconds = save_delay_seconds
+        self._hints: dict[str, list[str]] = {}
+        # Read with the index on first use, not when the server module loads.
+        self._roster = roster
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._save_task: asyncio.Task[None] | None = None
+
+    def seed_characters(self, characters: dict[str, str]) -> None:
+        """Known characters: CN and EN names resolve to the CN title on sites
+        where that title has been confirmed."""
+        for name_cn, name_en in characters.items():
+            self._hints.setdefault(name_cn, []).extend([name_cn, name_en])
+        for site_index in (self._sites or {}).values():
+            for title in self._hints.keys() & site_index.titles:
+                for alias in self._hints[title]:
+                    site_index.add(alias, title)
+
+    def _load(self) -> dict[str, _SiteIndex]:
+        if self._sites is None:
+            if self._roster is not None:
+                roster, self._roster = self._roster, None
+                with contextlib.suppress(OSError, ValueError):
+                    self.seed_characters(roster())
+            stored: dict[str, Any] = {}
+            if self.path.exists():
+                with contextlib.suppress(ValueError, OSError):
+                    data = json.loads(self.path.read_text(encoding="utf-8"))
+                    # Older files hold unconfirmed roster aliases; list again.
+                    if data.get("version") == _FORMAT_VERSION:
+                        stored = data.get("sites", {})
+            sites: dict[str, _SiteIndex] = {}
+            for site in set(self.sources) | set(stored):
+                site_index = sites[site] = _SiteIndex(hints=self._hints)
+                data = stored.get(site, {})
+                site_index.refreshed_at = data.get("refreshed_at", 0.0)
+                site_index.full_refresh_at = data.get("full_refresh_at", 0.0)
+                for alias, title in data.get("aliases", {}).items():
+                    site_index.add(alias, title)
+                for title in data.get("titles", []):
+                    site_index.add_title(title)
+            self._sites = sites
+        return self._sites
+
+    def _site(self, site: str) -> _SiteIndex:
+        sites = self._load()
+        if site not in sites:
+            sites[site] = _SiteIndex(hints=self._hints)
+        return sites[site]
+
+    def _payload(self) -> dict[str, Any]:
+        # Copied on the event loop so the write can happen in a thread.
+        return {
+            "version": _FORMAT_VERSION,
+            "sites": {
+                site: {
+                    "refreshed_at": site_index.refreshed_at,
+                    "full_refresh_at": site_index.full_refresh_at,
+                    "aliases": dict(site_index.aliases),
+                    "titles": sorted(site_index.titles),
+                }
+                for site, site_index in self._load().items()
+            },
+        }
+
+    def _write(self, payload: dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    async def _save_later(self) -> None:
+        try:
+            await asyncio.sleep(self.save_delay_seconds)
+        finally:
+            self._save_task = None
+        with contextlib.suppress(OSError):
+            await asyncio.to_thread(self._write, self._payload())
+
+    async def flush(self) -> None:
+        """Write out changes still waiting for a batched save."""
+        if self._save_task is None:
+            return
+        self._save_task.cancel()
+        self._save_task = None
+        with contextlib.suppress(OSError):
+            await asyncio.to_thread(self._write, self._payload())
+
+    def search(self, site: str, keyword: str, limit: int, *, use_proxy: bool = False) -> list[str]:
+        site_index = self._site(site)
+        self._schedule_refresh(site, site_index, use_proxy)
+        titles = site_index.search(keyword, limit)
+        if titles:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return titles
+
+    def learn(self, site: str, keyword: str, titles: Iterable[str]) -> None:
+        titles = list(titles)
+        site_index = self._site(site)
+        for title in titles:
+            site_index.add_title(title)
+        key = normalize_alias(keyword)
+        for title in titles:
+            if normalize_alias(title) == key:
+                site_index.add(keyword, title)
+                break
+        if titles:
+            # One write covers every search within the delay.
+            if self._save_task is None:
+                self._save_task = asyncio.ensure_future(self._save_later())
+
+    def _schedule_refresh(self, site: str, site_index: _SiteIndex, use_proxy: bool) -> None:
+        if (
+            self.refresh_after_seconds <= 0
+            or site not in self.sources
+            or site in self._refreshing
+            or time.time() - site_index.refreshed_at < self.refresh_after_seconds
+        ):
+            return
+        self._refreshing.add(site)
+        task = asyncio.ensure_future(self._refresh_in_background(site, use_proxy))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_in_background(self, site: str, use_proxy: bool) -> None:
+        try:
+            await self.refresh(site, use_proxy=use_proxy)
+        except Exception as exc:
+            self.refresh_errors += 1
+            print(f"WARNING: title index refresh for {site} failed: {exc}")
+        finally:
+            self._refreshing.discard(site)
+
+    async def refresh(self, site: str, *, use_proxy: bool = False) -> int:
+        """Pull new titles for ``site``; returns the number of aliases added."""
+        source = self.sources[site]
+        site_index = self._site(site)
+        started = time.time()
+        full = (
+            not source.incremental
+            or not site_index.full_refresh_at
+            or started - site_index.full_refresh_at >= source.full_refresh_seconds
+        )
+        before = len(site_index.aliases)
+        async with httpx.AsyncClient(
+            timeout=self.timeout_seconds,
+            proxy=self._proxy if use_proxy else None,
+            transport=self._transport,
+        ) as client:
+            if full:
+                params = {**source.listing, "redirects": "1"}
+            else:
+                params = {
+                    "list": "recentchanges",
+                    "rctype": "new",
+                    "rcnamespace": "0",
+                    "rcprop": "title",
+                    "rclimit": "500",
+                    "rcend": time.strftime(
+                        "%Y-%m-%dT%H:%M:%SZ", time.gmtime(site_index.refreshed_at)
+                    ),
+                }
+            async for batch in self._query_all(client, source.api_url, params):
+                for page in batch.get("pages") or []:
+                    site_index.add_title(page["title"])
+                for change in batch.get("recentchanges") or []:
+                    site_index.add_title(change["title"])
+                for redirect in batch.get("redirects") or []:
+                    site_index.add_title(redirect["to"], redirect["from"])
+        site_index.refreshed_at = started
+        if full:
+            site_index.full_refresh_at = started
+        await asyncio.to_thread(self._write, self._payload())
+        return len(site_index.aliases) - before
+
+    async def _query_all(
+        self, client: httpx.AsyncClient, api_url: str, params: dict[str, str]
+    ) -> AsyncIterator[dict]:
+        base = {"action": "query", "format": "json", "formatversion": "2", **params}
+        cont: dict[str, str] = {}
+        while True:
+            async with self._slot(httpx.URL(api_url).host):
+                response = await client.get(api_url, params={**base, **cont})
+            response.raise_for_status()
+            payload = response.json()
+            yield payload.get("query") or {}
+            if "continue" not in payload:
+                return
+            cont = payload["continue"]
+
+    def stats(self) -> dict[str, Any]:
+        sites = self._sites or {}
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+            "aliases": {site: len(site_index.aliases) for site, site_index in sites.items()},
+        }
@@ -1,18 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import itertools
+import re
+from contextlib import asynccontextmanager
 from pathlib import Path
 import json
-from typing import Tuple, List, Dict, Any
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
+import anyio
+import httpx
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.tools import BaseTool
 from langchain_openai import ChatOpenAI
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langchain.agents import create_agent
-from mcp import ClientSession
+from mcp import ClientSession, McpError
 from mcp.client.streamable_http import streamable_http_client
+from mcp.types import CONNECTION_CLOSED
 
 from umamusume_prompt.config import config
+from umamusume_prompt.dedup import DedupStats, Deduplicator, dedup_documents
+from umamusume_prompt.mcp.title_index import normalize_alias
+from umamusume_prompt.stage_cache import StageCache, stage_key
 
 
 def _load_prompt(name: str) -> str:
@@ -80,30 +101,519 @@ def _extract_tool_info(agent_response: dict) -> Dict[str, Any]:
     }
 
 
-async def collect_web_info(
-    mcp_url: str, character_cn: str, character_en: str
-) -> Tuple[str, Dict[str, Any]]:
-    config.validate_info_llm()
-    print(f"[stage1] collecting web info via MCP: {mcp_url}")
-    prompt = _load_prompt("collect_web.md").format(
-        character_cn=character_cn, character_en=character_en
+# The streamable HTTP client reports an expired session with this code.
+_SESSION_TERMINATED = 32600
+
+
+def _is_disconnect(exc: BaseException) -> bool:
+    if isinstance(exc, McpError):
+        return exc.error.code in (CONNECTION_CLOSED, _SESSION_TERMINATED)
+    return isinstance(
+        exc,
+        (
+            anyio.ClosedResourceError,
+            anyio.BrokenResourceError,
+            httpx.TransportError,
+            ConnectionError,
+        ),
     )
 
+
+@asynccontextmanager
+async def _connect(mcp_url: str) -> AsyncIterator[ClientSession]:
     async with streamable_http_client(mcp_url) as (read_stream, write_stream, _):
         async with ClientSession(read_stream, write_stream) as session:
             await session.initialize()
-            tools = await load_mcp_tools(session)
-            tool_names = ", ".join(tool.name for tool in tools)
-            print(f"[stage1] MCP tools: {tool_names}")
-            agent = create_agent(_build_info_model(), tools)
-            result = await agent.ainvoke(
-                {"messages": [HumanMessage(content=prompt)]},
-                config={"recursion_limit": 60},
+            yield session
+
+
+class _PooledSession:
+    """One MCP session, held open by a background task.
+
+    The transport and ClientSession are anyio context managers that must be
+    entered and exited in the same task, so they cannot simply be kept open
+    by whichever character run happened to connect first.
+    """
+
+    def __init__(self, connect: Callable[[], AsyncContextManager[ClientSession]]) -> None:
+        self._connect = connect
+        self._task: Optional[asyncio.Task[None]] = None
+        self._ready: Optional[asyncio.Future[ClientSession]] = None
+        self._stop = asyncio.Event()
+        self.connects = 0
+
+    async def get(self) -> ClientSession:
+        if self._task is None or self._task.done():
+            loop = asyncio.get_running_loop()
+            self._ready = loop.create_future()
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._hold(self._ready, self._stop))
+        assert self._ready is not None
+        return await asyncio.shield(self._ready)
+
+    async def _hold(self, ready: asyncio.Future[ClientSession], stop: asyncio.Event) -> None:
+        try:
+            async with self._connect() as session:
+                self.connects += 1
+                ready.set_result(session)
+                await stop.wait()
+        except asyncio.CancelledError:
+            ready.cancel()
+            raise
+        except Exception as exc:
+            if not ready.done():
+                ready.set_exception(exc)
+        finally:
+            if not ready.done():
+                ready.set_exception(ConnectionError("MCP session closed"))
+
+    def discard(self, session: ClientSession) -> None:
+        """Drop ``session`` so the next get() reconnects, unless that already happened."""
+        ready = self._ready
+        if (
+            ready is not None
+            and ready.done()
+            and not ready.cancelled()
+            and ready.exception() is None
+            and ready.result() is session
+        ):
+            self._stop.set()
+            self._task = None
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class McpSessionPool:
+    """A few long-lived MCP sessions shared by concurrent character runs.
+
+    The tool list is loaded once; the LangChain tools call back into the
+    pool, which spreads calls over its sessions (each session multiplexes
+    concurrent requests) and, when a session has dropped, reconnects it and
+    retries the call once. All tools are read-only crawls, so a retry is safe.
+    """
+
+    def __init__(
+        self,
+        mcp_url: str,
+        size: int = 1,
+        *,
+        connect: Optional[Callable[[], AsyncContextManager[ClientSession]]] = None,
+    ) -> None:
+        self.mcp_url = mcp_url
+        connect = connect or (lambda: _connect(mcp_url))
+        self._sessions = [_PooledSession(connect) for _ in range(max(1, size))]
+        self._order = itertools.cycle(self._sessions)
+        self._tools: Optional[List[BaseTool]] = None
+        self._tools_lock = asyncio.Lock()
+        self.reconnects = 0
+
+    async def __aenter__(self) -> McpSessionPool:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        pooled = next(self._order)
+        session = await pooled.get()
+        try:
+            return await getattr(session, method)(*args, **kwargs)
+        except Exception as exc:
+            if not _is_disconnect(exc):
+                raise
+            pooled.discard(session)
+            self.reconnects += 1
+            print(f"[mcp] session dropped ({exc}), reconnecting to {self.mcp_url}")
+        session = await pooled.get()
+        return await getattr(session, method)(*args, **kwargs)
+
+    # The ClientSession methods load_mcp_tools and its tools use.
+    async def list_tools(self, cursor: Optional[str] = None, **kwargs: Any) -> Any:
+        return await self._call("list_tools", cursor=cursor, **kwargs)
+
+    async def call_tool(
+        self, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Any:
+        return await self._call("call_tool", name, arguments, **kwargs)
+
+    async def tools(self) -> List[BaseTool]:
+        async with self._tools_lock:
+            if self._tools is None:
+                self._tools = await load_mcp_tools(self)  # type: ignore[arg-type]
+                tool_names = ", ".join(tool.name for tool in self._tools)
+                print(f"[stage1] MCP tools: {tool_names}")
+        return self._tools
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "connects": sum(pooled.connects for pooled in self._sessions),
+            "reconnects": self.reconnects,
+        }
+
+    async def close(self) -> None:
+        await asyncio.gather(*(pooled.close() for pooled in self._sessions))
+
+
+COLLECT_MODES = ("auto", "agent", "direct")
+# Sections of web_info_format.md the direct sources must cover, by the wiki
+# heading or table-label keywords that feed them.
+_REQUIRED_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "profile": ("简介", "概要", "介绍", "基本资料", "基本信息", "角色资料"),
+    "game_data": ("育成", "技能", "属性", "数据", "适性", "称号"),
+}
+# Game data ranks last when pages are compacted, so it is kept whole instead.
+_KEEP_SECTIONS = list(_REQUIRED_SECTIONS["game_data"])
+_LABEL_RE = re.compile(r"^(?:#{1,6}\s+|\|)(.*)$", re.MULTILINE)
+_DISAMBIGUATION_RE = re.compile(r"[(（][^()（）]*[)）]\s*$")
+
+
+def _tool_payload(result: Any) -> Dict[str, Any]:
+    """The dict a tool returned; failed calls become a status=error dict."""
+    text = "".join(getattr(block, "text", "") for block in result.content)
+    if result.isError:
+        return {"status": "error", "error": text or "tool call failed"}
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return {"status": "error", "error": f"unexpected tool output: {text[:200]}"}
+    if not isinstance(payload, dict):
+        return {"status": "error", "error": f"unexpected tool output: {text[:200]}"}
+    return payload
+
+
+def _covered_sections(texts: List[str]) -> List[str]:
+    labels = " ".join(
+        match.group(1).lower() for text in texts for match in _LABEL_RE.finditer(text)
+    )
+    return [
+        name
+        for name, keywords in _REQUIRED_SECTIONS.items()
+        if any(keyword in labels for keyword in keywords)
+    ]
+
+
+def _title_rank(title: str, names: set[str]) -> Optional[int]:
+    """0 for the character's own title, 1 for it with a disambiguation suffix."""
+    if normalize_alias(title) in names:
+        return 0
+    if normalize_alias(_DISAMBIGUATION_RE.sub("", title)) in names:
+        return 1
+    return None
+
+
+async def collect_wiki_sources(
+    pool: McpSessionPool, character_cn: str, character_en: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Search both wikis and crawl the top hits with direct tool calls.
+
+    Returns the crawled pages and a tool_info record shaped like the agent's,
+    with a coverage summary used to decide whether the agent is needed.
+    """
+    tool_calls: List[Dict[str, Any]] = []
+    tool_results: List[Dict[str, Any]] = []
+
+    async def call(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        tool_calls.append({"name": name, "arguments": arguments})
+        try:
+            payload = _tool_payload(await pool.call_tool(name, arguments))
+        except Exception as exc:
+            payload = {"status": "error", "error": f"{type(exc).__name__}: {exc}"}
+        tool_results.append(
+            {"name": name, "content": payload, "status": payload.get("status")}
+        )
+        return payload
+
+    names = {normalize_alias(character_cn), normalize_alias(character_en)}
+
+    async def top_hit(tool: str) -> Optional[str]:
+        # Wiki titles are Chinese; the English name only helps when the CN one
+        # finds no page titled after the character. Without such a title the
+        # first result is used.
+        best: Optional[Tuple[int, str]] = None
+        first: Optional[str] = None
+        for keyword in dict.fromkeys([character_cn, character_en]):
+            results = (await call(tool, {"keyword": keyword, "limit": 5})).get("results") or []
+            if first is None and results:
+                first = results[0]["url"]
+            for item in results:
+                rank = _title_rank(item.get("title", ""), names)
+                if rank is not None and (best is None or rank < best[0]):
+                    best = (rank, item["url"])
+            if best is not None and best[0] == 0:
+                break
+        return best[1] if best is not None else first
+
+    async def full_text(item: Dict[str, Any]) -> str:
+        # Without a token budget long pages come back in cursor pages.
+        parts = [item["result"]]
+        tool = "crawl_biligame_wiki" if item.get("site") == "biligame" else "crawl_moegirl_wiki"
+        cursor = item.get("next_cursor")
+        while cursor:
+            page = await call(tool, {"url": item["url"], "cursor": cursor})
+            if page.get("status") != "success":
+                print(
+                    f"[stage1] {item['url']} truncated at page {len(parts)}: "
+                    f"{page.get('message') or page.get('error')}"
+                )
+                break
+            parts.append(page["result"])
+            cursor = page.get("next_cursor")
+        return "".join(parts)
+
+    hits = await asyncio.gather(
+        top_hit("biligame_wiki_search"), top_hit("moegirl_wiki_search")
+    )
+    urls = [url for url in hits if url]
+    sources: List[Dict[str, Any]] = []
+    dedup_stats = DedupStats()
+    if urls:
+        arguments: Dict[str, Any] = {"urls": urls}
+        if config.direct_collect_token_budget > 0:
+            arguments["token_budget"] = config.direct_collect_token_budget
+            arguments["keep_sections"] = _KEEP_SECTIONS
+        batch = await call("crawl_wiki_batch", arguments)
+        crawled = [
+            item
+            for item in batch.get("results", [])
+            if item.get("status") == "success" and item.get("result")
+        ]
+        texts = await asyncio.gather(*(full_text(item) for item in crawled))
+        # The batch tool dedups its first pages; this also covers cursor pages.
+        texts, dedup_stats = dedup_documents(list(texts))
+        sources = [
+            {"url": item["url"], "site": item.get("site"), "text": text}
+            for item, text in zip(crawled, texts)
+        ]
+    sections = _covered_sections([source["text"] for source in sources])
+    coverage = {
+        "sites": sorted({source["site"] for source in sources if source["site"]}),
+        "chars": sum(len(source["text"]) for source in sources),
+        "sections": sections,
+        "missing_sections": [name for name in _REQUIRED_SECTIONS if name not in sections],
+    }
+    return sources, {
+        "tool_calls": tool_calls,
+        "tool_results": tool_results,
+        "coverage": coverage,
+        "dedup": dedup_stats.as_dict(),
+    }
+
+
+async def summarize_wiki_sources(
+    sources: List[Dict[str, Any]], character_cn: str, character_en: str
+) -> str:
+    """Turn crawled wiki pages into web_info with a single LLM call."""
+    blocks = "\n\n".join(
+        f"---- 来源：{source['url']} ----\n\n{source['text']}" for source in sources
+    )
+    prompt = _load_prompt("summarize_web.md").format(
+        character_cn=character_cn,
+        character_en=character_en,
+        sources=blocks,
+        web_info_format=_load_prompt("web_info_format.md"),
+    )
+    response = await _build_info_model().ainvoke([HumanMessage(content=prompt)])
+    return response.content
+
+
+def _dedup_payload(text: str, dedup: Deduplicator) -> str:
+    """Dedup the page text in a crawl tool's JSON result, batch items included."""
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(payload, dict):
+        return text
+    items = [payload, *(item for item in payload.get("results") or [] if isinstance(item, dict))]
+    changed = False
+    for item in items:
+        if isinstance(item.get("result"), str):
+            result = dedup.add(item["result"])
+            changed = changed or result != item["result"]
+            item["result"] = result
+    return json.dumps(payload, ensure_ascii=False) if changed else text
+
+
+def _with_dedup(tool: BaseTool, dedup: Deduplicator) -> BaseTool:
+    """A copy of a crawl tool whose results skip paragraphs the agent already read."""
+    call = tool.coroutine
+
+    async def coroutine(*args: Any, **kwargs: Any) -> Any:
+        content, artifact = await call(*args, **kwargs)
+        if isinstance(content, str):
+            content = _dedup_payload(content, dedup)
+        elif isinstance(content, list):
+            content = [
+                {**block, "text": _dedup_payload(block["text"], dedup)}
+                if isinstance(block, dict) and block.get("type") == "text"
+                else block
+                for block in content
+            ]
+        return content, artifact
+
+    return tool.model_copy(update={"coroutine": coroutine})
+
+
+async def _collect_with_agent(
+    pool: McpSessionPool, character_cn: str, character_en: str
+) -> Tuple[str, Dict[str, Any]]:
+    prompt = _load_prompt("collect_web.md").format(
+        character_cn=character_cn,
+        character_en=character_en,
+        web_info_format=_load_prompt("web_info_format.md"),
+    )
+    dedup = Deduplicator()
+    tools = [
+        _with_dedup(tool, dedup) if tool.name.startswith("crawl_") else tool
+        for tool in await pool.tools()
+    ]
+    agent = create_agent(_build_info_model(), tools)
+    result = await agent.ainvoke(
+        {"messages": [HumanMessage(content=prompt)]},
+        config={"recursion_limit": 60},
+    )
+    tool_info = _extract_tool_info(result)
+    tool_info["dedup"] = dedup.stats.as_dict()
+    return result["messages"][-1].content, tool_info
+
+
+async def collect_web_info(
+    mcp_url: str,
+    character_cn: str,
+    character_en: str,
+    *,
+    pool: Optional[McpSessionPool] = None,
+    mode: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    config.validate_info_llm()
+    mode = mode or config.collect_mode
+    if mode not in COLLECT_MODES:
+        raise ValueError(f"unknown collect mode {mode!r} (choose from {', '.join(COLLECT_MODES)})")
+    if pool is None:
+        async with McpSessionPool(mcp_url) as pool:
+            return await collect_web_info(
+                mcp_url, character_cn, character_en, pool=pool, mode=mode
+            )
+
+    print(f"[stage1] collecting web info via MCP: {mcp_url} (mode: {mode})")
+    web_info: Optional[str] = None
+    coverage: Optional[Dict[str, Any]] = None
+    if mode != "agent":
+        sources, tool_info = await collect_wiki_sources(pool, character_cn, character_en)
+        coverage = tool_info["coverage"]
+        if (
+            coverage["sites"]
+            and coverage["chars"] >= config.direct_collect_min_chars
+            and not coverage["missing_sections"]
+        ):
+            web_info = await summarize_wiki_sources(sources, character_cn, character_en)
+            tool_info["final_answer"] = web_info
+            tool_info["mode"] = "direct"
+        elif mode == "direct":
+            raise RuntimeError(
+                f"direct collection found too little for {character_cn}: "
+                f"{coverage['chars']} chars from {coverage['sites'] or 'no wiki'}, "
+                f"missing sections: {coverage['missing_sections'] or 'none'}"
+            )
+        else:
+            print(
+                f"[stage1] direct collection found {coverage['chars']} chars from "
+                f"{coverage['sites'] or 'no wiki'} (missing sections: "
+                f"{coverage['missing_sections'] or 'none'}); falling back to the agent."
             )
-            web_info = result["messages"][-1].content
-            tool_info = _extract_tool_info(result)
-            print("[stage1] web info collected.")
-            return web_info, tool_info
+    if web_info is None:
+        web_info, tool_info = await _collect_with_agent(pool, character_cn, character_en)
+        tool_info["mode"] = "agent"
+        if coverage is not None:
+            tool_info["direct_coverage"] = coverage
+
+    dedup = tool_info.get("dedup") or DedupStats().as_dict()
+    print(
+        f"[stage1] web info collected via {tool_info['mode']} (dropped "
+        f"{dedup['dropped']} duplicate source paragraphs, ~{dedup['tokens_saved']} tokens)."
+    )
+    return web_info, tool_info
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def run_cached_stage(
+    cache: Optional[StageCache],
+    stage: str,
+    inputs: Dict[str, Any],
+    produce: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Return the stored artifacts for ``inputs``, or produce and store them."""
+    if cache is None:
+        return await produce()
+    key = stage_key(stage, **inputs)
+    artifacts = cache.get(stage, key)
+    if artifacts is not None:
+        print(f"[{stage}] inputs unchanged, reusing cached output {key[:12]}.")
+        return artifacts
+    artifacts = await produce()
+    cache.put(stage, key, artifacts)
+    return artifacts
+
+
+async def collect_web_info_cached(
+    mcp_url: str,
+    character_cn: str,
+    character_en: str,
+    *,
+    pool: Optional[McpSessionPool] = None,
+    cache: Optional[StageCache] = None,
+    mode: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    mode = mode or config.collect_mode
+
+    async def produce() -> Dict[str, Any]:
+        web_info, tool_info = await collect_web_info(
+            mcp_url, character_cn, character_en, pool=pool, mode=mode
+        )
+        return {"web_info": web_info, "tool_info": tool_info}
+
+    templates = ["collect_web.md", "summarize_web.md", "web_info_format.md"]
+    artifacts = await run_cached_stage(
+        cache,
+        "collect",
+        {
+            "character_cn": character_cn,
+            "character_en": character_en,
+            "templates": {name: text_digest(_load_prompt(name)) for name in templates},
+            "model": config.info_llm_model_name,
+            "mode": mode,
+            "min_chars": config.direct_collect_min_chars,
+            "token_budget": config.direct_collect_token_budget,
+        },
+        produce,
+    )
+    return artifacts["web_info"], artifacts["tool_info"]
+
+
+def write_stage_inputs(
+    target: str,
+    templates: List[str],
+    web_info: str,
+    character_cn: str,
+    character_en: str,
+) -> Dict[str, Any]:
+    """Everything a stage-2 writer output depends on."""
+    return {
+        "target": target,
+        "character_cn": character_cn,
+        "character_en": character_en,
+        "templates": {name: text_digest(_load_prompt(name)) for name in templates},
+        "model": config.writer_llm_model_name,
+        "web_info": text_digest(web_info),
+    }
 
 
 async def build_role_prompt(
@@ -124,15 +634,20 @@ async def build_role_prompt(
     return response.content
 
 
-async def run_pipeline(
-    mcp_url: str, character_cn: str, character_en: str, output_dir: Path
+async def write_role_prompt_outputs(
+    web_info: str,
+    tool_info: Dict[str, Any],
+    character_cn: str,
+    character_en: str,
+    output_dir: Path,
+    *,
+    cache: Optional[StageCache] = None,
 ) -> Tuple[Path, Path]:
+    """Save the stage-1 outputs and run stage 2 for the prompt target."""
     output_dir.mkdir(parents=True, exist_ok=True)
     character_dir = output_dir / _safe_dir_name(character_en or character_cn)
     character_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"[run] character: {character_cn} ({character_en})")
-    web_info, tool_info = await collect_web_info(mcp_url, character_cn, character_en)
     web_path = character_dir / "web_info.md"
     web_path.write_text(web_info, encoding="utf-8")
     print(f"[run] saved web info: {web_path}")
@@ -143,9 +658,41 @@ async def run_pipeline(
     )
     print(f"[run] saved tool calls: {tool_path}")
 
-    role_prompt = await build_role_prompt(web_info, character_cn, character_en)
+    async def write() -> Dict[str, Any]:
+        return {"role_prompt": await build_role_prompt(web_info, character_cn, character_en)}
+
+    artifacts = await run_cached_stage(
+        cache,
+        "write",
+        write_stage_inputs(
+            "prompt",
+            ["build_prompt.md", "umamusume_base_info.md"],
+            web_info,
+            character_cn,
+            character_en,
+        ),
+        write,
+    )
     prompt_path = character_dir / "role_prompt.md"
-    prompt_path.write_text(role_prompt, encoding="utf-8")
+    prompt_path.write_text(artifacts["role_prompt"], encoding="utf-8")
     print(f"[run] saved role prompt: {prompt_path}")
 
     return web_path, prompt_path
+
+
+async def run_pipeline(
+    mcp_url: str,
+    character_cn: str,
+    character_en: str,
+    output_dir: Path,
+    *,
+    pool: Optional[McpSessionPool] = None,
+    cache: Optional[StageCache] = None,
+) -> Tuple[Path, Path]:
+    print(f"[run] character: {character_cn} ({character_en})")
+    web_info, tool_info = await collect_web_info_cached(
+        mcp_url, character_cn, character_en, pool=pool, cache=cache
+    )
+    return await write_role_prompt_outputs(
+        web_info, tool_info, character_cn, character_en, output_dir, cache=cache
+    )
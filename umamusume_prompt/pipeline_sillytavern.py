@@ -3,13 +3,19 @@ from __future__ import annotations
 import hashlib
 import json
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
 from umamusume_prompt.config import config
-from umamusume_prompt.pipeline import collect_web_info
+from umamusume_prompt.pipeline import (
+    McpSessionPool,
+    collect_web_info_cached,
+    run_cached_stage,
+    write_stage_inputs,
+)
+from umamusume_prompt.stage_cache import StageCache
 
 
 def _load_prompt(name: str) -> str:
@@ -51,15 +57,20 @@ async def build_sillytavern_character(
     return response.content
 
 
-async def run_pipeline_sillytavern(
-    mcp_url: str, character_cn: str, character_en: str, output_dir: Path
+async def write_sillytavern_outputs(
+    web_info: str,
+    tool_info: Dict[str, Any],
+    character_cn: str,
+    character_en: str,
+    output_dir: Path,
+    *,
+    cache: Optional[StageCache] = None,
 ) -> Tuple[Path, Path]:
+    """Save the stage-1 outputs and run stage 2 for the SillyTavern target."""
     output_dir.mkdir(parents=True, exist_ok=True)
     character_dir = output_dir / _safe_dir_name(character_en or character_cn)
     character_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"[run] character: {character_cn} ({character_en})")
-    web_info, tool_info = await collect_web_info(mcp_url, character_cn, character_en)
     web_path = character_dir / "web_info.md"
     web_path.write_text(web_info, encoding="utf-8")
     print(f"[run] saved web info: {web_path}")
@@ -71,11 +82,44 @@ async def run_pipeline_sillytavern(
     )
     print(f"[run] saved tool calls: {tool_path}")
 
-    role_prompt = await build_sillytavern_character(
-        web_info, character_cn, character_en
+    async def write() -> Dict[str, Any]:
+        role_prompt = await build_sillytavern_character(
+            web_info, character_cn, character_en
+        )
+        return {"role_prompt": role_prompt}
+
+    artifacts = await run_cached_stage(
+        cache,
+        "write",
+        write_stage_inputs(
+            "sillytavern",
+            ["build_SillyTavern_character.md", "umamusume_base_info.md"],
+            web_info,
+            character_cn,
+            character_en,
+        ),
+        write,
     )
     prompt_path = character_dir / "role_prompt.md"
-    prompt_path.write_text(role_prompt, encoding="utf-8")
+    prompt_path.write_text(artifacts["role_prompt"], encoding="utf-8")
     print(f"[run] saved role prompt: {prompt_path}")
 
     return web_path, prompt_path
+
+
+async def run_pipeline_sillytavern(
+    mcp_url: str,
+    character_cn: str,
+    character_en: str,
+    output_dir: Path,
+    *,
+    pool: Optional[McpSessionPool] = None,
+    cache: Optional[StageCache] = None,
+) -> Tuple[Path, Path]:
+    print(f"[run] character: {character_cn} ({character_en})")
+    web_info, tool_info = await collect_web_info_cached(
+        mcp_url, character_cn, character_en, pool=pool, cache=cache
+    )
+    return await write_sillytavern_outputs(
+        web_info, tool_info, character_cn, character_en, output_dir, cache=cache
+    )
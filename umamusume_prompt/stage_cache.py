@@ -0,0 +1,101 @@
+"""
+Content-addressed cache of pipeline stage outputs.
+
+Each stage result is stored under a hash of everything that determines it:
+the character, the prompt templates, the model, and the output of the stage
+before it. Editing a writer prompt therefore only invalidates stage 2, and
+re-running a batch after a stage-2 failure reuses the collected web info.
+Stage 1 also depends on the live wikis, which the key cannot capture, so
+stages can be given a maximum age after which their entries are collected
+again.
+
+    <directory>/<stage>/<key>.json   {"stage", "key", "created_at", "artifacts"}
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+STAGES = ("collect", "write")
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+def stage_key(stage: str, **inputs: Any) -> str:
+    payload = json.dumps({"stage": stage, **inputs}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        force: Iterable[str] = (),
+        ttl_seconds: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.force = set(force)
+        # Stage -> maximum entry age; missing or 0 never expires.
+        self.ttl_seconds = dict(ttl_seconds or {})
+        unknown = (self.force | set(self.ttl_seconds)) - set(STAGES)
+        if unknown:
+            raise ValueError(f"unknown stage(s): {', '.join(sorted(unknown))}")
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.directory / stage / f"{key}.json"
+
+    def get(self, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(stage, key)
+        if stage in self.force or not path.exists():
+            self.misses += 1
+            return None
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self._expired(stage, entry):
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["artifacts"]
+
+    def _expired(self, stage: str, entry: Dict[str, Any]) -> bool:
+        ttl = self.ttl_seconds.get(stage, 0)
+        if ttl <= 0:
+            return False
+        try:
+            created = datetime.strptime(entry["created_at"], _TIME_FORMAT).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return True
+        return time.time() - created >= ttl
+
+    def put(self, stage: str, key: str, artifacts: Dict[str, Any]) -> None:
+        path = self._path(stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "stage": stage,
+            "key": key,
+            "created_at": time.strftime(_TIME_FORMAT),
+            "artifacts": artifacts,
+        }
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
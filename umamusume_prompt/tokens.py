@@ -0,0 +1,78 @@
+"""
+Token counting shared by tool-result compaction and the pipeline.
+
+Uses a tiktoken encoding when one can be loaded (tiktoken ships with
+langchain-openai, but the encoding files may need a download), and
+otherwise a character heuristic: one token per CJK character and about
+four characters per token for everything else.
+
+The first load may download the encoding, so it never runs on an event
+loop: servers call preload_encoding() at startup, and a count made on a
+running loop before the encoding is ready starts the load in a worker
+thread and uses the heuristic meanwhile.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+from typing import Any
+
+from .config import config
+
+_WIDE_RE = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+# Encoding name -> loaded encoding, or None once loading has failed.
+_encodings: dict[str, Any | None] = {}
+_loading: set[str] = set()
+
+
+def _load(name: str) -> Any | None:
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(name)
+    except Exception:
+        encoding = None
+    _encodings[name] = encoding
+    return encoding
+
+
+def _encoding(name: str) -> Any | None:
+    if name in _encodings:
+        return _encodings[name]
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _load(name)
+    if name not in _loading:
+        _loading.add(name)
+        loop.run_in_executor(None, _load, name)
+    return None
+
+
+async def preload_encoding(encoding: str | None = None) -> str:
+    """Load the encoding in a worker thread; returns the tokenizer in use."""
+    name = encoding or config.token_encoding
+    if name not in _encodings:
+        _loading.add(name)
+        await asyncio.to_thread(_load, name)
+    return tokenizer_name(name)
+
+
+def estimate_tokens(text: str) -> int:
+    wide = len(_WIDE_RE.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def count_tokens(text: str, encoding: str | None = None) -> int:
+    if not text:
+        return 0
+    enc = _encoding(encoding or config.token_encoding)
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def tokenizer_name(encoding: str | None = None) -> str:
+    encoding = encoding or config.token_encoding
+    return f"tiktoken:{encoding}" if _encoding(encoding) is not None else "heuristic"